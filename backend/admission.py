@@ -0,0 +1,162 @@
+"""Admission control: per-route-class concurrency limits with load shedding.
+
+Every /api request is put in a ``RouteClass`` by method and path before it
+reaches the router. A class admits at most ``limit`` requests at once. Past
+that, requests wait in a FIFO queue of at most ``max_queue`` entries for up
+to ``queue_timeout`` seconds. A request that finds the queue full, or times
+out in it, gets 503 with a ``Retry-After`` header estimated from the class's
+recent service time. Load is shed at the door instead of piling up on the
+Motor pool.
+
+A global ``capacity`` caps the total across all classes. The last
+``reserved`` slots can only go to ``priority`` classes, so a burst of exports
+and list loads can never take the capacity latency-critical writes (Kanban
+drag updates) need. When a slot frees up, waiting priority classes are
+served first.
+
+The controller is per worker process and single-threaded (event loop only).
+"""
+import asyncio
+import math
+import re
+import time
+from collections import deque
+from typing import Deque, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from metrics import ADMISSION_ACTIVE, ADMISSION_QUEUED, ADMISSION_REJECTED, ADMISSION_WAIT
+
+
+class RouteClass:
+    def __init__(self, name: str, limit: int, max_queue: int = 100, queue_timeout: float = 5.0,
+                 priority: bool = False, routes: Iterable[Tuple[str, str]] = ()):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.priority = priority
+        # (method or "*", path regex) pairs
+        self.routes = [(method.upper(), re.compile(pattern)) for method, pattern in routes]
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.service_time = 0.05  # EWMA of admitted request duration, seconds
+
+    def matches(self, method: str, path: str) -> bool:
+        return any(m in ("*", method) and pattern.match(path) for m, pattern in self.routes)
+
+
+class AdmissionController:
+    def __init__(self, classes: Sequence[RouteClass], default: RouteClass, capacity: int,
+                 reserved: int = 0, prefix: str = "/api", exempt: Sequence[str] = ()):
+        self.classes = list(classes)
+        self.default = default
+        self.capacity = capacity
+        self.reserved = min(reserved, capacity)
+        self.prefix = prefix
+        self.exempt = tuple(exempt)
+        self.active = 0
+        # Priority classes are woken first when a slot frees up
+        self._wake_order: List[RouteClass] = sorted(self.classes + [default], key=lambda c: not c.priority)
+
+    def classify(self, method: str, path: str) -> Optional[RouteClass]:
+        """The class governing a request; None for requests outside admission control"""
+        if not path.startswith(self.prefix) or path in self.exempt or method == "OPTIONS":
+            return None
+        for route_class in self.classes:
+            if route_class.matches(method, path):
+                return route_class
+        return self.default
+
+    def _can_admit(self, route_class: RouteClass) -> bool:
+        ceiling = self.capacity if route_class.priority else self.capacity - self.reserved
+        return route_class.active < route_class.limit and self.active < ceiling
+
+    def _admit(self, route_class: RouteClass) -> None:
+        route_class.active += 1
+        self.active += 1
+        ADMISSION_ACTIVE.set(route_class.active, route_class=route_class.name)
+
+    def _wake(self) -> None:
+        for route_class in self._wake_order:
+            while route_class.waiters and self._can_admit(route_class):
+                waiter = route_class.waiters.popleft()
+                if waiter.done():
+                    continue  # timed out or cancelled while queued
+                self._admit(route_class)
+                waiter.set_result(None)
+            ADMISSION_QUEUED.set(len(route_class.waiters), route_class=route_class.name)
+
+    async def acquire(self, route_class: RouteClass) -> Optional[str]:
+        """Take a slot; returns the rejection reason ("queue_full", "timeout") instead when shed"""
+        if not route_class.waiters and self._can_admit(route_class):
+            self._admit(route_class)
+            return None
+        if len(route_class.waiters) >= route_class.max_queue:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        route_class.waiters.append(waiter)
+        ADMISSION_QUEUED.set(len(route_class.waiters), route_class=route_class.name)
+        try:
+            # A waiter granted a slot just as the timeout fires still gets it (wait_for returns)
+            await asyncio.wait_for(waiter, route_class.queue_timeout)
+            return None
+        except asyncio.TimeoutError:
+            return "timeout"
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(route_class)
+            raise
+        finally:
+            if waiter in route_class.waiters:
+                route_class.waiters.remove(waiter)
+            ADMISSION_QUEUED.set(len(route_class.waiters), route_class=route_class.name)
+
+    def release(self, route_class: RouteClass, elapsed: Optional[float] = None) -> None:
+        route_class.active -= 1
+        self.active -= 1
+        ADMISSION_ACTIVE.set(route_class.active, route_class=route_class.name)
+        if elapsed is not None:
+            route_class.service_time += 0.2 * (elapsed - route_class.service_time)
+        self._wake()
+
+    def retry_after(self, route_class: RouteClass) -> int:
+        """Seconds until the queue ahead has likely drained, 1..60"""
+        drain = route_class.service_time * (len(route_class.waiters) + 1) / max(route_class.limit, 1)
+        return max(1, min(60, math.ceil(drain)))
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route_class = self.controller.classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        reason = await self.controller.acquire(route_class)
+        ADMISSION_WAIT.observe(time.perf_counter() - start, route_class=route_class.name)
+        if reason is not None:
+            ADMISSION_REJECTED.inc(route_class=route_class.name, reason=reason)
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry"},
+                status_code=503,
+                headers={"Retry-After": str(self.controller.retry_after(route_class))},
+            )
+            await response(scope, receive, send)
+            return
+
+        served = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class, time.perf_counter() - served)
@@ -0,0 +1,293 @@
+"""Deterministic synthetic data for large-tenant benchmarking.
+
+Builds departments, machines, users and work orders with the ``server``
+models and bulk-inserts them in parallel batches. Everything (ids, names,
+dates, statuses) is derived from ``--seed`` and ``--anchor``, so two runs
+with the same arguments produce identical collections; the printed
+fingerprint lets you confirm that before comparing benchmark numbers.
+
+Distributions aim to look like a real plant: machine counts per department
+and work per machine are long-tailed, a few technicians get most
+assignments, most history is Completed, and creation dates lean towards the
+recent past with fewer orders at weekends.
+
+    python -m benchmarks.datagen --db simplepm_bench --work-orders 100000 --drop
+    python -m benchmarks.datagen --work-orders 1000000 --machines 5000 --users 400 --parallel 8
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "simplepm_bench")
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from server import (  # noqa: E402
+    Department, Machine, Priority, User, UserRole, WorkOrder, WorkOrderChecklistItem,
+    WorkOrderStatus, WorkOrderType, get_password_hash, prepare_for_mongo,
+)
+
+STATUS_WEIGHTS = {
+    WorkOrderStatus.COMPLETED: 68,
+    WorkOrderStatus.SCHEDULED: 17,
+    WorkOrderStatus.IN_PROGRESS: 9,
+    WorkOrderStatus.ON_HOLD: 6,
+}
+PRIORITY_WEIGHTS = {Priority.LOW: 20, Priority.MEDIUM: 50, Priority.HIGH: 22, Priority.CRITICAL: 8}
+TYPE_WEIGHTS = {WorkOrderType.PM: 60, WorkOrderType.REPAIR: 40}
+
+DEPARTMENT_NAMES = ["Packaging", "Assembly", "Molding", "Paint Shop", "Warehouse", "Utilities", "Machining",
+                    "Quality Lab", "Welding", "Bottling", "Boiler House", "Shipping"]
+MACHINE_KINDS = ["Conveyor", "Press", "Filler", "Labeler", "Compressor", "CNC Mill", "Lathe", "Robot Cell",
+                 "Extruder", "Chiller", "Forklift", "Palletizer", "Mixer", "Oven", "Pump"]
+TASKS = ["Inspect belts", "Lubricate bearings", "Check oil level", "Replace filter", "Tighten fasteners",
+         "Calibrate sensors", "Clean nozzles", "Test safety interlocks", "Record vibration readings",
+         "Check hydraulic pressure", "Inspect wiring", "Verify torque settings"]
+TAGS = ["safety", "electrical", "mechanical", "hydraulic", "pneumatic", "urgent", "vendor", "audit", "lube"]
+REPAIR_TITLES = ["Unusual noise", "Leaking seal", "Motor overheating", "Jammed feeder", "Sensor fault",
+                 "Broken guard", "Low pressure alarm", "Drive belt slipping"]
+
+
+class Generator:
+    """Seeded factory for every synthetic document"""
+
+    def __init__(self, seed: int, anchor: datetime, history_days: int, sites: int):
+        self.rng = random.Random(seed)
+        self.anchor = anchor
+        self.history_days = history_days
+        self.sites = ["Main Site"] + [f"Plant {i + 1}" for i in range(sites - 1)]
+
+    def uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def pick(self, weights: Dict) -> object:
+        return self.rng.choices(list(weights), list(weights.values()))[0]
+
+    def zipf_index(self, n: int, skew: float = 1.1) -> int:
+        """Index in [0, n) where low indexes are much more likely"""
+        return min(n - 1, int(n * self.rng.random() ** (skew * 2.5)))
+
+    def created_offsets(self, count: int) -> List[float]:
+        """Sorted creation times (days before anchor), biased to recent, light at weekends"""
+        offsets = []
+        while len(offsets) < count:
+            # betavariate(1.6, 1) leans toward 1.0 == the anchor date.
+            days_ago = (1 - self.rng.betavariate(1.6, 1)) * self.history_days
+            day = self.anchor - timedelta(days=days_ago)
+            if day.weekday() >= 5 and self.rng.random() < 0.7:
+                continue
+            offsets.append(days_ago)
+        offsets.sort(reverse=True)
+        return offsets
+
+    def users(self, count: int, created_at: datetime) -> List[dict]:
+        docs = []
+        for i in range(count):
+            role = UserRole.ADMIN if i < max(1, count // 50) else UserRole.SUPERVISOR
+            user = User(id=self.uuid(), username=f"tech{i:04d}", email=f"tech{i:04d}@plant.example",
+                        role=role, created_at=created_at, trial_start=created_at)
+            doc = prepare_for_mongo(user.model_dump())
+            doc["hashed_password"] = get_password_hash("benchmark")
+            docs.append(doc)
+        return docs
+
+    def departments(self, count: int, created_by: str, created_at: datetime) -> List[dict]:
+        docs = []
+        for i in range(count):
+            name = DEPARTMENT_NAMES[i % len(DEPARTMENT_NAMES)]
+            if i >= len(DEPARTMENT_NAMES):
+                name = f"{name} {i // len(DEPARTMENT_NAMES) + 1}"
+            dept = Department(id=self.uuid(), name=name, site=self.sites[i % len(self.sites)],
+                              created_by=created_by, created_at=created_at)
+            doc = prepare_for_mongo(dept.model_dump())
+            docs.append(doc)
+        return docs
+
+    def machines(self, count: int, departments: List[dict], created_by: str, created_at: datetime) -> List[dict]:
+        docs = []
+        for i in range(count):
+            dept = departments[self.zipf_index(len(departments), 0.6)]
+            kind = MACHINE_KINDS[self.rng.randrange(len(MACHINE_KINDS))]
+            machine = Machine(id=self.uuid(), name=f"{kind} {i + 1:04d}", department_id=dept["id"],
+                              department_name=dept["name"], site=dept["site"], created_by=created_by,
+                              created_at=created_at)
+            doc = prepare_for_mongo(machine.model_dump())
+            docs.append(doc)
+        return docs
+
+    def work_orders(self, count: int, machines: List[dict], users: List[dict]) -> Iterator[dict]:
+        sequences: Counter = Counter()
+        for days_ago in self.created_offsets(count):
+            created = self.anchor - timedelta(days=days_ago)
+            machine = machines[self.zipf_index(len(machines), 0.8)]
+            requester = users[self.rng.randrange(len(users))]
+            assignee = users[self.zipf_index(len(users))] if self.rng.random() < 0.85 else None
+            wo_type = self.pick(TYPE_WEIGHTS)
+            status = self.pick(STATUS_WEIGHTS)
+            # Old orders are almost all closed out; recent ones are still open.
+            if days_ago > 30 and status != WorkOrderStatus.COMPLETED and self.rng.random() < 0.9:
+                status = WorkOrderStatus.COMPLETED
+
+            due = created + timedelta(days=max(0.5, self.rng.lognormvariate(1.6, 0.7)))
+            estimated = self.rng.choice([15, 30, 45, 60, 90, 120, 240, 480])
+            completed_at = None
+            if status == WorkOrderStatus.COMPLETED:
+                # Most finish near their due date, with a long late tail.
+                completed_at = min(self.anchor, created + timedelta(days=self.rng.expovariate(1 / 3.5)))
+
+            steps = self.rng.randint(3, 10) if wo_type == WorkOrderType.PM else self.rng.randint(0, 3)
+            checklist = []
+            for task in self.rng.sample(TASKS, min(steps, len(TASKS))):
+                done = status == WorkOrderStatus.COMPLETED or self.rng.random() < 0.3
+                checklist.append(WorkOrderChecklistItem(
+                    id=self.uuid(), text=task, completed=done,
+                    completed_by=assignee["id"] if done and assignee else None,
+                    completed_at=(completed_at or created + timedelta(hours=self.rng.randint(1, 48))) if done else None,
+                ))
+
+            sequences[created.year] += 1
+            title = (f"{machine['name']} PM" if wo_type == WorkOrderType.PM
+                     else f"{machine['name']}: {self.rng.choice(REPAIR_TITLES)}")
+            wo = WorkOrder(
+                id=self.uuid(),
+                wo_id=f"WO-{created.year}-{sequences[created.year]:04d}",
+                title=title,
+                type=wo_type,
+                priority=self.pick(PRIORITY_WEIGHTS),
+                status=status,
+                assignee=assignee["id"] if assignee else None,
+                assignee_name=assignee["username"] if assignee else None,
+                requested_by=requester["id"],
+                requested_by_name=requester["username"],
+                site=machine["site"],
+                department_id=machine["department_id"],
+                department_name=machine["department_name"],
+                machine_id=machine["id"],
+                machine_name=machine["name"],
+                due_date=due,
+                scheduled_start=due - timedelta(minutes=estimated) if wo_type == WorkOrderType.PM else None,
+                scheduled_end=due if wo_type == WorkOrderType.PM else None,
+                estimated_duration=estimated,
+                description=f"{title}. Follow the standard procedure and log readings.",
+                checklist=checklist,
+                tags=self.rng.sample(TAGS, self.rng.choice([0, 0, 1, 1, 2, 3])),
+                created_at=created,
+                updated_at=completed_at or created,
+                completed_at=completed_at,
+            )
+            yield prepare_for_mongo(wo.model_dump())
+
+
+async def insert_parallel(collection, docs: Iterator[dict], batch_size: int, parallel: int,
+                          fingerprint) -> int:
+    """insert_many in batches with up to `parallel` batches in flight"""
+    semaphore = asyncio.Semaphore(parallel)
+    tasks = []
+    inserted = 0
+
+    async def insert(batch: List[dict]):
+        nonlocal inserted
+        try:
+            await collection.insert_many(batch, ordered=False)
+            inserted += len(batch)
+        finally:
+            semaphore.release()
+
+    batch: List[dict] = []
+    for doc in docs:
+        fingerprint.update(doc["id"].encode())
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await semaphore.acquire()
+            tasks.append(asyncio.ensure_future(insert(batch)))
+            batch = []
+            # Drop finished inserts (surfacing their errors) so their batches can be freed.
+            for task in [t for t in tasks if t.done()]:
+                task.result()
+            tasks = [t for t in tasks if not t.done()]
+    if batch:
+        await semaphore.acquire()
+        tasks.append(asyncio.ensure_future(insert(batch)))
+    await asyncio.gather(*tasks)
+    return inserted
+
+
+async def generate(db, args) -> dict:
+    anchor = datetime.fromisoformat(args.anchor).replace(tzinfo=timezone.utc)
+    gen = Generator(args.seed, anchor, args.history_days, args.sites)
+    setup_time = anchor - timedelta(days=args.history_days + 30)
+    fingerprint = hashlib.sha1()
+    counts = {}
+    start = time.perf_counter()
+
+    if args.drop:
+        for name in ("users", "departments", "machines", "work_orders"):
+            await db[name].drop()
+
+    users = gen.users(args.users, setup_time)
+    departments = gen.departments(args.departments, users[0]["id"], setup_time)
+    machines = gen.machines(args.machines, departments, users[0]["id"], setup_time)
+    for name, docs in (("users", users), ("departments", departments), ("machines", machines)):
+        counts[name] = await insert_parallel(db[name], iter(docs), args.batch_size, args.parallel, fingerprint)
+
+    wo_start = time.perf_counter()
+    counts["work_orders"] = await insert_parallel(
+        db.work_orders, gen.work_orders(args.work_orders, machines, users),
+        args.batch_size, args.parallel, fingerprint)
+    wo_elapsed = time.perf_counter() - wo_start
+
+    return {
+        "db": db.name,
+        "seed": args.seed,
+        "anchor": args.anchor,
+        "counts": counts,
+        "fingerprint": fingerprint.hexdigest(),
+        "elapsed_s": round(time.perf_counter() - start, 2),
+        "work_orders_per_s": round(counts["work_orders"] / wo_elapsed, 1) if wo_elapsed else 0.0,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.environ["DB_NAME"], help="Target database (default $DB_NAME)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--anchor", default="2025-10-01", help="'Now' for generated dates (ISO date)")
+    parser.add_argument("--history-days", type=int, default=730)
+    parser.add_argument("--sites", type=int, default=1)
+    parser.add_argument("--departments", type=int, default=24)
+    parser.add_argument("--machines", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--work-orders", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--parallel", type=int, default=4, help="Concurrent insert_many batches")
+    parser.add_argument("--drop", action="store_true", help="Drop the target collections first")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.machines < 1 or args.users < 1 or args.departments < 1:
+        sys.exit("--machines, --users and --departments must be at least 1")
+
+    async def _run():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+        try:
+            return await generate(client[args.db], args)
+        finally:
+            client.close()
+
+    print(json.dumps(asyncio.run(_run()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
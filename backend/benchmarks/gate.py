@@ -0,0 +1,287 @@
+"""Performance regression gate.
+
+Runs the micro benchmarks (Mongo codec, response serialization, auth token
+path), the startup import budget and the macro benchmark (in-process endpoint load test), compares
+every metric with ``benchmarks/baseline.json`` and exits non-zero when one
+is worse than its baseline by more than its tolerance.
+
+    python -m benchmarks.gate                       # compare, exit 1 on regression
+    python -m benchmarks.gate --report gate.json    # also write the diff report
+    python -m benchmarks.gate --update-baseline     # record new baseline numbers
+
+Timings depend on the machine and on how busy it is. Right before each
+benchmark, the gate times a fixed pure-Python calibration workload, and
+stores that time next to each baseline value. Timing metrics are compared
+against the baseline scaled by the ratio of the two calibration times. A
+baseline recorded on a laptop therefore still holds on a slower or noisier
+CI runner. Re-record deliberately when a change is expected to move a
+number.
+
+The endpoint benchmark also checks correctness. Any failed request, or an
+endpoint label that never ran, fails the gate outright: a run where every
+write errors would otherwise report "improved" latencies.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "simplepm_bench_gate")
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+DEFAULT_TOLERANCE_PCT = 25.0
+# Wall-clock timings stay noisier than ratios even after calibration
+TIMING_TOLERANCE_PCT = 40.0
+
+# metric -> "lower" or "higher" is better
+DIRECTIONS: Dict[str, str] = {
+    "codec.roundtrip_us_per_doc": "lower",
+    "serialization.fast_ms": "lower",
+    "serialization.speedup": "higher",
+    "auth.decode_us": "lower",
+    "startup.import_ms": "lower",
+    "endpoints.throughput_rps": "higher",
+    "endpoints.board_p95_ms": "lower",
+    "endpoints.toggle_p50_ms": "lower",
+    "endpoints.create_p50_ms": "lower",
+}
+# Metrics that are not wall-clock timings and so are compared unscaled
+MACHINE_INDEPENDENT = {"serialization.speedup"}
+# metric -> (endpoint label, statistic). Writes use the median: with a few dozen
+# samples per run their p95 mostly measures which board load they queued behind.
+ENDPOINT_METRICS = {
+    "endpoints.board_p95_ms": ("GET /api/work-orders", "p95_ms"),
+    "endpoints.toggle_p50_ms": ("PUT /api/work-orders/{wo_id}", "p50_ms"),
+    "endpoints.create_p50_ms": ("POST /api/work-orders", "p50_ms"),
+}
+
+
+_CALIBRATION_RECORDS = [{"id": n, "title": f"work order {n}", "tags": ["a", "b"], "done": n % 3 == 0}
+                        for n in range(2000)]
+# Calibration times taken next to each sample of the benchmark currently running
+_calibration_samples: List[float] = []
+
+
+def _calibration_workload() -> None:
+    """A fixed dict/str/json workload, the yardstick for this machine's current speed"""
+    for record in _CALIBRATION_RECORDS:
+        json.loads(json.dumps(record))
+    sorted(_CALIBRATION_RECORDS, key=lambda record: record["title"])
+
+
+def _timed(fn: Callable[[], None]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def _median_time(fn: Callable[[], None], repeat: int) -> float:
+    fn()  # warm-up: imports, caches, allocator
+    timings = []
+    for _ in range(repeat):
+        # Interleaved, so the calibration sees the same busy or quiet spell as the sample
+        _calibration_samples.append(_timed(_calibration_workload))
+        timings.append(_timed(fn))
+    return statistics.median(timings)
+
+
+def bench_calibration(repeat: int) -> float:
+    """Calibration workload in microseconds, for benchmarks that do not time through ``_median_time``"""
+    _calibration_workload()
+    return round(statistics.median(_timed(_calibration_workload) for _ in range(repeat)) * 1e6, 3)
+
+
+def bench_codec(repeat: int) -> Dict[str, float]:
+    """prepare_for_mongo + parse_from_mongo round trip per work order"""
+    from benchmarks.serialization import build_work_orders
+    from server import parse_from_mongo, prepare_for_mongo
+
+    dumped = [wo.model_dump() for wo in build_work_orders(2000)]
+
+    def roundtrip():
+        for doc in dumped:
+            parse_from_mongo(prepare_for_mongo(doc))
+
+    seconds = _median_time(roundtrip, repeat)
+    return {"codec.roundtrip_us_per_doc": round(seconds / len(dumped) * 1e6, 3)}
+
+
+def bench_serialization(repeat: int) -> Dict[str, float]:
+    from benchmarks import serialization
+
+    from fastjson import FastJSONResponse
+
+    result = serialization.run(count=2000, repeat=repeat)
+    # Timed again here so the calibration runs alongside it; run() keeps the speedup and the output check
+    work_orders = serialization.build_work_orders(2000)
+    seconds = _median_time(lambda: FastJSONResponse(work_orders), repeat)
+    return {
+        "serialization.fast_ms": round(seconds * 1000, 3),
+        "serialization.speedup": result["speedup"],
+    }
+
+
+def bench_auth(repeat: int) -> Dict[str, float]:
+    """CPU side of get_current_user: JWT decode and User model construction"""
+    import jwt
+    from server import (
+        ALGORITHM, SECRET_KEY, User, UserRole, check_trial_status, create_access_token, parse_from_mongo,
+        prepare_for_mongo,
+    )
+
+    user_doc = prepare_for_mongo(User(username="gate", email="gate@bench.local", role=UserRole.ADMIN).model_dump())
+    token = create_access_token({"sub": "gate"})
+    iterations = 2000
+
+    def decode():
+        for _ in range(iterations):
+            jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            check_trial_status(User(**parse_from_mongo(dict(user_doc))))
+
+    seconds = _median_time(decode, repeat)
+    return {"auth.decode_us": round(seconds / iterations * 1e6, 3)}
+
+
+def bench_startup(repeat: int) -> Dict[str, float]:
+    """``import server`` in a fresh interpreter; see benchmarks/importtime.py"""
+    from benchmarks import importtime
+
+    report = importtime.run(repeat=repeat)
+    if report["deferred_modules_imported"]:
+        sys.exit(f"Lazily loaded modules imported at startup: {', '.join(report['deferred_modules_imported'])}")
+    return {"startup.import_ms": report["import_ms"]}
+
+
+def bench_endpoints(in_memory: bool) -> Dict[str, float]:
+    from benchmarks import loadtest
+
+    argv = ["--tenants", "2", "--work-orders", "300", "--concurrency", "8",
+            "--requests", "400", "--duration", "120", "--warmup", "0.5", "--seed", "3"]
+    if in_memory:
+        argv.append("--in-memory")
+    report = asyncio.run(loadtest.run(loadtest.build_parser().parse_args(argv)))
+    endpoints = report["endpoints"]
+
+    missing = [label for label, _ in ENDPOINT_METRICS.values() if label not in endpoints]
+    if missing:
+        sys.exit(f"Endpoint benchmark never exercised: {', '.join(missing)}")
+    if report["total"]["errors"]:
+        failed = {label: stats["errors"] for label, stats in endpoints.items() if stats["errors"]}
+        sys.exit(f"Endpoint benchmark had failed requests: {failed}")
+
+    return {
+        "endpoints.throughput_rps": report["total"]["throughput_rps"],
+        **{metric: endpoints[label][statistic] for metric, (label, statistic) in ENDPOINT_METRICS.items()},
+    }
+
+
+def compare(current: Dict[str, float], baseline: Dict, calibration: Dict[str, float]) -> Tuple[List[Dict], bool]:
+    """Rows per metric; ``calibration`` is the calibration time measured before each metric's benchmark"""
+    rows = []
+    regressed = False
+    for name, value in sorted(current.items()):
+        entry = baseline.get("metrics", {}).get(name)
+        direction = DIRECTIONS.get(name, "lower")
+        if entry is None:
+            rows.append({"metric": name, "current": value, "baseline": None, "change_pct": None,
+                         "direction": direction, "status": "new"})
+            continue
+        base = entry["value"]
+        if name in MACHINE_INDEPENDENT:
+            default_tolerance = baseline.get("tolerance_pct", DEFAULT_TOLERANCE_PCT)
+        else:
+            default_tolerance = baseline.get("timing_tolerance_pct", TIMING_TOLERANCE_PCT)
+            if entry.get("calibration_us") and calibration.get(name):
+                # > 1 when this machine is slower (or busier) than the one that recorded the baseline
+                slowdown = calibration[name] / entry["calibration_us"]
+                base = base * slowdown if direction == "lower" else base / slowdown
+        tolerance = entry.get("tolerance_pct", default_tolerance)
+        change_pct = ((value - base) / base * 100) if base else 0.0
+        worse = change_pct > tolerance if direction == "lower" else change_pct < -tolerance
+        better = change_pct < -tolerance if direction == "lower" else change_pct > tolerance
+        status = "REGRESSION" if worse else "improved" if better else "ok"
+        regressed = regressed or worse
+        rows.append({"metric": name, "current": value, "baseline": round(base, 3), "change_pct": round(change_pct, 1),
+                     "tolerance_pct": tolerance, "direction": direction, "status": status})
+    return rows, regressed
+
+
+def print_report(rows: List[Dict]) -> None:
+    print(f"{'metric':34} {'baseline':>12} {'current':>12} {'change':>9}  status")
+    for row in rows:
+        base = "-" if row["baseline"] is None else f"{row['baseline']:.3f}"
+        change = "-" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+        print(f"{row['metric']:34} {base:>12} {row['current']:>12.3f} {change:>9}  {row['status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run benchmarks and compare them with the stored baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--only", help="Comma-separated subset: codec,serialization,auth,startup,endpoints")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mongo", action="store_true",
+                        help="Run the endpoint benchmark against $MONGO_URL instead of in memory")
+    parser.add_argument("--update-baseline", action="store_true", help="Write current numbers as the baseline")
+    parser.add_argument("--report", type=Path, help="Write the comparison as JSON")
+    args = parser.parse_args()
+
+    benchmarks = {
+        "codec": lambda: bench_codec(args.repeat),
+        "serialization": lambda: bench_serialization(args.repeat),
+        "auth": lambda: bench_auth(args.repeat),
+        "startup": lambda: bench_startup(args.repeat),
+        "endpoints": lambda: bench_endpoints(in_memory=not args.mongo),
+    }
+    selected = args.only.split(",") if args.only else list(benchmarks)
+    current: Dict[str, float] = {}
+    calibration: Dict[str, float] = {}
+    for name in selected:
+        if name not in benchmarks:
+            sys.exit(f"Unknown benchmark {name!r}; choose from {', '.join(benchmarks)}")
+        print(f"Running {name}...", file=sys.stderr)
+        calibration_us = bench_calibration(max(args.repeat, 15))
+        _calibration_samples.clear()
+        results = benchmarks[name]()
+        if _calibration_samples:
+            calibration_us = round(statistics.median(_calibration_samples) * 1e6, 3)
+        current.update(results)
+        calibration.update(dict.fromkeys(results, calibration_us))
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+
+    if args.update_baseline:
+        metrics = baseline.get("metrics", {})
+        for name, value in current.items():
+            previous = metrics.get(name, {})
+            metrics[name] = {"value": value, "direction": DIRECTIONS.get(name, "lower"),
+                             "calibration_us": calibration[name],
+                             **({"tolerance_pct": previous["tolerance_pct"]} if "tolerance_pct" in previous else {})}
+        baseline.update({
+            "tolerance_pct": baseline.get("tolerance_pct", DEFAULT_TOLERANCE_PCT),
+            "timing_tolerance_pct": baseline.get("timing_tolerance_pct", TIMING_TOLERANCE_PCT),
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "metrics": dict(sorted(metrics.items())),
+        })
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return
+
+    rows, regressed = compare(current, baseline, calibration)
+    print_report(rows)
+    if args.report:
+        args.report.write_text(json.dumps({"regressed": regressed, "metrics": rows}, indent=2) + "\n")
+    if regressed:
+        print("Performance regression detected", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Startup budget: how long ``import server`` takes in a fresh interpreter.
+
+Runs ``python -X importtime -c "import server"`` in a subprocess (so nothing
+is cached in this process), parses the per-module report from stderr and
+prints the slowest top-level packages. Fails when the median import time is
+over ``--budget-ms`` or when a module that should load lazily (see
+``DEFERRED_MODULES``) shows up on the startup path.
+
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --budget-ms 1500 --top 15 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BUDGET_MS = 2000.0
+
+# Modules that must not be imported while server.py loads, by the module that imports them on first use
+DEFERRED_MODULES: Dict[str, Tuple[str, ...]] = {
+    "payments": ("emergentintegrations", "litellm", "google.genai", "openai", "stripe"),
+    "exports": ("pandas", "pyarrow"),
+    "reports": ("pandas", "numpy"),
+}
+
+
+def measure_once(module: str = "server") -> List[Tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for every module imported by ``import module``"""
+    env = dict(os.environ)
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    env.setdefault("DB_NAME", "simplepm_importtime")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def top_packages(rows: List[Tuple[str, int, int]], top: int) -> List[Dict]:
+    """Self time summed per top-level package, slowest first"""
+    totals: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        totals[name.split(".")[0]] += self_us
+    ordered = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"package": package, "ms": round(us / 1000, 1)} for package, us in ordered]
+
+
+def run(module: str = "server", repeat: int = 3, top: int = 10) -> Dict:
+    timings = []
+    rows: List[Tuple[str, int, int]] = []
+    for _ in range(repeat):
+        rows = measure_once(module)
+        total = next((cumulative for name, _, cumulative in rows if name == module), 0)
+        timings.append(total / 1000)
+    imported = {name for name, _, _ in rows}
+    deferred = {name for names in DEFERRED_MODULES.values() for name in names}
+    eager = sorted(name for name in deferred if name in imported)
+    return {
+        "module": module,
+        "import_ms": round(statistics.median(timings), 1),
+        "runs_ms": [round(t, 1) for t in timings],
+        "modules_imported": len(rows),
+        "deferred_modules_imported": eager,
+        "top_packages": top_packages(rows, top),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="server")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS)))
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    report = run(args.module, args.repeat, args.top)
+    report["budget_ms"] = args.budget_ms
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {report['module']}: {report['import_ms']} ms median of {report['runs_ms']} "
+              f"({report['modules_imported']} modules, budget {args.budget_ms:.0f} ms)")
+        for entry in report["top_packages"]:
+            print(f"  {entry['package']:30} {entry['ms']:>8.1f} ms")
+
+    failures = []
+    if report["import_ms"] > args.budget_ms:
+        failures.append(f"import time {report['import_ms']} ms is over the {args.budget_ms:.0f} ms budget")
+    if report["deferred_modules_imported"]:
+        failures.append(f"lazily loaded modules imported at startup: {', '.join(report['deferred_modules_imported'])}")
+    if failures:
+        sys.exit("; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
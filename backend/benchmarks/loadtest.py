@@ -0,0 +1,311 @@
+"""Local load test: drive server.app in-process with concurrent async clients.
+
+Runs against a local mongod (MONGO_URL, default mongodb://localhost:27017)
+using a throwaway database, or fully in memory with ``--in-memory`` (needs
+the ``mongomock-motor`` package). Requests go through httpx's ASGI
+transport, so the whole middleware stack and every handler is exercised
+without a network hop.
+
+    python -m benchmarks.loadtest --tenants 3 --concurrency 32 --duration 20
+    python -m benchmarks.loadtest --in-memory --mix board=80,toggle=15,create=5 --output bench.json
+    python -m benchmarks.loadtest --in-memory --mix board=70,checkout=30   # fake payment provider
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", f"simplepm_bench_{uuid.uuid4().hex[:8]}")
+# Checkout sessions go to the in-memory provider, never to Stripe
+os.environ.setdefault("PAYMENT_PROVIDER", "fake")
+
+DEFAULT_MIX = "board=60,detail=15,toggle=15,create=10"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def plain_collection(create_collection):
+    """Wrap a mongomock ``create_collection`` so it drops the options mongomock rejects"""
+
+    async def create_plain_collection(self, name, **options):
+        # mongomock rejects storage engine and time-series options; plain collections do here
+        return await create_collection(self, name)
+
+    return create_plain_collection
+
+
+def use_in_memory_db(server):
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit("--in-memory needs the mongomock-motor package (pip install mongomock-motor)")
+    server.client = AsyncMongoMockClient()
+    server.db = server.client[os.environ["DB_NAME"]]
+    database_class = type(server.db)
+    database_class.create_collection = plain_collection(database_class.create_collection)
+
+
+class Tenant:
+    """A synthetic customer: one admin, its plant structure and work orders"""
+
+    def __init__(self, name: str, token: str, user_id: str):
+        self.name = name
+        self.token = token
+        self.user_id = user_id
+        self.department_ids: List[str] = []
+        self.machine_ids: List[str] = []
+        # work order id -> checklist as sent back on toggle
+        self.work_orders: Dict[str, List[dict]] = {}
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}", "Accept-Encoding": "gzip"}
+
+
+async def seed_tenant(server, index: int, work_orders: int, rng: random.Random) -> Tenant:
+    db = server.db
+    name = f"tenant{index}"
+    user = server.User(username=f"{name}_admin", email=f"{name}@bench.local", role=server.UserRole.ADMIN)
+    user_doc = server.prepare_for_mongo(user.model_dump())
+    user_doc["hashed_password"] = server.get_password_hash("bench")
+    await db.users.insert_one(user_doc)
+    tenant = Tenant(name, server.create_access_token({"sub": user.username}), user.id)
+
+    departments = [server.Department(name=f"{name} Dept {d}", created_by=user.id) for d in range(5)]
+    await db.departments.insert_many([server.prepare_for_mongo(d.model_dump()) for d in departments])
+    tenant.department_ids = [d.id for d in departments]
+
+    machines = [
+        server.Machine(name=f"{name} Machine {m}", department_id=dept.id, department_name=dept.name,
+                       created_by=user.id)
+        for m, dept in ((m, departments[m % len(departments)]) for m in range(20))
+    ]
+    await db.machines.insert_many([server.prepare_for_mongo(m.model_dump()) for m in machines])
+    tenant.machine_ids = [m.id for m in machines]
+
+    docs = []
+    for n in range(work_orders):
+        machine = rng.choice(machines)
+        checklist = [server.WorkOrderChecklistItem(text=f"Step {s}") for s in range(rng.randint(0, 6))]
+        wo = server.WorkOrder(
+            wo_id=f"WO-BENCH-{index:02d}{n:06d}",
+            title=f"{machine.name} service {n}",
+            type=rng.choice(list(server.WorkOrderType)),
+            priority=rng.choice(list(server.Priority)),
+            status=rng.choice(list(server.WorkOrderStatus)),
+            requested_by=user.id,
+            requested_by_name=user.username,
+            department_id=machine.department_id,
+            department_name=machine.department_name,
+            machine_id=machine.id,
+            machine_name=machine.name,
+            description="Inspect, lubricate and record readings.",
+            checklist=checklist,
+        )
+        docs.append(server.prepare_for_mongo(wo.model_dump()))
+        tenant.work_orders[wo.id] = docs[-1]["checklist"]
+    if docs:
+        await db.work_orders.insert_many(docs)
+    return tenant
+
+
+# Operations: each returns (endpoint label, response)
+
+async def op_board(http, tenant: Tenant, rng: random.Random):
+    return "GET /api/work-orders", await http.get("/api/work-orders", headers=tenant.headers)
+
+
+async def op_detail(http, tenant: Tenant, rng: random.Random):
+    wo_id = rng.choice(list(tenant.work_orders))
+    return "GET /api/work-orders/{wo_id}", await http.get(f"/api/work-orders/{wo_id}", headers=tenant.headers)
+
+
+async def op_toggle(http, tenant: Tenant, rng: random.Random):
+    candidates = [wo_id for wo_id, checklist in tenant.work_orders.items() if checklist]
+    wo_id = rng.choice(candidates or list(tenant.work_orders))
+    checklist = [dict(item) for item in tenant.work_orders[wo_id]]
+    if checklist:
+        item = rng.choice(checklist)
+        item["completed"] = not item.get("completed", False)
+        item["completed_by"] = tenant.user_id if item["completed"] else None
+    response = await http.put(f"/api/work-orders/{wo_id}", json={"checklist": checklist}, headers=tenant.headers)
+    if response.status_code == 200:
+        tenant.work_orders[wo_id] = checklist
+    return "PUT /api/work-orders/{wo_id}", response
+
+
+async def op_create(http, tenant: Tenant, rng: random.Random):
+    payload = {
+        "title": f"Repair request {uuid.uuid4().hex[:6]}",
+        "type": rng.choice(["PM", "Repair"]),
+        "priority": rng.choice(["Low", "Medium", "High", "Critical"]),
+        "department_id": rng.choice(tenant.department_ids),
+        "machine_id": rng.choice(tenant.machine_ids),
+        "checklist_items": [f"Check {i}" for i in range(rng.randint(0, 4))],
+    }
+    response = await http.post("/api/work-orders", json=payload, headers=tenant.headers)
+    if response.status_code == 200:
+        body = response.json()
+        tenant.work_orders[body["id"]] = body["checklist"]
+    return "POST /api/work-orders", response
+
+
+async def op_checkout(http, tenant: Tenant, rng: random.Random):
+    payload = {"package_id": rng.choice(["starter_monthly", "professional_yearly"]), "user_count": rng.randint(1, 5),
+               "origin_url": "http://loadtest"}
+    return "POST /api/payments/create-checkout", await http.post(
+        "/api/payments/create-checkout", json=payload, headers=tenant.headers)
+
+
+OPERATIONS = {"board": op_board, "detail": op_detail, "toggle": op_toggle, "create": op_create,
+              "checkout": op_checkout}
+
+
+async def drive(http, tenants: List[Tenant], mix: Dict[str, int], concurrency: int,
+                duration: float, max_requests: int, seed: int) -> Tuple[Dict[str, List[float]], Dict[str, int], float]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = time.perf_counter() + duration
+    issued = 0
+
+    async def worker(worker_id: int):
+        nonlocal issued
+        rng = random.Random(seed + worker_id)
+        while time.perf_counter() < deadline and (not max_requests or issued < max_requests):
+            issued += 1
+            operation = OPERATIONS[rng.choices(names, weights)[0]]
+            tenant = rng.choice(tenants)
+            start = time.perf_counter()
+            label, response = await operation(http, tenant, rng)
+            latencies[label].append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors[label] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> Dict[str, dict]:
+    endpoints = {}
+    for label, values in sorted(latencies.items()):
+        ordered = sorted(values)
+        endpoints[label] = {
+            "requests": len(values),
+            "errors": errors.get(label, 0),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3),
+        }
+    return endpoints
+
+
+async def run(args) -> dict:
+    import httpx
+    import server
+
+    # httpx logs every request at INFO under the app's logging config
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if args.in_memory:
+        use_in_memory_db(server)
+
+    rng = random.Random(args.seed)
+    tenants = [await seed_tenant(server, i, args.work_orders, rng) for i in range(args.tenants)]
+    mix = parse_mix(args.mix)
+
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as http:
+            if args.warmup:
+                await drive(http, tenants, mix, args.concurrency, args.warmup, 0, args.seed)
+            latencies, errors, elapsed = await drive(
+                http, tenants, mix, args.concurrency, args.duration, args.requests, args.seed)
+    finally:
+        await server.app.router.shutdown()
+        if not args.in_memory and not args.keep:
+            await server.client.drop_database(os.environ["DB_NAME"])
+
+    endpoints = summarize(latencies, errors, elapsed)
+    total_requests = sum(e["requests"] for e in endpoints.values())
+    return {
+        "benchmark": "loadtest",
+        "config": {
+            "backend": "in-memory" if args.in_memory else "mongod",
+            "tenants": args.tenants,
+            "work_orders_per_tenant": args.work_orders,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "mix": mix,
+            "seed": args.seed,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "total": {
+            "requests": total_requests,
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "throughput_rps": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        },
+        "endpoints": endpoints,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--in-memory", action="store_true", help="Use mongomock-motor instead of a mongod")
+    parser.add_argument("--tenants", type=int, default=3)
+    parser.add_argument("--work-orders", type=int, default=500, help="Work orders seeded per tenant")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to drive load")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests (0 = no cap)")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Seconds of unrecorded warm-up load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark database afterwards")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+        print(f"Wrote {args.output}: {report['total']['throughput_rps']} req/s", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Benchmark work order list serialization: FastAPI default path vs FastJSONResponse.
+
+Run from the backend directory:
+
+    python -m benchmarks.serialization --count 10000 --repeat 5
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timezone, timedelta
+from typing import List
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "simplepm_bench")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from fastjson import FastJSONResponse  # noqa: E402
+from server import (  # noqa: E402
+    WorkOrder, WorkOrderChecklistItem, WorkOrderType, WorkOrderStatus, Priority,
+)
+
+
+def build_work_orders(count: int, seed: int = 42) -> List[WorkOrder]:
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    work_orders = []
+    for i in range(count):
+        created = base + timedelta(minutes=rng.randint(0, 500_000))
+        checklist = [
+            WorkOrderChecklistItem(
+                text=f"Inspect component {j}",
+                completed=rng.random() < 0.5,
+                completed_at=created + timedelta(hours=j) if rng.random() < 0.5 else None,
+            )
+            for j in range(rng.randint(0, 8))
+        ]
+        work_orders.append(WorkOrder(
+            wo_id=f"WO-2025-{i + 1:04d}",
+            title=f"Work order {i}",
+            type=rng.choice(list(WorkOrderType)),
+            priority=rng.choice(list(Priority)),
+            status=rng.choice(list(WorkOrderStatus)),
+            requested_by="bench-user",
+            requested_by_name="bench",
+            department_name="Packaging",
+            machine_name=f"Line {i % 40}",
+            due_date=created + timedelta(days=rng.randint(1, 30)),
+            estimated_duration=rng.choice([None, 30, 60, 120]),
+            description="Routine preventive maintenance. " * rng.randint(1, 6),
+            checklist=checklist,
+            tags=["pm", "line"][: rng.randint(0, 2)],
+            created_at=created,
+            updated_at=created,
+        ))
+    return work_orders
+
+
+async def _default_path(field, work_orders) -> bytes:
+    content = await serialize_response(field=field, response_content=work_orders)
+    return JSONResponse(content).body
+
+
+def _fast_path(work_orders) -> bytes:
+    return FastJSONResponse(work_orders).body
+
+
+def _time(fns, repeat: int) -> List[List[float]]:
+    """Timings per function, taken in turns so both see the same machine load"""
+    timings = [[] for _ in fns]
+    for _ in range(repeat):
+        for fn, fn_timings in zip(fns, timings):
+            start = time.perf_counter()
+            fn()
+            fn_timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run(count: int, repeat: int) -> dict:
+    import asyncio
+
+    work_orders = build_work_orders(count)
+    field = create_response_field(name="Response_get_work_orders", type_=List[WorkOrder])
+    loop = asyncio.new_event_loop()
+    try:
+        default_body = loop.run_until_complete(_default_path(field, work_orders))
+        fast_body = _fast_path(work_orders)
+        if json.loads(default_body) != json.loads(fast_body):
+            raise SystemExit("FastJSONResponse output differs from the default FastAPI output")
+
+        default_times, fast_times = _time(
+            [lambda: loop.run_until_complete(_default_path(field, work_orders)), lambda: _fast_path(work_orders)],
+            repeat,
+        )
+    finally:
+        loop.close()
+
+    default_median = statistics.median(default_times)
+    fast_median = statistics.median(fast_times)
+    return {
+        "benchmark": "serialization",
+        "count": count,
+        "repeat": repeat,
+        "body_bytes": len(fast_body),
+        "default_median_s": round(default_median, 6),
+        "fast_median_s": round(fast_median, 6),
+        "speedup": round(default_median / fast_median, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    args = parser.parse_args()
+
+    result = run(args.count, args.repeat)
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"Serializing {result['count']} work orders ({result['body_bytes']} bytes)")
+    print(f"  FastAPI default (validate + jsonable + json): {result['default_median_s'] * 1000:.1f} ms")
+    print(f"  FastJSONResponse (model_dump + orjson):       {result['fast_median_s'] * 1000:.1f} ms")
+    print(f"  Speedup: {result['speedup']}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""In-process caching primitives.
+
+``TimedCache`` is a TTL cache whose lookups feed the cache hit-rate counters
+on /metrics. ``SingleFlight`` coalesces concurrent calls for the same key
+into one in-flight call whose result every caller shares.
+
+Both are per worker process and only suitable for data that may be briefly
+stale; anything that must be exact goes to Mongo.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from cachetools import TTLCache
+
+from metrics import SINGLE_FLIGHT_CALLS, record_cache
+
+_MISSING = object()
+
+
+class TimedCache:
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._cache.get(key, _MISSING)
+        record_cache(self.name, value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._cache[key] = value
+
+    def pop(self, key: Hashable) -> None:
+        self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers await the same result.
+
+    The call runs as its own task, so a caller that is cancelled (client
+    disconnect) does not cancel the work the other callers are waiting on.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        task: Optional[asyncio.Task] = self._inflight.get(key)
+        if task is None:
+            SINGLE_FLIGHT_CALLS.inc(name=self.name, role="leader")
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            SINGLE_FLIGHT_CALLS.inc(name=self.name, role="coalesced")
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved even if every caller went away
@@ -0,0 +1,151 @@
+"""Cross-worker invalidation for in-process caches.
+
+Each uvicorn worker keeps its own caches, so a write served by one worker
+leaves stale entries in the others. ``CacheCoherence`` tails a change stream
+on the watched collections and calls the handlers registered for the
+collection with the changed document's key fields, so every worker evicts
+the same keys shortly after the write, whichever worker made it.
+
+Change streams need a replica set (or sharded cluster). On a standalone
+mongod the subsystem falls back to polling each collection for documents
+whose ``updated_at`` is newer than the last one seen. Deletes are invisible
+to the poll, so caches must still carry a TTL that bounds staleness.
+
+Handlers receive the changed document's key fields (``KEY_FIELDS``) or None
+when the change cannot be attributed to a key (a delete, an invalidated
+stream); on None they should drop everything they hold for the collection.
+Every change also bumps ``version(collection)``, which derived caches can
+fold into their keys.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from metrics import CACHE_INVALIDATIONS
+
+logger = logging.getLogger(__name__)
+
+KEY_FIELDS = ("id", "username", "session_id", "wo_id")
+
+# Server errors meaning "change streams are not available here"
+CHANGE_STREAMS_UNSUPPORTED = {40573, 40324, 115}
+
+Handler = Callable[[Optional[dict]], None]
+
+
+class CacheCoherence:
+    def __init__(self, db, collections: Sequence[str], poll_interval: float = 1.0, retry_delay: float = 5.0):
+        self.db = db
+        self.collections = list(collections)
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.mode = "stopped"
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._resume_token = None
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, collection: str, handler: Handler) -> None:
+        if collection not in self.collections:
+            raise ValueError(f"{collection} is not watched; add it to the coherence collections")
+        self._handlers[collection].append(handler)
+
+    def version(self, collection: str) -> int:
+        return self._versions[collection]
+
+    def dispatch(self, collection: str, document: Optional[dict], source: str) -> None:
+        self._versions[collection] += 1
+        CACHE_INVALIDATIONS.inc(collection=collection, source=source)
+        for handler in self._handlers.get(collection, ()):
+            try:
+                handler(document)
+            except Exception:
+                logger.exception("Cache invalidation handler for %s failed", collection)
+
+    def _invalidate_all(self, source: str) -> None:
+        for collection in self.collections:
+            self.dispatch(collection, None, source)
+
+    async def _watch(self) -> None:
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": self.collections}}},
+            {"$project": {"operationType": 1, "ns": 1, "documentKey": 1,
+                          **{f"fullDocument.{field}": 1 for field in KEY_FIELDS}}},
+        ]
+        async with self.db.watch(pipeline, full_document="updateLookup", resume_after=self._resume_token) as stream:
+            self.mode = "change_stream"
+            async for change in stream:
+                self._resume_token = stream.resume_token
+                collection = change.get("ns", {}).get("coll")
+                if change["operationType"] in ("drop", "rename", "dropDatabase", "invalidate"):
+                    self._invalidate_all("change_stream")
+                    continue
+                if collection in self.collections:
+                    self.dispatch(collection, change.get("fullDocument"), "change_stream")
+
+    async def _poll(self) -> None:
+        self.mode = "poll"
+        for collection in self.collections:
+            try:
+                await self.db[collection].create_index("updated_at")
+            except PyMongoError as exc:
+                logger.warning("Could not index %s.updated_at for polling (%s)", collection, exc)
+        start = datetime.now(timezone.utc).isoformat()
+        watermarks = {collection: start for collection in self.collections}
+        projection = {"_id": 0, "updated_at": 1, **{field: 1 for field in KEY_FIELDS}}
+        while True:
+            for collection in self.collections:
+                try:
+                    changed = await self.db[collection].find(
+                        {"updated_at": {"$gt": watermarks[collection]}}, projection
+                    ).sort("updated_at", 1).to_list(1000)
+                except PyMongoError as exc:
+                    logger.warning("Polling %s for changes failed (%s)", collection, exc)
+                    continue
+                for document in changed:
+                    updated_at = document["updated_at"]
+                    if isinstance(updated_at, datetime):
+                        # Tolerate BSON dates next to the ISO strings prepare_for_mongo writes
+                        updated_at = updated_at.replace(tzinfo=updated_at.tzinfo or timezone.utc).isoformat()
+                    watermarks[collection] = max(watermarks[collection], updated_at)
+                    self.dispatch(collection, document, "poll")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._watch()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as exc:
+                if exc.code not in CHANGE_STREAMS_UNSUPPORTED:
+                    logger.warning("Change stream failed (%s); retrying", exc)
+                else:
+                    logger.info("Change streams unavailable (%s); polling updated_at instead", exc)
+                    await self._poll()
+                    return
+            except PyMongoError as exc:
+                logger.warning("Change stream interrupted (%s); resuming", exc)
+            # Whatever happened while the stream was down is unknown
+            self._invalidate_all("change_stream")
+            self.mode = "reconnecting"
+            await asyncio.sleep(self.retry_delay)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+        self.mode = "stopped"
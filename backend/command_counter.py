@@ -0,0 +1,102 @@
+"""Count MongoDB round trips issued while a block of code runs.
+
+``CommandCounter`` is registered on the Motor client and does nothing until
+a counting window is open, so it is safe to leave on in production. Tests use
+it to pin round-trip budgets per endpoint and to catch N+1 patterns, where
+the number of commands grows with the size of the result:
+
+    with command_counter.window() as window:
+        client.get("/api/work-orders", headers=headers)
+    assert_command_budget(window, 3)
+
+Windows see every command issued by the process, so only open them while a
+single request is in flight (as the TestClient does).
+"""
+import threading
+import warnings
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from pymongo import monitoring
+
+from metrics import command_collection
+
+# Cursor continuation is paced by batch size in bytes, not by rows processed
+# per request, so budgets ignore it by default.
+DEFAULT_IGNORED = ("getMore", "endSessions", "killCursors")
+
+
+class NPlusOneWarning(UserWarning):
+    pass
+
+
+class CommandWindow:
+    def __init__(self):
+        self.commands: List[Tuple[str, str]] = []
+
+    def count(self, ignore: Sequence[str] = DEFAULT_IGNORED) -> int:
+        return sum(1 for name, _ in self.commands if name not in ignore)
+
+    def by_command(self) -> Dict[str, int]:
+        """Counts keyed by 'collection.command'"""
+        return dict(Counter(f"{collection}.{name}" for name, collection in self.commands))
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self._windows: List[CommandWindow] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def window(self) -> Iterator[CommandWindow]:
+        window = CommandWindow()
+        with self._lock:
+            self._windows.append(window)
+        try:
+            yield window
+        finally:
+            with self._lock:
+                self._windows.remove(window)
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if not self._windows:
+            return
+        entry = (event.command_name, command_collection(event.command_name, event.command))
+        with self._lock:
+            for window in self._windows:
+                window.commands.append(entry)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+def assert_command_budget(window: CommandWindow, budget: int, ignore: Sequence[str] = DEFAULT_IGNORED) -> None:
+    count = window.count(ignore)
+    assert count <= budget, (
+        f"Expected at most {budget} database commands, got {count}: {window.by_command()}"
+    )
+
+
+def check_round_trip_scaling(counts_by_size: Dict[int, int], label: str = "") -> bool:
+    """Warn (NPlusOneWarning) when command counts grow with result size.
+
+    ``counts_by_size`` maps the number of rows the request returned to the
+    commands it issued. Returns True when the count is flat.
+    """
+    sizes = sorted(counts_by_size)
+    counts = [counts_by_size[size] for size in sizes]
+    if len(set(counts)) <= 1:
+        return True
+    growth = counts[-1] - counts[0]
+    rows = sizes[-1] - sizes[0]
+    warnings.warn(
+        f"{label or 'request'} issued {counts} commands for result sizes {sizes} "
+        f"(+{growth} commands over +{rows} rows): likely N+1 query pattern",
+        NPlusOneWarning,
+        stacklevel=2,
+    )
+    return False
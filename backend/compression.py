@@ -0,0 +1,225 @@
+"""Response compression middleware negotiated via Accept-Encoding.
+
+Supports zstd, brotli and gzip. zstd and brotli are optional: when the
+``zstandard``/``brotli`` packages are missing those encodings are simply not
+offered. Bodies below ``minimum_size`` are sent as-is, single-shot bodies of
+``offload_size`` bytes or more are compressed in a worker thread so large work
+order lists don't stall the event loop, and streaming responses (NDJSON, CSV
+exports) are compressed chunk by chunk with a sync flush after every chunk.
+"""
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+)
+
+
+class _GzipStream:
+    def __init__(self, level: int = 6):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def sync(self) -> bytes:
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, quality: int = 4):
+        self._obj = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data)
+
+    def sync(self) -> bytes:
+        return self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class _ZstdStream:
+    def __init__(self, level: int = 3):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def sync(self) -> bytes:
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_encodings() -> Dict[str, Callable[[], object]]:
+    """Encodings this process can produce, in server preference order"""
+    encodings: Dict[str, Callable[[], object]] = {}
+    if zstandard is not None:
+        encodings["zstd"] = _ZstdStream
+    if brotli is not None:
+        encodings["br"] = _BrotliStream
+    encodings["gzip"] = _GzipStream
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, supported: List[str]) -> Optional[str]:
+    """Pick the best supported encoding for an Accept-Encoding header.
+
+    Highest q-value wins; ties go to the earliest entry in ``supported``.
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[token] = q
+
+    best: Optional[Tuple[float, int, str]] = None
+    for index, encoding in enumerate(supported):
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q <= 0:
+            continue
+        candidate = (q, -index, encoding)
+        if best is None or candidate > best:
+            best = candidate
+    return best[2] if best else None
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, offload_size: int = 256 * 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.encoders = available_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate_encoding(accept_encoding, list(self.encoders))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message: Optional[Message] = None
+        self.stream = None
+        self.passthrough = False
+        self.started = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            return
+
+        if message["type"] != "http.response.body":
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.passthrough:
+            await self._start()
+            await self.downstream(message)
+            return
+
+        if not self.started and not more_body:
+            # Whole response in a single message.
+            if len(body) < self.middleware.minimum_size:
+                await self._start()
+                await self.downstream(message)
+                return
+            if len(body) >= self.middleware.offload_size:
+                compressed = await anyio.to_thread.run_sync(self._compress_all, body)
+            else:
+                compressed = self._compress_all(body)
+            await self._start(compressed_length=len(compressed))
+            await self.downstream({"type": "http.response.body", "body": compressed, "more_body": False})
+            return
+
+        # Streaming response: compress each chunk and flush so clients see
+        # rows as they are produced.
+        if self.stream is None:
+            self.stream = self.middleware.encoders[self.encoding]()
+            await self._start(streaming=True)
+        if len(body) >= self.middleware.offload_size:
+            chunk = await anyio.to_thread.run_sync(self._compress_chunk, body, more_body)
+        else:
+            chunk = self._compress_chunk(body, more_body)
+        await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _compress_all(self, body: bytes) -> bytes:
+        stream = self.middleware.encoders[self.encoding]()
+        return stream.compress(body) + stream.finish()
+
+    def _compress_chunk(self, body: bytes, more_body: bool) -> bytes:
+        data = self.stream.compress(body) if body else b""
+        return data + (self.stream.sync() if more_body else self.stream.finish())
+
+    async def _start(self, compressed_length: Optional[int] = None, streaming: bool = False) -> None:
+        if self.started:
+            return
+        self.started = True
+        message = self.start_message
+        if compressed_length is not None or streaming:
+            headers = MutableHeaders(raw=message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if streaming:
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(compressed_length)
+        elif not self.passthrough:
+            MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+        await self.downstream(message)
@@ -0,0 +1,114 @@
+"""Bulk CSV import helpers.
+
+An uploaded CSV is parsed ``batch_size`` records at a time from the spooled
+upload (so a large file never sits in memory as a whole), each batch is
+validated and inserted with one unordered ``insert_many``, and every row that
+fails validation or the insert is reported back with its line number. The
+per-collection row mapping lives next to the models in server.py.
+
+    report = ImportReport("machines")
+    async for batch in read_csv_batches(upload, 500):
+        ...
+        await insert_unordered(db.machines, docs, lines, report)
+    return report.as_dict()
+"""
+import csv
+import io
+import time
+from itertools import islice
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import anyio
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from metrics import IMPORT_ROWS
+
+Row = Tuple[int, Dict[str, str]]
+
+
+class ImportReport:
+    def __init__(self, kind: str, max_errors: int = 1000):
+        self.kind = kind
+        self.max_errors = max_errors
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self._start = time.perf_counter()
+
+    def error(self, line: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self) -> dict:
+        elapsed = time.perf_counter() - self._start
+        IMPORT_ROWS.inc(self.inserted, kind=self.kind, outcome="inserted")
+        IMPORT_ROWS.inc(self.failed, kind=self.kind, outcome="failed")
+        return {
+            "kind": self.kind,
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+            "errors_truncated": self.failed > len(self.errors),
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(self.rows / elapsed, 1) if elapsed > 0 else None,
+        }
+
+
+def _normalise(row: Dict[Optional[str], str]) -> Dict[str, str]:
+    """Lower-case headers, strip cells and drop empty ones (and overflow cells under the None key)"""
+    return {
+        key.strip().lower(): value.strip()
+        for key, value in row.items()
+        if key is not None and isinstance(value, str) and value.strip()
+    }
+
+
+async def read_csv_batches(upload, batch_size: int = 500) -> AsyncIterator[List[Row]]:
+    """(line number, row) batches from an UploadFile; file reads and parsing run in a worker thread"""
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+
+    def next_batch() -> List[Row]:
+        return [(reader.line_num, _normalise(row)) for row in islice(reader, batch_size)]
+
+    try:
+        while True:
+            batch = await anyio.to_thread.run_sync(next_batch)
+            if not batch:
+                return
+            yield batch
+    finally:
+        # Leave the upload's own file open for Starlette to close
+        text.detach()
+
+
+def split_list(value: Optional[str]) -> List[str]:
+    """``a;b;c`` cells, the list format exports write"""
+    return [item.strip() for item in (value or "").split(";") if item.strip()]
+
+
+def validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in exc.errors()
+    )
+
+
+async def insert_unordered(collection, docs: List[dict], lines: Sequence[int], report: ImportReport) -> List[int]:
+    """insert_many(ordered=False); failed documents are reported by line. Returns the indexes inserted"""
+    if not docs:
+        return []
+    failed = set()
+    try:
+        await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as exc:
+        for error in exc.details.get("writeErrors", []):
+            failed.add(error["index"])
+            reason = "duplicate key" if error.get("code") == 11000 else error.get("errmsg", "write failed")
+            report.error(lines[error["index"]], reason)
+    inserted = [index for index in range(len(docs)) if index not in failed]
+    report.inserted += len(inserted)
+    return inserted
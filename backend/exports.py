@@ -0,0 +1,167 @@
+"""Streaming work order exports (CSV and Parquet).
+
+Rows are read from a Motor cursor ``batch_size`` documents at a time and
+encoded batch by batch, so memory stays bounded by one batch whatever the
+export size. Encoding runs in a worker thread to keep the event loop
+responsive. Parquet output writes one row group per batch through pyarrow;
+pandas and pyarrow are imported on the first Parquet export only;
+``benchmarks/importtime.py`` keeps them off the startup path.
+"""
+import csv
+import io
+from typing import AsyncIterator, Dict, List, Sequence
+
+import anyio
+
+# column -> Parquet type ("string", "int", "timestamp", "list")
+EXPORT_COLUMNS: Dict[str, str] = {
+    "wo_id": "string",
+    "title": "string",
+    "type": "string",
+    "priority": "string",
+    "status": "string",
+    "site": "string",
+    "department_name": "string",
+    "machine_name": "string",
+    "assignee_name": "string",
+    "requested_by_name": "string",
+    "location": "string",
+    "description": "string",
+    "estimated_duration": "int",
+    "tags": "list",
+    "due_date": "timestamp",
+    "scheduled_start": "timestamp",
+    "scheduled_end": "timestamp",
+    "created_at": "timestamp",
+    "updated_at": "timestamp",
+    "completed_at": "timestamp",
+    "id": "string",
+}
+DEFAULT_COLUMNS = [column for column in EXPORT_COLUMNS if column not in ("description", "id")]
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+
+
+def parse_columns(spec: str = None) -> List[str]:
+    """Validate a comma-separated column list; raises ValueError on unknown columns"""
+    if not spec:
+        return list(DEFAULT_COLUMNS)
+    columns = [column.strip() for column in spec.split(",") if column.strip()]
+    unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown export columns: {', '.join(unknown)}")
+    return columns
+
+
+def projection(columns: Sequence[str]) -> Dict[str, int]:
+    return {"_id": 0, **{column: 1 for column in columns}}
+
+
+async def _batches(cursors, batch_size: int) -> AsyncIterator[List[dict]]:
+    for cursor in cursors:
+        while True:
+            batch = await cursor.to_list(length=batch_size)
+            if not batch:
+                break
+            yield batch
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return ";".join(str(item) for item in value)
+    return "" if value is None else value
+
+
+def _encode_csv(batch: List[dict], columns: Sequence[str], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for doc in batch:
+        writer.writerow([_csv_value(doc.get(column)) for column in columns])
+    return buffer.getvalue().encode("utf-8")
+
+
+async def stream_csv(cursors, columns: Sequence[str], batch_size: int = 5000) -> AsyncIterator[bytes]:
+    header = True
+    async for batch in _batches(cursors, batch_size):
+        yield await anyio.to_thread.run_sync(_encode_csv, batch, columns, header)
+        header = False
+    if header:
+        yield _encode_csv([], columns, True)
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents are handed out after each row group"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _parquet_schema(columns: Sequence[str]):
+    import pyarrow as pa
+
+    types = {
+        "string": pa.string(),
+        "int": pa.int64(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "list": pa.list_(pa.string()),
+    }
+    return pa.schema([(column, types[EXPORT_COLUMNS[column]]) for column in columns])
+
+
+def _parquet_table(batch: List[dict], columns: Sequence[str], schema):
+    import pandas as pd
+    import pyarrow as pa
+
+    frame = pd.DataFrame.from_records(batch, columns=list(columns))
+    for column in columns:
+        kind = EXPORT_COLUMNS[column]
+        if kind == "timestamp":
+            frame[column] = pd.to_datetime(frame[column], utc=True, format="ISO8601", errors="coerce")
+        elif kind == "int":
+            frame[column] = pd.to_numeric(frame[column], errors="coerce").astype("Int64")
+        elif kind == "list":
+            # A batch where no document has the field comes out as float NaN, which arrow can't cast to a list
+            frame[column] = pd.Series([value if isinstance(value, list) else None for value in frame[column]],
+                                      index=frame.index, dtype=object)
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+async def stream_parquet(cursors, columns: Sequence[str], batch_size: int = 50000,
+                         compression: str = "zstd") -> AsyncIterator[bytes]:
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(columns)
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+
+    def write(batch):
+        writer.write_table(_parquet_table(batch, columns, schema), row_group_size=len(batch))
+        return sink.drain()
+
+    try:
+        async for batch in _batches(cursors, batch_size):
+            chunk = await anyio.to_thread.run_sync(write, batch)
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,36 @@
+"""Fast JSON rendering for API responses.
+
+FastAPI's default path for a ``response_model`` endpoint re-validates the
+returned models, dumps them to JSON-compatible primitives and then encodes
+them again with the stdlib ``json`` module. Handlers that already hold fully
+built models can return a ``FastJSONResponse`` instead and let orjson encode
+the models' python dump directly.
+
+Output matches pydantic's JSON mode: UTC datetimes are rendered with a ``Z``
+suffix, naive datetimes without an offset and enums by value.
+"""
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content (models, lists of models, plain dicts) to JSON bytes"""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,125 @@
+"""Periodic background jobs coordinated through a Mongo lease.
+
+Every uvicorn worker runs the same job loops; ``LeaseLock`` makes sure only
+one of them executes a given job per interval. The lease is a document in
+the ``jobs`` collection holding the owner and an expiry, so a worker that
+dies mid-run releases it implicitly once ``lease_until`` passes.
+
+    job = PeriodicJob("reconcile_payments", 300, reconcile, LeaseLock(db.jobs, "reconcile_payments", 600))
+    job.start()
+    ...
+    await job.stop()
+"""
+import asyncio
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from metrics import JOB_DURATION, JOB_RUNS
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLock:
+    def __init__(self, collection, name: str, lease_seconds: float):
+        self.collection = collection
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.owner = uuid.uuid4().hex
+
+    async def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            result = await self.collection.update_one(
+                {"_id": self.name, "$or": [{"lease_until": {"$lte": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=self.lease_seconds),
+                          "acquired_at": now}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Another owner holds an unexpired lease, so the upsert collided with it
+            return False
+        return result.matched_count == 1 or result.upserted_id is not None
+
+    async def release(self, hold_for: float = 0, **state: Any) -> None:
+        """End the lease, optionally keeping it ``hold_for`` seconds longer.
+
+        ``state`` (e.g. the last run summary) is stored on the lock document.
+        """
+        lease_until = datetime.now(timezone.utc) + timedelta(seconds=hold_for)
+        await self.collection.update_one(
+            {"_id": self.name, "owner": self.owner},
+            {"$set": {"lease_until": lease_until, **state}},
+        )
+
+
+class PeriodicJob:
+    def __init__(self, name: str, interval: float, run: Callable[[], Awaitable[Optional[dict]]],
+                 lock: Optional[LeaseLock] = None, initial_delay: Optional[float] = None):
+        self.name = name
+        self.interval = interval
+        self.run = run
+        self.lock = lock
+        # Spread the first run so workers booted together do not all contend at once
+        self.initial_delay = random.uniform(0, interval) if initial_delay is None else initial_delay
+        self.last_result: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+
+    async def run_once(self) -> Optional[dict]:
+        """Run the job if the lease is free; None when another worker holds it"""
+        if self.lock is not None and not await self.lock.acquire():
+            JOB_RUNS.inc(job=self.name, outcome="skipped")
+            return None
+        start = time.perf_counter()
+        outcome = "error"
+        result = None
+        try:
+            result = await self.run() or {}
+            outcome = "ok"
+            self.last_result = result
+            return result
+        finally:
+            JOB_DURATION.observe(time.perf_counter() - start, job=self.name)
+            JOB_RUNS.inc(job=self.name, outcome=outcome)
+            if self.lock is not None:
+                # Hold the lease for most of the interval so the other workers' timers skip this round
+                hold_for = self.interval * 0.9 if outcome == "ok" else 0
+                await self.lock.release(hold_for, last_outcome=outcome, last_result=result,
+                                        last_run_at=datetime.now(timezone.utc))
+
+    async def _loop(self) -> None:
+        delay = self.initial_delay
+        while True:
+            try:
+                await asyncio.wait_for(self._stop.wait(), delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                result = await self.run_once()
+                if result:
+                    logger.info("Job %s finished: %s", self.name, result)
+            except Exception:
+                logger.exception("Job %s failed", self.name)
+            delay = self.interval
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stop.clear()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stop.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=30)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        self._task = None
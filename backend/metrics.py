@@ -0,0 +1,405 @@
+"""Process-local metrics with Prometheus text exposition.
+
+A deliberately small registry (counters, gauges, histograms) so handlers,
+middleware and pymongo monitoring listeners can record measurements without
+pulling in a client library. Every uvicorn worker keeps its own registry;
+scrape each worker (or run a single worker per pod) for complete numbers.
+
+Listeners run on Motor's executor threads, so every metric guards its state
+with a lock.
+"""
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import common as mongo_defaults, monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label key -> (bucket counts, sum, count)
+        self._values: Dict[LabelKey, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+HTTP_RESPONSE_SIZE = REGISTRY.histogram(
+    "http_response_size_bytes", "HTTP response body size on the wire by route.", ("method", "route"),
+    buckets=DEFAULT_SIZE_BUCKETS)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served.", ("method",))
+
+MONGO_COMMANDS = REGISTRY.counter(
+    "mongodb_commands_total", "MongoDB commands by collection, command and outcome.",
+    ("collection", "command", "outcome"))
+MONGO_COMMAND_LATENCY = REGISTRY.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round-trip time.", ("collection", "command"))
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total", "In-process cache lookups by cache and result (hit/miss).", ("cache", "result"))
+
+CACHE_INVALIDATIONS = REGISTRY.counter(
+    "cache_invalidations_total", "Cache invalidation events by collection and source (change_stream, poll).",
+    ("collection", "source"))
+
+SINGLE_FLIGHT_CALLS = REGISTRY.counter(
+    "singleflight_calls_total", "Single-flight calls by role (leader ran the call, coalesced shared it).",
+    ("name", "role"))
+
+WEBHOOK_EVENTS = REGISTRY.counter(
+    "webhook_events_total", "Webhook inbox events by outcome (received, duplicate, applied, retried, dead).",
+    ("outcome",))
+WEBHOOK_LAG = REGISTRY.histogram(
+    "webhook_event_lag_seconds", "Time from webhook receipt to the event being applied.",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0, 3600.0))
+
+JOB_RUNS = REGISTRY.counter(
+    "job_runs_total", "Periodic job runs by outcome (ok, error, skipped when another worker held the lease).",
+    ("job", "outcome"))
+JOB_DURATION = REGISTRY.histogram(
+    "job_duration_seconds", "Periodic job run time.", ("job",),
+    buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0))
+
+PAYMENT_PROVIDER_REQUESTS = REGISTRY.counter(
+    "payment_provider_requests_total", "Payment provider calls by operation and outcome.",
+    ("provider", "operation", "outcome"))
+PAYMENT_PROVIDER_LATENCY = REGISTRY.histogram(
+    "payment_provider_duration_seconds", "Payment provider call latency.", ("provider", "operation"))
+
+ADMISSION_ACTIVE = REGISTRY.gauge(
+    "admission_active_requests", "Requests holding an admission slot, per route class.", ("route_class",))
+ADMISSION_QUEUED = REGISTRY.gauge(
+    "admission_queued_requests", "Requests waiting for an admission slot, per route class.", ("route_class",))
+ADMISSION_WAIT = REGISTRY.histogram(
+    "admission_wait_seconds", "Time spent queued for admission (admitted and shed).", ("route_class",),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+ADMISSION_REJECTED = REGISTRY.counter(
+    "admission_rejected_total", "Requests shed with 503 by route class and reason (queue_full, timeout).",
+    ("route_class", "reason"))
+
+IMPORT_ROWS = REGISTRY.counter(
+    "csv_import_rows_total", "Bulk CSV import rows by kind and outcome (inserted, failed).", ("kind", "outcome"))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Record an in-process cache lookup for the hit-rate counters"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def route_label(scope: Scope) -> str:
+    """Templated route path (e.g. /api/work-orders/{wo_id}) to keep label cardinality bounded"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec(method=method)
+            route = route_label(scope)
+            HTTP_REQUESTS.inc(method=method, route=route, status=str(status_code))
+            HTTP_LATENCY.observe(elapsed, method=method, route=route)
+            HTTP_RESPONSE_SIZE.observe(size, method=method, route=route)
+
+
+def command_collection(command_name: str, command: dict) -> str:
+    """Collection a MongoDB command targets, or "" for database-level commands"""
+    if command_name == "getMore":
+        return str(command.get("collection", ""))
+    target = command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every MongoDB command per collection and command name"""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        collection = command_collection(event.command_name, event.command)
+        with self._lock:
+            self._pending[(event.request_id, event.operation_id)] = collection
+
+    def _finish(self, event, outcome: str) -> None:
+        with self._lock:
+            collection = self._pending.pop((event.request_id, event.operation_id), "")
+        MONGO_COMMANDS.inc(collection=collection, command=event.command_name, outcome=outcome)
+        MONGO_COMMAND_LATENCY.observe(event.duration_micros / 1_000_000,
+                                      collection=collection, command=event.command_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, "success")
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, "failure")
+
+
+MONGO_POOL_CHECKOUT_WAIT = REGISTRY.histogram(
+    "mongodb_pool_checkout_wait_seconds", "Time spent waiting to check a connection out of the pool.",
+    ("address",), buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+MONGO_POOL_CHECKOUTS = REGISTRY.counter(
+    "mongodb_pool_checkouts_total", "Connection checkouts by outcome (ok, timeout, connectionError, poolClosed).",
+    ("address", "outcome"))
+MONGO_POOL_CONNECTIONS = REGISTRY.gauge(
+    "mongodb_pool_connections", "Open connections in the pool.", ("address",))
+MONGO_POOL_CHECKED_OUT = REGISTRY.gauge(
+    "mongodb_pool_checked_out", "Connections currently checked out.", ("address",))
+MONGO_POOL_WAITERS = REGISTRY.gauge(
+    "mongodb_pool_waiters", "Operations waiting for a connection.", ("address",))
+MONGO_POOL_MAX_SIZE = REGISTRY.gauge(
+    "mongodb_pool_max_size", "Configured maxPoolSize.", ("address",))
+MONGO_POOL_SATURATION = REGISTRY.gauge(
+    "mongodb_pool_saturation_ratio", "Checked-out connections as a fraction of maxPoolSize.", ("address",))
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Pool size, checkout wait time and saturation per server address"""
+
+    def __init__(self):
+        # Checkout start times; a checkout starts and finishes on the same thread.
+        self._local = threading.local()
+        self._max_size: Dict[str, int] = {}
+        self._checked_out: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _update_checked_out(self, address: str, delta: int) -> None:
+        with self._lock:
+            current = self._checked_out.get(address, 0) + delta
+            self._checked_out[address] = current
+            max_size = self._max_size.get(address)
+        MONGO_POOL_CHECKED_OUT.set(current, address=address)
+        if max_size:
+            MONGO_POOL_SATURATION.set(current / max_size, address=address)
+
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:
+        address = _address(event)
+        # Options only list what the client set; an explicit None means unbounded
+        max_size = event.options.get("maxPoolSize", mongo_defaults.MAX_POOL_SIZE)
+        if max_size:
+            with self._lock:
+                self._max_size[address] = max_size
+            MONGO_POOL_MAX_SIZE.set(max_size, address=address)
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_created(self, event) -> None:
+        MONGO_POOL_CONNECTIONS.inc(address=_address(event))
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        MONGO_POOL_CONNECTIONS.dec(address=_address(event))
+
+    def connection_check_out_started(self, event) -> None:
+        self._local.started = time.perf_counter()
+        MONGO_POOL_WAITERS.inc(address=_address(event))
+
+    def _checkout_finished(self, event, outcome: str) -> None:
+        address = _address(event)
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        MONGO_POOL_WAITERS.dec(address=address)
+        MONGO_POOL_CHECKOUTS.inc(address=address, outcome=outcome)
+        if started is not None:
+            MONGO_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started, address=address)
+
+    def connection_checked_out(self, event) -> None:
+        self._checkout_finished(event, "ok")
+        self._update_checked_out(_address(event), 1)
+
+    def connection_check_out_failed(self, event) -> None:
+        self._checkout_finished(event, str(event.reason))
+
+    def connection_checked_in(self, event) -> None:
+        self._update_checked_out(_address(event), -1)
@@ -0,0 +1,259 @@
+"""Payment providers, owned by the app lifespan.
+
+``emergentintegrations`` pulls in a large dependency tree (litellm,
+google-genai, openai, ...) that only the payment handlers need. Importing it
+at module load put that cost on every worker boot, so the Stripe provider
+resolves the checkout classes the first time a payment endpoint runs instead.
+``benchmarks/importtime.py`` keeps the package off the startup path.
+
+One provider is created at startup and closed at shutdown. The Stripe
+provider reads its key once, reuses checkout clients and installs a single
+keep-alive HTTP client (``stripe.default_http_client``) with configurable
+timeouts, so TLS sessions survive across requests. Every provider call is
+timed on /metrics.
+
+``PAYMENT_PROVIDER=fake`` selects an in-memory provider for tests and
+benchmarks.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+from caching import TimedCache
+from metrics import PAYMENT_PROVIDER_LATENCY, PAYMENT_PROVIDER_REQUESTS
+
+
+class PaymentNotConfigured(Exception):
+    pass
+
+
+class CheckoutNotFound(Exception):
+    """The provider has no record of the checkout session (as opposed to the lookup failing)"""
+
+
+class CheckoutSession(BaseModel):
+    url: str
+    session_id: str
+
+
+class CheckoutStatus(BaseModel):
+    status: str
+    payment_status: str
+    amount_total: int
+    currency: str
+    metadata: Dict[str, str] = {}
+
+
+class WebhookEvent(BaseModel):
+    event_type: str
+    event_id: str
+    session_id: str
+    payment_status: str
+    metadata: Dict[str, str] = {}
+
+
+class PaymentProvider:
+    name = ""
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def _timed(self, operation: str, call):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await call()
+            outcome = "ok"
+            return result
+        finally:
+            PAYMENT_PROVIDER_LATENCY.observe(time.perf_counter() - start, provider=self.name, operation=operation)
+            PAYMENT_PROVIDER_REQUESTS.inc(provider=self.name, operation=operation, outcome=outcome)
+
+    async def create_checkout_session(self, *, amount: float, currency: str, success_url: str, cancel_url: str,
+                                      metadata: Dict[str, str], webhook_url: str):
+        """Returns an object with ``url`` and ``session_id``"""
+        if not self.configured:
+            raise PaymentNotConfigured(f"{self.name} payment provider is not configured")
+        return await self._timed("create_checkout", lambda: self._create_checkout_session(
+            amount, currency, success_url, cancel_url, metadata, webhook_url))
+
+    async def get_checkout_status(self, session_id: str):
+        """Returns an object with ``status``, ``payment_status``, ``amount_total`` and ``currency``"""
+        return await self._timed("checkout_status", lambda: self._get_checkout_status(session_id))
+
+    async def handle_webhook(self, body: bytes, signature: Optional[str]):
+        """Returns an object with ``event_type``, ``event_id``, ``session_id`` and ``payment_status``"""
+        return await self._timed("webhook", lambda: self._handle_webhook(body, signature))
+
+
+class StripeProvider(PaymentProvider):
+    name = "stripe"
+
+    def __init__(self, api_key: Optional[str], connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 max_retries: int = 2, pool_size: int = 10):
+        self.api_key = api_key
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        # webhook_url -> StripeCheckout. The URL can follow the client's origin, so the
+        # cache is bounded; an evicted client is cheap to build again.
+        self._checkouts = TimedCache("stripe_checkouts", maxsize=16, ttl=3600)
+        self._http_client = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _install_http_client(self) -> None:
+        """Share one pooled keep-alive session for every Stripe API call"""
+        try:
+            import requests
+            import stripe
+        except ImportError:
+            return
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        self._http_client = stripe.RequestsClient(
+            timeout=(self.connect_timeout, self.read_timeout),
+            session=session,
+            async_fallback_client=stripe.HTTPXClient(timeout=self.read_timeout),
+        )
+        stripe.default_http_client = self._http_client
+        stripe.max_network_retries = self.max_retries
+
+    def _checkout(self, webhook_url: str = ""):
+        checkout = self._checkouts.get(webhook_url)
+        if checkout is None:
+            from emergentintegrations.payments.stripe.checkout import StripeCheckout
+
+            if self._http_client is None:
+                self._install_http_client()
+            checkout = StripeCheckout(api_key=self.api_key, webhook_url=webhook_url)
+            self._checkouts.set(webhook_url, checkout)
+        return checkout
+
+    async def close(self) -> None:
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
+        self._checkouts.clear()
+
+    async def _create_checkout_session(self, amount, currency, success_url, cancel_url, metadata, webhook_url):
+        from emergentintegrations.payments.stripe.checkout import CheckoutSessionRequest
+
+        checkout_request = CheckoutSessionRequest(
+            amount=amount,
+            currency=currency,
+            success_url=success_url,
+            cancel_url=cancel_url,
+            metadata=metadata,
+        )
+        return await self._checkout(webhook_url).create_checkout_session(checkout_request)
+
+    async def _get_checkout_status(self, session_id):
+        try:
+            return await self._checkout().get_checkout_status(session_id)
+        except Exception as exc:
+            # stripe.error.InvalidRequestError for an unknown or purged session
+            if getattr(exc, "code", None) == "resource_missing" or getattr(exc, "http_status", None) == 404:
+                raise CheckoutNotFound(session_id) from exc
+            raise
+
+    async def _handle_webhook(self, body, signature):
+        return await self._checkout().handle_webhook(body, signature)
+
+
+class FakePaymentProvider(PaymentProvider):
+    """In-memory checkout sessions; webhooks are JSON bodies shaped like WebhookEvent"""
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.sessions: Dict[str, CheckoutStatus] = {}
+
+    async def _wait(self) -> None:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    def complete(self, session_id: str, payment_status: str = "paid") -> None:
+        """Simulate the customer finishing checkout"""
+        session = self.sessions[session_id]
+        session.status = "complete"
+        session.payment_status = payment_status
+
+    async def _create_checkout_session(self, amount, currency, success_url, cancel_url, metadata, webhook_url):
+        await self._wait()
+        session_id = f"cs_fake_{uuid.uuid4().hex}"
+        self.sessions[session_id] = CheckoutStatus(
+            status="open", payment_status="unpaid", amount_total=int(round(amount * 100)), currency=currency,
+            metadata=metadata)
+        return CheckoutSession(url=f"https://checkout.fake.local/pay/{session_id}", session_id=session_id)
+
+    async def _get_checkout_status(self, session_id):
+        await self._wait()
+        if session_id not in self.sessions:
+            raise CheckoutNotFound(session_id)
+        return self.sessions[session_id].model_copy()
+
+    async def _handle_webhook(self, body, signature):
+        await self._wait()
+        event = WebhookEvent(**json.loads(body))
+        if event.session_id in self.sessions and event.event_type == "checkout.session.completed":
+            self.complete(event.session_id, event.payment_status)
+        return event
+
+
+def create_payment_provider() -> PaymentProvider:
+    provider = os.environ.get('PAYMENT_PROVIDER', 'stripe')
+    if provider == 'fake':
+        return FakePaymentProvider(latency_ms=float(os.environ.get('PAYMENT_FAKE_LATENCY_MS', '0')))
+    if provider != 'stripe':
+        raise ValueError(f"Unknown PAYMENT_PROVIDER {provider!r}; expected 'stripe' or 'fake'")
+    return StripeProvider(
+        api_key=os.environ.get('STRIPE_SECRET_KEY'),
+        connect_timeout=float(os.environ.get('PAYMENT_CONNECT_TIMEOUT_S', '5')),
+        read_timeout=float(os.environ.get('PAYMENT_READ_TIMEOUT_S', '30')),
+        max_retries=int(os.environ.get('PAYMENT_MAX_RETRIES', '2')),
+        pool_size=int(os.environ.get('PAYMENT_POOL_SIZE', '10')),
+    )
+
+
+_provider: Optional[PaymentProvider] = None
+
+
+async def start_payment_provider() -> PaymentProvider:
+    global _provider
+    if _provider is None:
+        _provider = create_payment_provider()
+        await _provider.start()
+    return _provider
+
+
+async def close_payment_provider() -> None:
+    global _provider
+    if _provider is not None:
+        await _provider.close()
+        _provider = None
+
+
+def get_payment_provider() -> PaymentProvider:
+    """The provider started with the app; created on demand outside the lifespan (scripts, tests)"""
+    global _provider
+    if _provider is None:
+        _provider = create_payment_provider()
+    return _provider
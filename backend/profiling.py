@@ -0,0 +1,166 @@
+"""On-demand sampling profiler for individual requests.
+
+``ProfilingMiddleware`` profiles a request when it carries ``X-Profile: 1``
+and the caller is authorized (admin token), or when its path matches one of
+the configured route prefixes and wins the sample-rate draw. A background
+thread samples the event loop thread's stack at a fixed interval and the
+result is stored as collapsed stacks (``frame;frame;frame count`` lines),
+which flamegraph.pl and speedscope read directly.
+
+The loop thread is shared by every in-flight request, so samples taken while
+another request runs are attributed too; profile under low concurrency for a
+clean picture. Time spent waiting on MongoDB shows up as the loop idling in
+``select``, since Motor runs socket I/O on executor threads.
+"""
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import route_label
+
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = Path(code.co_filename)
+    # Keep the package directory for library frames (fastapi/routing.py) so
+    # Pydantic, Starlette and Motor are easy to tell apart.
+    location = f"{path.parent.name}/{path.name}" if "site-packages" in path.parts else path.name
+    return f"{code.co_name} ({location})"
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack from a background thread"""
+
+    def __init__(self, thread_id: int, interval: float = 0.001, max_duration: float = 30.0):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_duration = max_duration
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.max_duration
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack: List[str] = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+def collapse(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class ProfileStore:
+    """Keeps the most recent profiles in memory for download"""
+
+    def __init__(self, max_profiles: int = 50):
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: Dict) -> None:
+        with self._lock:
+            self._profiles[profile["id"]] = profile
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [{k: v for k, v in p.items() if k != "collapsed"} for p in reversed(profiles)]
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp, store: ProfileStore,
+                 authorize: Callable[[Headers], Awaitable[bool]],
+                 routes: Sequence[str] = (), sample_rate: float = 0.0, interval: float = 0.001):
+        self.app = app
+        self.store = store
+        self.authorize = authorize
+        self.routes = tuple(r for r in routes if r)
+        self.sample_rate = sample_rate
+        self.interval = interval
+        # One profile at a time: concurrent profilers would sample the same thread.
+        self._busy = threading.Lock()
+
+    async def _should_profile(self, scope: Scope) -> Optional[str]:
+        headers = Headers(scope=scope)
+        if headers.get(PROFILE_HEADER) == "1" and await self.authorize(headers):
+            return "header"
+        if self.routes and scope["path"].startswith(self.routes) and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trigger = await self._should_profile(scope)
+        if trigger is None or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(raw=message["headers"])[PROFILE_ID_HEADER] = profile_id
+            await send(message)
+
+        profiler = SamplingProfiler(threading.get_ident(), self.interval)
+        started_at = time.time()
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stacks = profiler.stop()
+            self._busy.release()
+            self.store.add({
+                "id": profile_id,
+                "trigger": trigger,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_label(scope),
+                "status": status_code,
+                "started_at": started_at,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                "samples": profiler.samples,
+                "interval_ms": self.interval * 1000,
+                "collapsed": collapse(stacks),
+            })
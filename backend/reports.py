@@ -0,0 +1,201 @@
+"""Maintenance analytics reports computed with pandas.
+
+Reports work on a frame of projected work order columns. ``load_frame``
+reads its cursors (hot and archived work orders) ``chunk_size`` documents
+at a time and converts each chunk to typed columns in a worker thread. Text
+columns become categoricals once the chunks are concatenated, which keeps
+the frame small and cheap to ship to the report process pool.
+
+``compute`` runs the requested reports on the frame. Every report is a
+group-by over whole columns, with no per-row Python:
+
+* ``completion``: total, completed, completion rate and on-time rate per group
+* ``overdue``: open orders past their due date, counted per aging bucket
+* ``duration``: estimated vs actual minutes (completed_at minus
+  scheduled_start, or created_at when unscheduled) for completed orders
+
+``run_compute`` sends the work to the process pool started with the app
+(``REPORT_WORKERS``), so CPU-heavy reports never block the event loop. With
+no pool (scripts, tests) it falls back to a worker thread. pandas is
+imported on first use; ``benchmarks/importtime.py`` keeps it off the startup
+path.
+"""
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional, Sequence
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+REPORTS = ("completion", "overdue", "duration")
+GROUP_COLUMNS = ("department_name", "machine_name", "priority", "type", "site", "assignee_name")
+DATE_COLUMNS = ("created_at", "due_date", "scheduled_start", "completed_at")
+REPORT_COLUMNS = GROUP_COLUMNS + DATE_COLUMNS + ("status", "estimated_duration")
+
+AGING_BINS = (0, 7, 30, 90, float("inf"))
+AGING_LABELS = ("1-7 days", "8-30 days", "31-90 days", "90+ days")
+NO_GROUP = "(none)"
+
+
+def parse_group_by(spec: Optional[str]) -> List[str]:
+    """Validate a comma-separated group-by list; raises ValueError on unknown columns"""
+    columns = [column.strip() for column in (spec or "").split(",") if column.strip()]
+    unknown = [column for column in columns if column not in GROUP_COLUMNS]
+    if unknown:
+        raise ValueError(f"Cannot group by: {', '.join(unknown)}")
+    return columns
+
+
+def _chunk_frame(docs: List[dict]):
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(docs, columns=list(REPORT_COLUMNS))
+    for column in DATE_COLUMNS:
+        frame[column] = pd.to_datetime(frame[column], utc=True, format="ISO8601", errors="coerce")
+    frame["estimated_duration"] = pd.to_numeric(frame["estimated_duration"], errors="coerce")
+    return frame
+
+
+def _finish_frame(chunks: list):
+    import pandas as pd
+
+    frame = pd.concat(chunks, ignore_index=True) if chunks else _chunk_frame([])
+    for column in GROUP_COLUMNS + ("status",):
+        frame[column] = frame[column].fillna(NO_GROUP).astype("category")
+    return frame
+
+
+async def load_frame(cursors, chunk_size: int = 20000):
+    """DataFrame of ``REPORT_COLUMNS`` from cursors projected with ``projection()``, read one after another"""
+    chunks = []
+    for cursor in cursors:
+        while True:
+            docs = await cursor.to_list(length=chunk_size)
+            if not docs:
+                break
+            chunks.append(await anyio.to_thread.run_sync(_chunk_frame, docs))
+    return await anyio.to_thread.run_sync(_finish_frame, chunks)
+
+
+def projection() -> Dict[str, int]:
+    return {"_id": 0, **{column: 1 for column in REPORT_COLUMNS}}
+
+
+def _records(table) -> List[dict]:
+    table = table.reset_index()
+    for column in table.columns:
+        if str(table[column].dtype) == "category":
+            table[column] = table[column].astype(str)
+    table = table.round(3).astype(object)
+    return table.where(table.notna(), None).to_dict("records")
+
+
+def completion_report(frame, group_by: Sequence[str]) -> List[dict]:
+    import pandas as pd
+
+    completed = frame["status"].eq("Completed")
+    on_time = completed & (frame["due_date"].isna() | (frame["completed_at"] <= frame["due_date"]))
+    counts = pd.DataFrame({"total": 1, "completed": completed.astype(int), "on_time": on_time.astype(int)})
+    if group_by:
+        table = counts.join(frame[list(group_by)]).groupby(list(group_by), observed=True).sum()
+    else:
+        table = counts.sum().to_frame().T
+    table["completion_rate"] = table["completed"] / table["total"]
+    table["on_time_rate"] = table["on_time"] / table["completed"].where(table["completed"] > 0)
+    return _records(table if group_by else table.set_index(pd.Index(["all"], name="group")))
+
+
+def overdue_report(frame, group_by: Sequence[str], now) -> List[dict]:
+    import pandas as pd
+
+    overdue = ~frame["status"].eq("Completed") & frame["due_date"].notna() & (frame["due_date"] < now)
+    days = (now - frame.loc[overdue, "due_date"]).dt.total_seconds() / 86400
+    buckets = pd.cut(days, bins=list(AGING_BINS), labels=list(AGING_LABELS))
+    keys = [frame.loc[overdue, column] for column in group_by] + [buckets]
+    table = buckets.groupby(keys, observed=True).size()
+    table = table.unstack(-1, fill_value=0) if group_by else table.to_frame().T
+    table = table.reindex(columns=list(AGING_LABELS), fill_value=0)
+    table["total"] = table.sum(axis=1)
+    table.columns = [str(column) for column in table.columns]
+    return _records(table if group_by else table.set_index(pd.Index(["all"], name="group")))
+
+
+def duration_report(frame, group_by: Sequence[str]) -> List[dict]:
+    import pandas as pd
+
+    start = frame["scheduled_start"].fillna(frame["created_at"])
+    actual = (frame["completed_at"] - start).dt.total_seconds() / 60
+    estimated = frame["estimated_duration"]
+    usable = frame["status"].eq("Completed") & estimated.gt(0) & actual.gt(0)
+    data = pd.DataFrame({"estimated": estimated[usable], "actual": actual[usable]})
+    data["ratio"] = data["actual"] / data["estimated"]
+    data["abs_error"] = (data["actual"] - data["estimated"]).abs()
+    grouped = data.join(frame.loc[usable, list(group_by)]).groupby(list(group_by), observed=True) if group_by \
+        else data.groupby(pd.Series("all", index=data.index, name="group"))
+    table = grouped.agg(
+        count=("ratio", "size"),
+        estimated_mean=("estimated", "mean"),
+        actual_mean=("actual", "mean"),
+        ratio_median=("ratio", "median"),
+        abs_error_mean=("abs_error", "mean"),
+    )
+    table["ratio_p90"] = grouped["ratio"].quantile(0.9)
+    return _records(table)
+
+
+def compute(frame, reports: Sequence[str], group_by: Sequence[str], now: datetime) -> Dict[str, List[dict]]:
+    """The requested reports over ``frame``; runs in the report process pool"""
+    import pandas as pd
+
+    now = pd.Timestamp(now)
+    results = {}
+    if "completion" in reports:
+        results["completion"] = completion_report(frame, group_by)
+    if "overdue" in reports:
+        results["overdue"] = overdue_report(frame, group_by, now)
+    if "duration" in reports:
+        results["duration"] = duration_report(frame, group_by)
+    return results
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_workers = 0
+
+
+def start_report_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """Process pool for ``run_compute``; workers=0 keeps reports on a thread"""
+    global _pool, _workers
+    if _pool is None and workers > 0:
+        # forkserver: forking the server process itself would copy Motor's executor threads' locks
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["pandas", "reports"])
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        _workers = workers
+    return _pool
+
+
+def close_report_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_compute(frame, reports: Sequence[str], group_by: Sequence[str], now: datetime) -> Dict[str, List[dict]]:
+    call = partial(compute, frame, tuple(reports), tuple(group_by), now)
+    if _pool is not None:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_pool, call)
+        except BrokenProcessPool:
+            # A worker died (OOM kill, segfault); replace the pool and answer this request from a thread
+            logger.exception("Report process pool broke; restarting it")
+            workers = _workers
+            close_report_pool()
+            start_report_pool(workers)
+    return await anyio.to_thread.run_sync(call)
@@ -0,0 +1,72 @@
+"""Backfill ``users.entitlement`` from existing paid transactions.
+
+Entitlements are written when a payment completes; users who paid before
+that existed need them computed once from ``payment_transactions``. For
+every user the latest paid transaction wins and, as before, the plan runs
+``duration_days`` from the transaction's ``updated_at``. Safe to re-run:
+the update never shortens an entitlement or re-applies the same session.
+
+    python -m scripts.backfill_entitlements --dry-run
+    python -m scripts.backfill_entitlements --batch-size 500
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime, timezone
+
+
+def _paid_at(transaction: dict) -> datetime:
+    value = transaction.get("updated_at") or transaction.get("created_at")
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+async def backfill(db, batch_size: int = 500, dry_run: bool = False) -> dict:
+    from server import entitlement_update
+
+    pipeline = [
+        {"$match": {"payment_status": "paid"}},
+        {"$sort": {"updated_at": -1}},
+        {"$group": {"_id": "$user_id", "transaction": {"$first": "$$ROOT"}}},
+    ]
+    summary = {"users": 0, "skipped": 0, "matched": 0, "modified": 0}
+    batch = []
+
+    async def flush():
+        if batch and not dry_run:
+            result = await db.users.bulk_write(batch, ordered=False)
+            summary["matched"] += result.matched_count
+            summary["modified"] += result.modified_count
+        batch.clear()
+
+    async for row in db.payment_transactions.aggregate(pipeline, allowDiskUse=True):
+        transaction = row["transaction"]
+        grant = entitlement_update(transaction, _paid_at(transaction))
+        if grant is None:
+            summary["skipped"] += 1
+            continue
+        summary["users"] += 1
+        batch.append(grant)
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Compute entitlements without writing them")
+    args = parser.parse_args()
+
+    import server
+
+    summary = asyncio.run(backfill(server.db, args.batch_size, args.dry_run))
+    print(json.dumps({"dry_run": args.dry_run, **summary}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Prepare existing data for the site-partitioned layout.
+
+Stamps ``site`` on departments, machines and work orders that predate it
+(work orders inherit their machine's site, everything else the default
+site), rebuilds ``site_counters`` from the work orders, and creates the
+site-prefixed indexes. With ``--shard`` it also shards ``work_orders`` on
+``{site: 1, id: 1}``, which needs a mongos and sharding enabled for the
+database. Single-document writes to work orders (update, delete)
+look up the order's site first and filter on ``{site, id}``, so they target
+one shard and work on servers older than MongoDB 7.1, which reject
+findAndModify without the full shard key.
+
+    python -m scripts.partition_sites
+    python -m scripts.partition_sites --shard
+"""
+import argparse
+import asyncio
+import json
+
+from pymongo import UpdateMany
+
+
+async def backfill_sites(db, default_site: str) -> dict:
+    missing = {"$or": [{"site": {"$exists": False}}, {"site": None}]}
+    summary = {}
+    for collection in ("departments", "machines"):
+        result = await db[collection].update_many(missing, {"$set": {"site": default_site}})
+        summary[collection] = result.modified_count
+
+    # Work orders follow their machine; one update per site, not per document
+    machine_ids_by_site = {}
+    async for machine in db.machines.find({}, {"id": 1, "site": 1}):
+        machine_ids_by_site.setdefault(machine.get("site") or default_site, []).append(machine["id"])
+    operations = [
+        UpdateMany({**missing, "machine_id": {"$in": machine_ids}}, {"$set": {"site": site}})
+        for site, machine_ids in machine_ids_by_site.items()
+    ]
+    operations.append(UpdateMany(missing, {"$set": {"site": default_site}}))
+    result = await db.work_orders.bulk_write(operations, ordered=True)
+    summary["work_orders"] = result.modified_count
+    return summary
+
+
+async def shard_work_orders(client, db_name: str) -> None:
+    await client.admin.command("enableSharding", db_name)
+    await client.admin.command("shardCollection", f"{db_name}.work_orders", key={"site": 1, "id": 1})
+
+
+async def run(args) -> dict:
+    import server
+
+    summary = {"sites_stamped": await backfill_sites(server.db, server.DEFAULT_SITE)}
+    await server.ensure_indexes()
+    summary["site_counters"] = await server.rebuild_site_counters()
+    if args.shard:
+        await shard_work_orders(server.client, server.db.name)
+        summary["sharded"] = True
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shard", action="store_true", help="Shard work_orders on {site: 1, id: 1}")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
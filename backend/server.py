@@ -1,26 +1,78 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, UploadFile, File
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid
+from bson import json_util
 import os
+import re
+import json
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional, Dict, Any, Awaitable, Callable
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 import jwt
 import hashlib
 from enum import Enum
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
+from fastjson import FastJSONResponse, dumps as render_json
+from compression import CompressionMiddleware
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, MongoCommandListener, MongoPoolListener
+from slow_queries import SlowQueryLog
+from command_counter import CommandCounter
+from profiling import ProfileStore, ProfilingMiddleware
+from caching import SingleFlight, TimedCache
+from admission import AdmissionController, AdmissionMiddleware, RouteClass
+from webhook_inbox import WebhookInbox
+from jobs import LeaseLock, PeriodicJob
+from coherence import CacheCoherence
+import exports
+import reports
+from csv_import import ImportReport, insert_unordered, read_csv_batches, split_list, validation_message
+from payments import CheckoutNotFound, PaymentNotConfigured, close_payment_provider, get_payment_provider, start_payment_provider
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+
+# Pool and timeout settings; unset variables keep the driver defaults.
+# Size MONGO_MAX_POOL_SIZE for (uvicorn workers x pool size) <= server connection budget,
+# and watch mongodb_pool_saturation_ratio / mongodb_pool_checkout_wait_seconds on /metrics.
+MONGO_CLIENT_SETTINGS = {
+    'maxPoolSize': ('MONGO_MAX_POOL_SIZE', int),
+    'minPoolSize': ('MONGO_MIN_POOL_SIZE', int),
+    'maxIdleTimeMS': ('MONGO_MAX_IDLE_TIME_MS', int),
+    'maxConnecting': ('MONGO_MAX_CONNECTING', int),
+    'waitQueueTimeoutMS': ('MONGO_WAIT_QUEUE_TIMEOUT_MS', int),
+    'serverSelectionTimeoutMS': ('MONGO_SERVER_SELECTION_TIMEOUT_MS', int),
+    'connectTimeoutMS': ('MONGO_CONNECT_TIMEOUT_MS', int),
+    'socketTimeoutMS': ('MONGO_SOCKET_TIMEOUT_MS', int),
+    'compressors': ('MONGO_COMPRESSORS', str),  # e.g. "zstd,snappy,zlib"
+}
+
+def mongo_client_options() -> Dict[str, Any]:
+    options = {}
+    for option, (env_var, cast) in MONGO_CLIENT_SETTINGS.items():
+        value = os.environ.get(env_var)
+        if value:
+            options[option] = cast(value)
+    return options
+
+slow_query_log = SlowQueryLog(threshold_ms=float(os.environ.get('SLOW_QUERY_MS', '100')))
+# Inert unless a test opens a counting window (see command_counter.py)
+command_counter = CommandCounter()
+client = AsyncIOMotorClient(
+    mongo_url,
+    event_listeners=[MongoCommandListener(), MongoPoolListener(), slow_query_log, command_counter],
+    **mongo_client_options()
+)
 db = client[os.environ['DB_NAME']]
 
 # Security
@@ -30,7 +82,10 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 
 # Create the main app without a prefix
-app = FastAPI(title="SimplePM Board API")
+# Handlers returning plain dicts are rendered with orjson; handlers that build
+# their own models return FastJSONResponse directly to skip response_model
+# re-validation and the jsonable_encoder pass.
+app = FastAPI(title="SimplePM Board API", default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -56,7 +111,17 @@ class Priority(str, Enum):
     HIGH = "High"
     CRITICAL = "Critical"
 
+# Sites partition plant data: departments, machines and work orders all carry
+# one, and list endpoints accept ?site= backed by site-prefixed indexes.
+DEFAULT_SITE = "Main Site"
+
 # Models
+class Entitlement(BaseModel):
+    plan: str  # PAYMENT_PACKAGES key
+    expires_at: datetime
+    seats: int = 1
+    session_id: Optional[str] = None  # checkout session that granted it
+
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     username: str
@@ -65,6 +130,13 @@ class User(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     trial_start: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_trial_active: bool = True
+    # Loaded for access checks but never rendered: user lists and auth payloads
+    # must not carry other users' plans or checkout session ids
+    entitlement: Optional[Entitlement] = Field(default=None, exclude=True)
+
+class CurrentUser(User):
+    """The signed-in user's own profile, the one response that includes the entitlement"""
+    entitlement: Optional[Entitlement] = None
 
 class UserCreate(BaseModel):
     username: str
@@ -84,17 +156,20 @@ class Token(BaseModel):
 class Department(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
+    site: str = DEFAULT_SITE
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     created_by: str
 
 class DepartmentCreate(BaseModel):
     name: str
+    site: Optional[str] = None
 
 class Machine(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     department_id: str
     department_name: str
+    site: str = DEFAULT_SITE
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     created_by: str
 
@@ -120,7 +195,7 @@ class WorkOrder(BaseModel):
     assignee_name: Optional[str] = None
     requested_by: str
     requested_by_name: str
-    site: Optional[str] = "Main Site"
+    site: Optional[str] = DEFAULT_SITE
     department_id: Optional[str] = None
     department_name: Optional[str] = None
     machine_id: Optional[str] = None
@@ -136,13 +211,14 @@ class WorkOrder(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     completed_at: Optional[datetime] = None
+    archived: bool = False  # read-only copy served from work_orders_archive
 
 class WorkOrderCreate(BaseModel):
     title: str
     type: WorkOrderType
     priority: Priority = Priority.MEDIUM
     assignee: Optional[str] = None
-    site: Optional[str] = "Main Site"
+    site: Optional[str] = DEFAULT_SITE
     department_id: Optional[str] = None
     machine_id: Optional[str] = None
     location: Optional[str] = None
@@ -231,27 +307,68 @@ def check_trial_status(user: User) -> SubscriptionStatus:
     days_remaining = (trial_end - now).days
     return SubscriptionStatus(is_trial=True, trial_days_remaining=days_remaining, has_active_subscription=True)
 
-async def check_user_access(user: User) -> bool:
+def has_active_entitlement(user: User) -> bool:
+    return user.entitlement is not None and datetime.now(timezone.utc) < user.entitlement.expires_at
+
+def check_user_access(user: User) -> bool:
     """Check if user has access (trial active or subscription)"""
-    # Check active subscription from payments
-    active_payment = await db.payment_transactions.find_one({
-        "user_id": user.id,
-        "payment_status": "paid",
-        "status": "completed"
-    }, sort=[("created_at", -1)])
-    
-    if active_payment:
-        # Check if subscription is still valid
-        package = PAYMENT_PACKAGES.get(active_payment["package_id"])
-        if package:
-            expiry_date = active_payment["updated_at"] + timedelta(days=package["duration_days"])
-            if datetime.now(timezone.utc) < expiry_date:
-                return True
+    if has_active_entitlement(user):
+        return True
     
     # Check trial status
     trial_status = check_trial_status(user)
     return trial_status.has_active_subscription
 
+def entitlement_update(transaction: dict, paid_at: datetime) -> Optional[UpdateOne]:
+    """Users update granting the entitlement a paid transaction buys.
+    
+    The filter makes the write idempotent (a session grants once) and never
+    shortens an entitlement that already runs longer.
+    """
+    package = PAYMENT_PACKAGES.get(transaction.get("package_id"))
+    if not package:
+        return None
+    metadata = transaction.get("metadata") or {}
+    entitlement = Entitlement(
+        plan=transaction["package_id"],
+        expires_at=paid_at + timedelta(days=package["duration_days"]),
+        seats=int(metadata.get("user_count") or 1),
+        session_id=transaction["session_id"]
+    )
+    entitlement_doc = prepare_for_mongo(entitlement.dict())
+    return UpdateOne(
+        {
+            "id": transaction["user_id"],
+            "entitlement.session_id": {"$ne": entitlement.session_id},
+            "$or": [
+                {"entitlement": None},
+                {"entitlement.expires_at": {"$lt": entitlement_doc["expires_at"]}}
+            ]
+        },
+        {"$set": {"entitlement": entitlement_doc, "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+
+# Authenticated users by username. Entries are evicted across workers by the
+# cache coherence watcher (see coherence.py); the TTL bounds staleness if it lags.
+user_cache = TimedCache("users", maxsize=10000, ttl=float(os.environ.get('USER_CACHE_TTL_S', '30')))
+
+def evict_user(document: Optional[dict]):
+    if document and document.get("username"):
+        user_cache.pop(document["username"])
+    else:
+        user_cache.clear()
+
+async def grant_entitlements(transactions: List[dict], paid_at: datetime):
+    """Grant the entitlements paid transactions bought and drop this worker's cached copies of those users"""
+    grants = [grant for grant in (entitlement_update(transaction, paid_at) for transaction in transactions) if grant]
+    if not grants:
+        return
+    await db.users.bulk_write(grants, ordered=False)
+    # The coherence watcher only reaches this worker after the next request may have read the old entry
+    user_ids = list({transaction["user_id"] for transaction in transactions})
+    async for user in db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "username": 1}):
+        evict_user(user)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -266,14 +383,32 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.PyJWTError:
         raise credentials_exception
     
+    cached = user_cache.get(username)
+    if cached is not None:
+        return cached
+    
     user = await db.users.find_one({"username": username})
     if user is None:
         raise credentials_exception
-    return User(**parse_from_mongo(user))
+    current_user = User(**parse_from_mongo(user))
+    user_cache.set(username, current_user)
+    return current_user
+
+async def is_admin_request(headers) -> bool:
+    """Whether request headers carry a valid bearer token for an admin user"""
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return False
+    user = await db.users.find_one({"username": payload.get("sub")}, {"role": 1})
+    return bool(user) and user.get("role") == UserRole.ADMIN.value
 
 async def get_current_user_with_access(current_user: User = Depends(get_current_user)):
     """Get current user and verify they have access"""
-    has_access = await check_user_access(current_user)
+    has_access = check_user_access(current_user)
     if not has_access:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -358,6 +493,7 @@ async def register(user_data: UserCreate):
     user_dict["hashed_password"] = hashed_password
     
     await db.users.insert_one(user_dict)
+    evict_user(user_dict)
     
     # Create token
     access_token = create_access_token(data={"sub": user.username})
@@ -375,9 +511,32 @@ async def login(login_data: UserLogin):
     
     return Token(access_token=access_token, token_type="bearer", user=user_obj)
 
-@api_router.get("/auth/me", response_model=User)
+@api_router.get("/auth/me", response_model=CurrentUser)
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
-    return current_user
+    return CurrentUser(**current_user.dict(), entitlement=current_user.entitlement)
+
+# Request coalescing: concurrent identical list reads (every tablet loading
+# the board at shift start) share one query and one serialized body. The key
+# is the normalized Mongo query, which carries every filter deciding what the
+# caller may see, so callers with different visibility never share a body.
+# The key also carries the collection's write generation: every write here
+# bumps it once it has landed, and cache coherence versions cover writes made
+# by other workers, so a read issued after a write never joins a flight that
+# started before it.
+work_orders_flight = SingleFlight("work_orders_list")
+machines_flight = SingleFlight("machines_list")
+departments_flight = SingleFlight("departments_list")
+write_generations: Dict[str, int] = {}
+
+def bump_write_generation(collection: str):
+    write_generations[collection] = write_generations.get(collection, 0) + 1
+
+async def coalesced_json(flight: SingleFlight, collection: str, query: Dict[str, Any],
+                         render: Callable[[], Awaitable[bytes]]) -> Response:
+    generation = (write_generations.get(collection, 0), cache_coherence.version(collection) if cache_coherence else 0)
+    key = json.dumps([generation, query], sort_keys=True, default=str)
+    body = await flight.do(key, render)
+    return Response(body, media_type="application/json")
 
 # Department routes
 @api_router.post("/departments", response_model=Department)
@@ -386,24 +545,31 @@ async def create_department(dept_data: DepartmentCreate, current_user: User = De
         raise HTTPException(status_code=403, detail="Only admins can create departments")
     
     # Check if department exists
-    existing = await db.departments.find_one({"name": dept_data.name})
+    existing = await db.departments.find_one({"site": dept_data.site or DEFAULT_SITE, "name": dept_data.name})
     if existing:
         raise HTTPException(status_code=400, detail="Department already exists")
     
     department = Department(
         name=dept_data.name,
+        site=dept_data.site or DEFAULT_SITE,
         created_by=current_user.id
     )
     
     dept_dict = prepare_for_mongo(department.dict())
     await db.departments.insert_one(dept_dict)
+    bump_write_generation("departments")
     
     return department
 
 @api_router.get("/departments", response_model=List[Department])
-async def get_departments(current_user: User = Depends(get_current_user_with_access)):
-    departments = await db.departments.find().to_list(length=None)
-    return [Department(**parse_from_mongo(dept)) for dept in departments]
+async def get_departments(site: Optional[str] = None, current_user: User = Depends(get_current_user_with_access)):
+    query = {"site": site} if site else {}
+    
+    async def render() -> bytes:
+        departments = await db.departments.find(query).to_list(length=None)
+        return render_json([Department(**parse_from_mongo(dept)) for dept in departments])
+    
+    return await coalesced_json(departments_flight, "departments", query, render)
 
 @api_router.put("/departments/{dept_id}", response_model=Department)
 async def update_department(dept_id: str, department_data: DepartmentCreate, current_user: User = Depends(get_current_user_with_access)):
@@ -416,22 +582,31 @@ async def update_department(dept_id: str, department_data: DepartmentCreate, cur
         raise HTTPException(status_code=404, detail="Department not found")
     
     # Update department
-    update_data = prepare_for_mongo({
+    update_data = {
         "name": department_data.name,
         "updated_at": datetime.now(timezone.utc)
-    })
+    }
+    if department_data.site and department_data.site != existing_dept.get("site", DEFAULT_SITE):
+        # Machines and work orders carry the site too (it is part of the work order shard key),
+        # so a department can only move while it owns neither
+        if await db.machines.find_one({"department_id": dept_id}, {"_id": 1}) or \
+                await db.work_orders.find_one({"department_id": dept_id}, {"_id": 1}):
+            raise HTTPException(status_code=409, detail="Cannot move a department with machines or work orders to another site")
+        update_data["site"] = department_data.site
+    update_data = prepare_for_mongo(update_data)
     
     result = await db.departments.update_one(
         {"id": dept_id},
         {"$set": update_data}
     )
+    bump_write_generation("departments")
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Department not found")
     
     # Return updated department
     updated_dept = await db.departments.find_one({"id": dept_id})
-    return Department(**parse_from_mongo(updated_dept))
+    return FastJSONResponse(Department(**parse_from_mongo(updated_dept)))
 
 @api_router.delete("/departments/{dept_id}")
 async def delete_department(dept_id: str, current_user: User = Depends(get_current_user_with_access)):
@@ -444,6 +619,7 @@ async def delete_department(dept_id: str, current_user: User = Depends(get_curre
         raise HTTPException(status_code=400, detail="Cannot delete department with machines")
     
     result = await db.departments.delete_one({"id": dept_id})
+    bump_write_generation("departments")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Department not found")
     
@@ -464,22 +640,29 @@ async def create_machine(machine_data: MachineCreate, current_user: User = Depen
         name=machine_data.name,
         department_id=machine_data.department_id,
         department_name=department["name"],
+        site=department.get("site", DEFAULT_SITE),
         created_by=current_user.id
     )
     
     machine_dict = prepare_for_mongo(machine.dict())
     await db.machines.insert_one(machine_dict)
+    bump_write_generation("machines")
     
     return machine
 
 @api_router.get("/machines", response_model=List[Machine])
-async def get_machines(department_id: Optional[str] = None, current_user: User = Depends(get_current_user_with_access)):
+async def get_machines(department_id: Optional[str] = None, site: Optional[str] = None, current_user: User = Depends(get_current_user_with_access)):
     query = {}
+    if site:
+        query["site"] = site
     if department_id:
         query["department_id"] = department_id
     
-    machines = await db.machines.find(query).to_list(length=None)
-    return [Machine(**parse_from_mongo(machine)) for machine in machines]
+    async def render() -> bytes:
+        machines = await db.machines.find(query).to_list(length=None)
+        return render_json([Machine(**parse_from_mongo(machine)) for machine in machines])
+    
+    return await coalesced_json(machines_flight, "machines", query, render)
 
 @api_router.delete("/machines/{machine_id}")
 async def delete_machine(machine_id: str, current_user: User = Depends(get_current_user_with_access)):
@@ -487,11 +670,54 @@ async def delete_machine(machine_id: str, current_user: User = Depends(get_curre
         raise HTTPException(status_code=403, detail="Only admins can delete machines")
     
     result = await db.machines.delete_one({"id": machine_id})
+    bump_write_generation("machines")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Machine not found")
     
     return {"message": "Machine deleted successfully"}
 
+# Per-site work order counts, kept in site_counters with $inc on every write
+# so board headers and capacity checks never count across plants.
+async def bump_site_counters(site: Optional[str], status_changes: Dict[str, int], total: int = 0):
+    inc = {f"status.{getattr(status, 'value', status)}": change for status, change in status_changes.items() if status}
+    if total:
+        inc["total"] = total
+    if inc:
+        await db.site_counters.update_one({"_id": site or DEFAULT_SITE}, {"$inc": inc}, upsert=True)
+
+async def rebuild_site_counters() -> int:
+    """Recount site_counters from work_orders; returns the number of sites"""
+    counters: Dict[str, dict] = {}
+    async for row in db.work_orders.aggregate([
+        {"$group": {"_id": {"site": "$site", "status": "$status"}, "count": {"$sum": 1}}}
+    ], allowDiskUse=True):
+        site = row["_id"].get("site") or DEFAULT_SITE
+        counter = counters.setdefault(site, {"_id": site, "total": 0, "status": {}})
+        wo_status = row["_id"].get("status")
+        if wo_status:
+            counter["status"][wo_status] = counter["status"].get(wo_status, 0) + row["count"]
+        counter["total"] += row["count"]
+    await db.site_counters.delete_many({})
+    if counters:
+        await db.site_counters.insert_many(list(counters.values()))
+    return len(counters)
+
+async def seed_site_counters():
+    """Build site_counters on first start against existing data; later writes keep them with $inc"""
+    if await db.site_counters.find_one({}, {"_id": 1}) is None and await db.work_orders.find_one({}, {"_id": 1}):
+        try:
+            await rebuild_site_counters()
+        except BulkWriteError:
+            pass  # a write or another worker upserted a counter meanwhile; it rebuilds on the next empty start
+
+@api_router.get("/sites")
+async def get_sites(current_user: User = Depends(get_current_user_with_access)):
+    counters = await db.site_counters.find().sort("_id", 1).to_list(length=None)
+    return [
+        {"site": counter["_id"], "work_orders": counter.get("total", 0), "by_status": counter.get("status", {})}
+        for counter in counters
+    ]
+
 # Work Order routes
 @api_router.post("/work-orders", response_model=WorkOrder)
 async def create_work_order(wo_data: WorkOrderCreate, current_user: User = Depends(get_current_user_with_access)):
@@ -501,14 +727,18 @@ async def create_work_order(wo_data: WorkOrderCreate, current_user: User = Depen
     department_name = None
     machine_name = None
     assignee_name = None
+    # Work orders belong to their machine's (or department's) site unless one is given
+    site = wo_data.site if "site" in wo_data.model_fields_set else None
     
     if wo_data.department_id:
         dept = await db.departments.find_one({"id": wo_data.department_id})
         department_name = dept["name"] if dept else None
+        site = site or (dept or {}).get("site")
     
     if wo_data.machine_id:
         machine = await db.machines.find_one({"id": wo_data.machine_id})
         machine_name = machine["name"] if machine else None
+        site = site or (machine or {}).get("site")
     
     if wo_data.assignee:
         assignee = await db.users.find_one({"id": wo_data.assignee})
@@ -528,7 +758,7 @@ async def create_work_order(wo_data: WorkOrderCreate, current_user: User = Depen
         assignee_name=assignee_name,
         requested_by=current_user.id,
         requested_by_name=current_user.username,
-        site=wo_data.site,
+        site=site or DEFAULT_SITE,
         department_id=wo_data.department_id,
         department_name=department_name,
         machine_id=wo_data.machine_id,
@@ -545,36 +775,145 @@ async def create_work_order(wo_data: WorkOrderCreate, current_user: User = Depen
     
     wo_dict = prepare_for_mongo(work_order.dict())
     await db.work_orders.insert_one(wo_dict)
+    bump_write_generation("work_orders")
+    await bump_site_counters(work_order.site, {work_order.status.value: 1}, total=1)
     
-    return work_order
+    return FastJSONResponse(work_order)
 
 @api_router.get("/work-orders", response_model=List[WorkOrder])
-async def get_work_orders(current_user: User = Depends(get_current_user_with_access)):
-    work_orders = await db.work_orders.find().sort("created_at", -1).to_list(length=None)
-    
-    # Migrate old "Backlog" status to "Scheduled"
-    for wo in work_orders:
-        if wo.get("status") == "Backlog":
-            await db.work_orders.update_one(
-                {"id": wo["id"]}, 
-                {"$set": {"status": "Scheduled"}}
-            )
+async def get_work_orders(site: Optional[str] = None, current_user: User = Depends(get_current_user_with_access)):
+    query = {"site": site} if site else {}
+    return await coalesced_json(work_orders_flight, "work_orders", query, lambda: render_work_orders(query))
+
+async def render_work_orders(query: Dict[str, Any]) -> bytes:
+    """The board list as JSON; runs once per group of coalesced requests"""
+    work_orders = await db.work_orders.find(query).sort("created_at", -1).to_list(length=None)
+    
+    # Migrate old "Backlog" status to "Scheduled" (one round trip, only when needed)
+    backlog = [wo for wo in work_orders if wo.get("status") == "Backlog"]
+    if backlog:
+        await db.work_orders.update_many(
+            {"id": {"$in": [wo["id"] for wo in backlog]}, "status": "Backlog"},
+            {"$set": {"status": "Scheduled"}}
+        )
+        migrated_per_site: Dict[Optional[str], int] = {}
+        for wo in backlog:
             wo["status"] = "Scheduled"
+            migrated_per_site[wo.get("site")] = migrated_per_site.get(wo.get("site"), 0) + 1
+        for wo_site, count in migrated_per_site.items():
+            await bump_site_counters(wo_site, {"Backlog": -count, "Scheduled": count})
     
-    return [WorkOrder(**parse_from_mongo(wo)) for wo in work_orders]
+    return render_json([WorkOrder(**parse_from_mongo(wo)) for wo in work_orders])
+
+@api_router.get("/work-orders/search", response_model=List[WorkOrder])
+async def search_work_orders(
+    q: Optional[str] = None,
+    site: Optional[str] = None,
+    status: Optional[WorkOrderStatus] = None,
+    include_archived: bool = False,
+    limit: int = 100,
+    current_user: User = Depends(get_current_user_with_access)
+):
+    """Title / WO number search; include_archived spans work_orders_archive too"""
+    match = {}
+    if q:
+        pattern = {"$regex": re.escape(q), "$options": "i"}
+        match["$or"] = [{"title": pattern}, {"wo_id": pattern}]
+    if site:
+        match["site"] = site
+    if status:
+        match["status"] = status.value
+    limit = max(1, min(limit, 1000))
+    
+    pipeline = [{"$match": match}]
+    if include_archived:
+        pipeline.append({"$unionWith": {"coll": "work_orders_archive", "pipeline": [{"$match": match}]}})
+    pipeline += [{"$sort": {"created_at": -1}}, {"$limit": limit}, {"$project": {"_id": 0}}]
+    
+    work_orders = await db.work_orders.aggregate(pipeline).to_list(length=limit)
+    return FastJSONResponse([WorkOrder(**parse_from_mongo(wo)) for wo in work_orders])
+
+@api_router.get("/work-orders/export")
+async def export_work_orders(
+    format: str = "csv",
+    columns: Optional[str] = None,
+    site: Optional[str] = None,
+    status: Optional[WorkOrderStatus] = None,
+    type: Optional[WorkOrderType] = None,
+    priority: Optional[Priority] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    include_archived: bool = False,
+    current_user: User = Depends(get_current_user_with_access)
+):
+    """Stream work orders as CSV or Parquet, batch by batch from the cursor"""
+    if format not in exports.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be csv or parquet")
+    try:
+        selected = exports.parse_columns(columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    query = {}
+    if site:
+        query["site"] = site
+    for field, value in (("status", status), ("type", type), ("priority", priority)):
+        if value:
+            query[field] = value.value
+    if created_from or created_to:
+        query["created_at"] = {}
+        # Naive bounds are UTC, like every stored timestamp, not the server's local time
+        if created_from:
+            if created_from.tzinfo is None:
+                created_from = created_from.replace(tzinfo=timezone.utc)
+            query["created_at"]["$gte"] = created_from.astimezone(timezone.utc).isoformat()
+        if created_to:
+            if created_to.tzinfo is None:
+                created_to = created_to.replace(tzinfo=timezone.utc)
+            query["created_at"]["$lt"] = created_to.astimezone(timezone.utc).isoformat()
+    
+    batch_size = int(os.environ.get('EXPORT_BATCH_SIZE', '5000' if format == "csv" else '50000'))
+    collections = [db.work_orders] + ([db.work_orders_archive] if include_archived else [])
+    cursors = [
+        collection.find(query, exports.projection(selected)).sort("created_at", 1).batch_size(batch_size)
+        for collection in collections
+    ]
+    
+    if format == "csv":
+        body = exports.stream_csv(cursors, selected, batch_size)
+    else:
+        body = exports.stream_parquet(cursors, selected, batch_size)
+    filename = f"work-orders-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=exports.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+async def find_work_order(key: str, include_archived: bool = True) -> Optional[dict]:
+    """Look a work order up by id or WO number, falling back to the archive"""
+    query = {"$or": [{"id": key}, {"wo_id": key}]}
+    work_order = await db.work_orders.find_one(query)
+    if work_order is None and include_archived:
+        work_order = await db.work_orders_archive.find_one(query)
+        if work_order is not None:
+            work_order["archived"] = True
+    return work_order
 
 @api_router.get("/work-orders/{wo_id}", response_model=WorkOrder)
 async def get_work_order(wo_id: str, current_user: User = Depends(get_current_user_with_access)):
-    work_order = await db.work_orders.find_one({"id": wo_id})
+    work_order = await find_work_order(wo_id)
     if not work_order:
         raise HTTPException(status_code=404, detail="Work order not found")
     
-    return WorkOrder(**parse_from_mongo(work_order))
+    return FastJSONResponse(WorkOrder(**parse_from_mongo(work_order)))
 
 @api_router.put("/work-orders/{wo_id}", response_model=WorkOrder)
 async def update_work_order(wo_id: str, wo_update: WorkOrderUpdate, current_user: User = Depends(get_current_user_with_access)):
-    work_order = await db.work_orders.find_one({"id": wo_id})
+    work_order = await db.work_orders.find_one({"id": wo_id}, {"site": 1})
     if not work_order:
+        if await db.work_orders_archive.find_one({"id": wo_id}, {"_id": 1}):
+            raise HTTPException(status_code=409, detail="Archived work orders are read-only")
         raise HTTPException(status_code=404, detail="Work order not found")
     
     update_data = {k: v for k, v in wo_update.dict().items() if v is not None}
@@ -590,52 +929,347 @@ async def update_work_order(wo_id: str, wo_update: WorkOrderUpdate, current_user
         update_data["completed_at"] = datetime.now(timezone.utc)
     
     prepared_update = prepare_for_mongo(update_data)
-    await db.work_orders.update_one({"id": wo_id}, {"$set": prepared_update})
+    # The pre-image comes back with the write itself, so the counter delta uses the
+    # status this update actually replaced even when another update races it.
+    # The filter carries the shard key ({site, id}).
+    previous = await db.work_orders.find_one_and_update(
+        {"id": wo_id, "site": work_order.get("site")},
+        {"$set": prepared_update},
+        return_document=ReturnDocument.BEFORE
+    )
+    bump_write_generation("work_orders")
+    if previous is None:
+        # Archived (or deleted) since the lookup above
+        if await db.work_orders_archive.find_one({"id": wo_id}, {"_id": 1}):
+            raise HTTPException(status_code=409, detail="Archived work orders are read-only")
+        raise HTTPException(status_code=404, detail="Work order not found")
+    
+    if "status" in prepared_update and prepared_update["status"] != previous.get("status"):
+        await bump_site_counters(previous.get("site"), {previous.get("status"): -1, prepared_update["status"]: 1})
     
-    updated_wo = await db.work_orders.find_one({"id": wo_id})
-    return WorkOrder(**parse_from_mongo(updated_wo))
+    return FastJSONResponse(WorkOrder(**parse_from_mongo({**previous, **prepared_update})))
 
 @api_router.delete("/work-orders/{wo_id}")
 async def delete_work_order(wo_id: str, current_user: User = Depends(get_current_user_with_access)):
-    result = await db.work_orders.delete_one({"id": wo_id})
-    if result.deleted_count == 0:
+    work_order = await db.work_orders.find_one({"id": wo_id}, {"site": 1})
+    if not work_order:
+        raise HTTPException(status_code=404, detail="Work order not found")
+    deleted = await db.work_orders.find_one_and_delete(
+        {"id": wo_id, "site": work_order.get("site")}, projection={"site": 1, "status": 1}
+    )
+    bump_write_generation("work_orders")
+    if not deleted:
         raise HTTPException(status_code=404, detail="Work order not found")
+    await bump_site_counters(deleted.get("site"), {deleted.get("status"): -1}, total=-1)
     
     return {"message": "Work order deleted successfully"}
 
+# Bulk CSV import: one cached lookup of departments, machines and users per
+# import, rows validated and inserted a batch at a time with unordered writes.
+# Generated WO numbers continue from the newest stored one; a number that a
+# concurrent create took meanwhile is reassigned rather than failing the row.
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '500'))
+IMPORT_KINDS = ("departments", "machines", "work-orders")
+IMPORT_WO_ID_ATTEMPTS = 5
+
+class ImportLookups:
+    """Name -> document maps loaded once per import and extended as rows are inserted"""
+    
+    def __init__(self):
+        self.departments: Dict[str, dict] = {}
+        self.departments_by_name: Dict[str, List[dict]] = {}
+        self.machines: Dict[str, dict] = {}
+        self.machines_by_name: Dict[str, List[dict]] = {}
+        self.users_by_name: Dict[str, dict] = {}
+        self.wo_ids: set = set()
+        self.generated_wo_ids: set = set()
+        self.pending_departments: set = set()
+        self.wo_prefix = ""
+        self.next_wo_number = 1
+    
+    @classmethod
+    async def load(cls, kind: str) -> "ImportLookups":
+        lookups = cls()
+        fields = {"_id": 0, "id": 1, "name": 1, "site": 1, "department_id": 1}
+        for dept in await db.departments.find({}, fields).to_list(length=None):
+            lookups.add_department(dept)
+        if kind == "work-orders":
+            for machine in await db.machines.find({}, fields).to_list(length=None):
+                lookups.add_machine(machine)
+            for user in await db.users.find({}, {"_id": 0, "id": 1, "username": 1}).to_list(length=None):
+                lookups.users_by_name[user["username"].lower()] = user
+            first_wo_id = await generate_wo_id()
+            lookups.wo_prefix = first_wo_id.rsplit("-", 1)[0] + "-"
+            lookups.next_wo_number = int(first_wo_id.rsplit("-", 1)[1])
+        return lookups
+    
+    def add_department(self, dept: dict):
+        dept.setdefault("site", DEFAULT_SITE)
+        self.departments[dept["id"]] = dept
+        self.departments_by_name.setdefault(dept["name"].lower(), []).append(dept)
+    
+    def add_machine(self, machine: dict):
+        machine.setdefault("site", DEFAULT_SITE)
+        self.machines[machine["id"]] = machine
+        self.machines_by_name.setdefault(machine["name"].lower(), []).append(machine)
+    
+    def department(self, row: Dict[str, str]) -> Optional[dict]:
+        if row.get("department_id"):
+            if row["department_id"] not in self.departments:
+                raise ValueError(f"Unknown department_id {row['department_id']}")
+            return self.departments[row["department_id"]]
+        name = row.get("department") or row.get("department_name")
+        if not name:
+            return None
+        candidates = self.departments_by_name.get(name.lower(), [])
+        if row.get("site"):
+            candidates = [dept for dept in candidates if dept["site"] == row["site"]]
+        if not candidates:
+            raise ValueError(f"Unknown department '{name}'")
+        if len(candidates) > 1:
+            raise ValueError(f"Department '{name}' exists at several sites; add a site column")
+        return candidates[0]
+    
+    def machine(self, row: Dict[str, str], department: Optional[dict]) -> Optional[dict]:
+        if row.get("machine_id"):
+            if row["machine_id"] not in self.machines:
+                raise ValueError(f"Unknown machine_id {row['machine_id']}")
+            return self.machines[row["machine_id"]]
+        name = row.get("machine") or row.get("machine_name")
+        if not name:
+            return None
+        candidates = self.machines_by_name.get(name.lower(), [])
+        if department:
+            candidates = [machine for machine in candidates if machine["department_id"] == department["id"]]
+        elif row.get("site"):
+            candidates = [machine for machine in candidates if machine["site"] == row["site"]]
+        if not candidates:
+            raise ValueError(f"Unknown machine '{name}'")
+        if len(candidates) > 1:
+            raise ValueError(f"Machine '{name}' is ambiguous; add a department column")
+        return candidates[0]
+    
+    def user(self, username: Optional[str]) -> Optional[dict]:
+        if not username:
+            return None
+        if username.lower() not in self.users_by_name:
+            raise ValueError(f"Unknown assignee '{username}'")
+        return self.users_by_name[username.lower()]
+    
+    def next_wo_id(self) -> str:
+        while f"{self.wo_prefix}{self.next_wo_number:04d}" in self.wo_ids:
+            self.next_wo_number += 1
+        wo_id = f"{self.wo_prefix}{self.next_wo_number:04d}"
+        self.next_wo_number += 1
+        self.wo_ids.add(wo_id)
+        self.generated_wo_ids.add(wo_id)
+        return wo_id
+    
+    async def skip_stored_wo_numbers(self):
+        """Continue numbering after the newest stored order (creates made since the import started)"""
+        latest = await generate_wo_id()
+        if latest.startswith(self.wo_prefix):
+            self.next_wo_number = max(self.next_wo_number, int(latest.rsplit("-", 1)[1]))
+
+def import_department_row(row: Dict[str, str], lookups: ImportLookups, current_user: User) -> dict:
+    department = Department(name=row.get("name"), site=row.get("site") or DEFAULT_SITE, created_by=current_user.id)
+    key = (department.name.lower(), department.site)
+    if key in lookups.pending_departments or any(
+            dept["site"] == department.site for dept in lookups.departments_by_name.get(key[0], [])):
+        raise ValueError(f"Department '{department.name}' already exists at {department.site}")
+    # Joins the lookups once inserted; until then it only blocks duplicates in the same batch
+    lookups.pending_departments.add(key)
+    return prepare_for_mongo(department.dict())
+
+def import_machine_row(row: Dict[str, str], lookups: ImportLookups, current_user: User) -> dict:
+    department = lookups.department(row)
+    if not department:
+        raise ValueError("department or department_id is required")
+    machine = Machine(
+        name=row.get("name"),
+        department_id=department["id"],
+        department_name=department["name"],
+        site=department["site"],
+        created_by=current_user.id
+    )
+    return prepare_for_mongo(machine.dict())
+
+def import_work_order_row(row: Dict[str, str], lookups: ImportLookups, current_user: User) -> dict:
+    department = lookups.department(row)
+    machine = lookups.machine(row, department)
+    if machine and not department:
+        department = lookups.departments.get(machine["department_id"])
+    assignee = lookups.user(row.get("assignee") or row.get("assignee_name"))
+    optional = ("status", "location", "description", "due_date", "scheduled_start", "scheduled_end",
+                "estimated_duration", "created_at", "completed_at")
+    
+    work_order = WorkOrder(
+        wo_id=row.get("wo_id") or "",
+        title=row.get("title"),
+        type=row.get("type"),
+        priority=row.get("priority") or Priority.MEDIUM,
+        assignee=(assignee or {}).get("id"),
+        assignee_name=(assignee or {}).get("username"),
+        requested_by=current_user.id,
+        requested_by_name=current_user.username,
+        site=row.get("site") or (machine or department or {}).get("site") or DEFAULT_SITE,
+        department_id=(department or {}).get("id"),
+        department_name=(department or {}).get("name"),
+        machine_id=(machine or {}).get("id"),
+        machine_name=(machine or {}).get("name"),
+        checklist=[WorkOrderChecklistItem(text=text) for text in split_list(row.get("checklist"))],
+        tags=split_list(row.get("tags")),
+        **{field: row[field] for field in optional if field in row}
+    )
+    if not work_order.wo_id:
+        work_order.wo_id = lookups.next_wo_id()
+    elif work_order.wo_id in lookups.wo_ids:
+        raise ValueError(f"Duplicate wo_id {work_order.wo_id} in file")
+    lookups.wo_ids.add(work_order.wo_id)
+    return prepare_for_mongo(work_order.dict())
+
+async def claim_wo_ids(docs: List[dict], lines: List[int], lookups: ImportLookups, report: ImportReport):
+    """Drop rows whose explicit WO number (PM history) is taken; renumber generated ones taken meanwhile"""
+    for attempt in range(IMPORT_WO_ID_ATTEMPTS):
+        wo_ids = [doc["wo_id"] for doc in docs]
+        taken = set(await db.work_orders.distinct("wo_id", {"wo_id": {"$in": wo_ids}}))
+        taken |= set(await db.work_orders_archive.distinct("wo_id", {"wo_id": {"$in": wo_ids}}))
+        clashes = [index for index, wo_id in enumerate(wo_ids) if wo_id in taken]
+        last_attempt = attempt == IMPORT_WO_ID_ATTEMPTS - 1
+        rejected = [index for index in clashes if last_attempt or wo_ids[index] not in lookups.generated_wo_ids]
+        renumber = [docs[index] for index in clashes if index not in rejected]
+        
+        if renumber:
+            await lookups.skip_stored_wo_numbers()
+            for doc in renumber:
+                doc["wo_id"] = lookups.next_wo_id()
+        for index in rejected[::-1]:
+            report.error(lines[index], f"Work order {docs[index]['wo_id']} already exists")
+            del docs[index], lines[index]
+        if not renumber:
+            return
+
+@api_router.post("/import/{kind}")
+async def import_csv(
+    kind: str,
+    file: UploadFile = File(...),
+    batch_size: int = IMPORT_BATCH_SIZE,
+    current_user: User = Depends(get_current_user_with_access)
+):
+    """Bulk-create departments, machines or work orders from a CSV upload; reports per-row errors"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can import data")
+    if kind not in IMPORT_KINDS:
+        raise HTTPException(status_code=404, detail=f"Import kind must be one of {', '.join(IMPORT_KINDS)}")
+    batch_size = max(1, min(batch_size, 5000))
+    
+    collection, build_row = {
+        "departments": (db.departments, import_department_row),
+        "machines": (db.machines, import_machine_row),
+        "work-orders": (db.work_orders, import_work_order_row),
+    }[kind]
+    lookups = await ImportLookups.load(kind)
+    report = ImportReport(kind)
+    
+    async for batch in read_csv_batches(file, batch_size):
+        report.rows += len(batch)
+        docs, lines = [], []
+        for line, row in batch:
+            try:
+                docs.append(build_row(row, lookups, current_user))
+                lines.append(line)
+            except ValidationError as e:
+                report.error(line, validation_message(e))
+            except ValueError as e:
+                report.error(line, str(e))
+        
+        if kind == "work-orders" and docs:
+            await claim_wo_ids(docs, lines, lookups, report)
+        
+        inserted = await insert_unordered(collection, docs, lines, report)
+        bump_write_generation(collection.name)
+        
+        if kind == "departments":
+            lookups.pending_departments.clear()
+            for index in inserted:
+                lookups.add_department({field: docs[index][field] for field in ("id", "name", "site")})
+        if kind == "work-orders":
+            per_site: Dict[str, Dict[str, int]] = {}
+            for index in inserted:
+                statuses = per_site.setdefault(docs[index]["site"], {})
+                statuses[docs[index]["status"]] = statuses.get(docs[index]["status"], 0) + 1
+            for site, statuses in per_site.items():
+                await bump_site_counters(site, statuses, total=sum(statuses.values()))
+    
+    return report.as_dict()
+
+# Analytics reports: computed by the reports module in its process pool and
+# cached per work_orders version, so any write (seen through cache coherence)
+# starts a fresh computation while repeated dashboard loads hit the cache.
+report_cache = TimedCache("reports", maxsize=128, ttl=float(os.environ.get('REPORT_CACHE_TTL_S', '300')))
+report_flight = SingleFlight("reports")
+
+async def build_reports(names: tuple, group_by: tuple, site: Optional[str]) -> dict:
+    # Archived orders are the older completed history; leaving them out would skew every rate
+    query = {"site": site} if site else {}
+    projection = reports.projection()
+    cursors = [db.work_orders.find(query, projection), db.work_orders_archive.find(query, projection)]
+    frame = await reports.load_frame(cursors, int(os.environ.get('REPORT_CHUNK_SIZE', '20000')))
+    generated_at = datetime.now(timezone.utc)
+    results = await reports.run_compute(frame, names, group_by, generated_at)
+    return {"generated_at": generated_at.isoformat(), "work_orders": len(frame), "reports": results}
+
+@api_router.get("/reports")
+async def get_reports(
+    report: Optional[str] = None,
+    group_by: str = "department_name,priority",
+    site: Optional[str] = None,
+    current_user: User = Depends(get_current_user_with_access)
+):
+    """Completion, overdue aging and duration accuracy reports (comma-separated ?report=, default all)"""
+    names = tuple(name.strip() for name in report.split(",") if name.strip()) if report else reports.REPORTS
+    unknown = [name for name in names if name not in reports.REPORTS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown report: {', '.join(unknown)}")
+    try:
+        columns = tuple(reports.parse_group_by(group_by))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    version = cache_coherence.version("work_orders") if cache_coherence else 0
+    key = (names, columns, site, version)
+    cached = report_cache.get(key)
+    if cached is None:
+        cached = await report_flight.do(key, lambda: build_reports(names, columns, site))
+        report_cache.set(key, cached)
+    return FastJSONResponse(cached)
+
 # Users route for assignee dropdown
 @api_router.get("/users", response_model=List[User])
 async def get_users(current_user: User = Depends(get_current_user_with_access)):
     users = await db.users.find().to_list(length=None)
-    return [User(**parse_from_mongo(user)) for user in users]
+    return FastJSONResponse([User(**parse_from_mongo(user)) for user in users])
 
 # Subscription status endpoint
 @api_router.get("/subscription/status", response_model=SubscriptionStatus)
 async def get_subscription_status(current_user: User = Depends(get_current_user)):
     # Check active subscription
-    active_payment = await db.payment_transactions.find_one({
-        "user_id": current_user.id,
-        "payment_status": "paid",
-        "status": "completed"
-    }, sort=[("created_at", -1)])
-    
-    if active_payment:
-        # Check if subscription is still valid
-        package = PAYMENT_PACKAGES.get(active_payment["package_id"])
-        if package:
-            expiry_date = active_payment["updated_at"] + timedelta(days=package["duration_days"])
-            if datetime.now(timezone.utc) < expiry_date:
-                return SubscriptionStatus(
-                    is_trial=False, 
-                    trial_days_remaining=0, 
-                    has_active_subscription=True,
-                    subscription_type=package["name"]
-                )
+    if has_active_entitlement(current_user):
+        package = PAYMENT_PACKAGES.get(current_user.entitlement.plan, {})
+        return SubscriptionStatus(
+            is_trial=False, 
+            trial_days_remaining=0, 
+            has_active_subscription=True,
+            subscription_type=package.get("name", current_user.entitlement.plan)
+        )
     
     # Check trial status
     return check_trial_status(current_user)
 
 # Payment endpoints
+# Public URL of /api/webhook/stripe, e.g. https://pm.example.com/api/webhook/stripe
+PAYMENT_WEBHOOK_URL = os.environ.get('PAYMENT_WEBHOOK_URL')
+
 @api_router.post("/payments/create-checkout")
 async def create_checkout_session(request: PaymentPackageRequest, current_user: User = Depends(get_current_user)):
     # Validate package
@@ -647,36 +1281,37 @@ async def create_checkout_session(request: PaymentPackageRequest, current_user:
     # Calculate total amount based on user count
     total_amount = package["amount"] * request.user_count
     
-    # Initialize Stripe
-    stripe_api_key = os.environ.get('STRIPE_SECRET_KEY')
-    if not stripe_api_key:
+    # Payment provider (imports the Stripe integration on first use)
+    provider = get_payment_provider()
+    if not provider.configured:
         raise HTTPException(status_code=500, detail="Payment system not configured")
     
-    webhook_url = f"{request.origin_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
+    # The webhook is the API's own endpoint; only deployments that leave it unset fall back to the origin
+    webhook_url = PAYMENT_WEBHOOK_URL or f"{request.origin_url}/api/webhook/stripe"
     
     # Create success and cancel URLs
     success_url = f"{request.origin_url}/payment-success?session_id={{CHECKOUT_SESSION_ID}}"
     cancel_url = f"{request.origin_url}/pricing"
     
-    # Create checkout session
-    checkout_request = CheckoutSessionRequest(
-        amount=total_amount,
-        currency="usd",
-        success_url=success_url,
-        cancel_url=cancel_url,
-        metadata={
-            "user_id": current_user.id,
-            "email": current_user.email,
-            "package_id": request.package_id,
-            "package_name": package["name"],
-            "user_count": str(request.user_count),
-            "price_per_user": str(package["amount"])
-        }
-    )
+    metadata = {
+        "user_id": current_user.id,
+        "email": current_user.email,
+        "package_id": request.package_id,
+        "package_name": package["name"],
+        "user_count": str(request.user_count),
+        "price_per_user": str(package["amount"])
+    }
     
     try:
-        session = await stripe_checkout.create_checkout_session(checkout_request)
+        # Create checkout session
+        session = await provider.create_checkout_session(
+            amount=total_amount,
+            currency="usd",
+            success_url=success_url,
+            cancel_url=cancel_url,
+            metadata=metadata,
+            webhook_url=webhook_url
+        )
         
         # Store transaction record
         transaction = PaymentTransaction(
@@ -685,7 +1320,7 @@ async def create_checkout_session(request: PaymentPackageRequest, current_user:
             email=current_user.email,
             amount=total_amount,
             package_id=request.package_id,
-            metadata=checkout_request.metadata or {}
+            metadata=metadata
         )
         
         transaction_dict = prepare_for_mongo(transaction.dict())
@@ -693,9 +1328,62 @@ async def create_checkout_session(request: PaymentPackageRequest, current_user:
         
         return {"checkout_url": session.url, "session_id": session.session_id}
         
+    except PaymentNotConfigured:
+        raise HTTPException(status_code=500, detail="Payment system not configured")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create checkout session: {str(e)}")
 
+# Payment status polling: the success page polls until the session settles.
+# Settled transactions are answered from Mongo; concurrent polls for one
+# session share a single provider call, and open sessions are cached briefly.
+# Checkout Session payment_status values that no longer change; an expired session shows in its status
+TERMINAL_PAYMENT_STATUSES = {"paid", "no_payment_required"}
+payment_status_cache = TimedCache("payment_status", maxsize=10000, ttl=float(os.environ.get('PAYMENT_STATUS_TTL_S', '2')))
+payment_status_flight = SingleFlight("payment_status")
+
+def evict_payment_status(document: Optional[dict]):
+    if document and document.get("session_id"):
+        payment_status_cache.pop(document["session_id"])
+    else:
+        payment_status_cache.clear()
+
+def is_terminal_payment(transaction: dict) -> bool:
+    return transaction["payment_status"] in TERMINAL_PAYMENT_STATUSES or transaction["status"] == "expired"
+
+async def refresh_payment_status(transaction: dict) -> dict:
+    """Ask the provider for the session status and persist any change"""
+    session_id = transaction["session_id"]
+    checkout_status = await get_payment_provider().get_checkout_status(session_id)
+    
+    # Update transaction if status changed
+    if (checkout_status.payment_status != transaction["payment_status"] or 
+        checkout_status.status != transaction["status"]):
+        
+        update_data = {
+            "payment_status": checkout_status.payment_status,
+            "status": checkout_status.status,
+            "updated_at": datetime.now(timezone.utc)
+        }
+        
+        update = {"$set": prepare_for_mongo(update_data)}
+        if checkout_status.payment_status == "paid":
+            # A session paid after the reconciler expired it must not be purged
+            update["$unset"] = {"purge_at": ""}
+        await db.payment_transactions.update_one({"session_id": session_id}, update)
+        
+        if checkout_status.payment_status == "paid":
+            await grant_entitlements([transaction], update_data["updated_at"])
+    
+    result = {
+        "status": checkout_status.status,
+        "payment_status": checkout_status.payment_status,
+        "amount_total": checkout_status.amount_total,
+        "currency": checkout_status.currency
+    }
+    if not is_terminal_payment(result):
+        payment_status_cache.set(session_id, result)
+    return result
+
 @api_router.get("/payments/status/{session_id}")
 async def get_payment_status(session_id: str, current_user: User = Depends(get_current_user)):
     # Find transaction
@@ -707,67 +1395,405 @@ async def get_payment_status(session_id: str, current_user: User = Depends(get_c
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
-    # Check with Stripe
-    stripe_api_key = os.environ.get('STRIPE_SECRET_KEY')
-    webhook_url = "dummy_url"  # Not used for status check
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
-    
-    try:
-        checkout_status = await stripe_checkout.get_checkout_status(session_id)
-        
-        # Update transaction if status changed
-        if (checkout_status.payment_status != transaction["payment_status"] or 
-            checkout_status.status != transaction["status"]):
-            
-            update_data = {
-                "payment_status": checkout_status.payment_status,
-                "status": checkout_status.status,
-                "updated_at": datetime.now(timezone.utc)
-            }
-            
-            await db.payment_transactions.update_one(
-                {"session_id": session_id},
-                {"$set": prepare_for_mongo(update_data)}
-            )
-        
+    # Settled sessions never change again; answer from the transaction
+    if is_terminal_payment(transaction):
         return {
-            "status": checkout_status.status,
-            "payment_status": checkout_status.payment_status,
-            "amount_total": checkout_status.amount_total,
-            "currency": checkout_status.currency
+            "status": transaction["status"],
+            "payment_status": transaction["payment_status"],
+            "amount_total": int(round(transaction["amount"] * 100)),
+            "currency": transaction.get("currency", "usd")
         }
-        
+    
+    cached = payment_status_cache.get(session_id)
+    if cached is not None:
+        return cached
+    
+    # Check with Stripe
+    try:
+        return await payment_status_flight.do(session_id, lambda: refresh_payment_status(transaction))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to check payment status: {str(e)}")
 
+# Stripe webhooks land in the webhook_events inbox and are applied by a background worker
+webhook_inbox: Optional[WebhookInbox] = None
+background_jobs: List[PeriodicJob] = []
+cache_coherence: Optional[CacheCoherence] = None
+COHERENT_COLLECTIONS = ["users", "departments", "machines", "work_orders", "payment_transactions"]
+
+async def apply_webhook_events(events: List[dict]):
+    """Apply a batch of inbox events to payment_transactions; replaying a batch is harmless"""
+    operations = []
+    for event in events:
+        if event["event_type"] == "checkout.session.completed":
+            operations.append(UpdateOne(
+                {"session_id": event["session_id"]},
+                {
+                    "$set": prepare_for_mongo({
+                        "payment_status": event["payment_status"],
+                        "status": "completed",
+                        "updated_at": datetime.now(timezone.utc)
+                    }),
+                    # Completed sessions are kept even if the reconciler expired them first
+                    "$unset": {"purge_at": ""}
+                }
+            ))
+    
+    if operations:
+        await db.payment_transactions.bulk_write(operations, ordered=False)
+    
+    # Grant entitlements for the sessions that were paid
+    paid_at = datetime.now(timezone.utc)
+    paid_sessions = [event["session_id"] for event in events
+                     if event["event_type"] == "checkout.session.completed" and event["payment_status"] == "paid"]
+    if paid_sessions:
+        transactions = await db.payment_transactions.find({"session_id": {"$in": paid_sessions}}).to_list(None)
+        await grant_entitlements(transactions, paid_at)
+    
+    for event in events:
+        payment_status_cache.pop(event["session_id"])
+
 @api_router.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
     # Get raw request body
     body = await request.body()
     signature = request.headers.get("Stripe-Signature")
     
-    stripe_api_key = os.environ.get('STRIPE_SECRET_KEY')
-    webhook_url = "dummy_url"  # Not used for webhook handling
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
-    
     try:
-        webhook_response = await stripe_checkout.handle_webhook(body, signature)
+        webhook_response = await get_payment_provider().handle_webhook(body, signature)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Webhook error: {str(e)}")
+    
+    # Acknowledge once stored; redeliveries of the same event id are ignored
+    await webhook_inbox.record({
+        "event_id": webhook_response.event_id,
+        "event_type": webhook_response.event_type,
+        "session_id": webhook_response.session_id,
+        "payment_status": webhook_response.payment_status,
+        "metadata": getattr(webhook_response, "metadata", None) or {}
+    })
+    
+    return {"received": True}
+
+# Pending transaction reconciliation: sessions the customer abandoned are
+# never polled again, so a periodic job settles them with the provider.
+# Expired records get a BSON-date purge_at picked up by a TTL index. Only the
+# provider saying "expired" or "no such session" expires a record; a failed
+# lookup (outage, timeout, missing key) leaves it pending for the next run.
+RECONCILE_PAGE_SIZE = int(os.environ.get('RECONCILE_PAGE_SIZE', '200'))
+RECONCILE_CONCURRENCY = int(os.environ.get('RECONCILE_CONCURRENCY', '8'))
+RECONCILE_MIN_AGE_MINUTES = int(os.environ.get('RECONCILE_MIN_AGE_MINUTES', '30'))
+RECONCILE_EXPIRE_AFTER_HOURS = int(os.environ.get('RECONCILE_EXPIRE_AFTER_HOURS', '48'))
+PAYMENT_RETENTION_DAYS = int(os.environ.get('PAYMENT_RETENTION_DAYS', '90'))
+PENDING_PAYMENT_STATUSES = ["pending", "unpaid"]
+
+async def reconcile_pending_transactions() -> dict:
+    """Settle stale pending transactions with the provider, one page at a time"""
+    now = datetime.now(timezone.utc)
+    cutoff = (now - timedelta(minutes=RECONCILE_MIN_AGE_MINUTES)).isoformat()
+    expire_before = (now - timedelta(hours=RECONCILE_EXPIRE_AFTER_HOURS)).isoformat()
+    purge_at = now + timedelta(days=PAYMENT_RETENTION_DAYS)
+    provider = get_payment_provider()
+    semaphore = asyncio.Semaphore(RECONCILE_CONCURRENCY)
+    summary = {"checked": 0, "paid": 0, "expired": 0, "unchanged": 0, "errors": 0}
+    # Keyset cursor: (created_at, session_id) of the last transaction seen, so ties on created_at are not skipped
+    last_key = None
+    
+    async def check(transaction):
+        async with semaphore:
+            try:
+                return transaction, await provider.get_checkout_status(transaction["session_id"]), None
+            except CheckoutNotFound:
+                return transaction, None, "not_found"
+            except Exception as e:
+                logger.warning("Checkout status lookup for %s failed: %s", transaction["session_id"], e)
+                return transaction, None, "error"
+    
+    while True:
+        query = {
+            "payment_status": {"$in": PENDING_PAYMENT_STATUSES},
+            "status": {"$ne": "expired"},
+            "created_at": {"$lt": cutoff}
+        }
+        if last_key:
+            query["$or"] = [
+                {"created_at": {"$gt": last_key[0]}},
+                {"created_at": last_key[0], "session_id": {"$gt": last_key[1]}}
+            ]
+        page = await db.payment_transactions.find(query).sort(
+            [("created_at", 1), ("session_id", 1)]
+        ).limit(RECONCILE_PAGE_SIZE).to_list(RECONCILE_PAGE_SIZE)
+        if not page:
+            break
+        last_key = (page[-1]["created_at"], page[-1]["session_id"])
         
-        if webhook_response.event_type == "checkout.session.completed":
-            # Update transaction status
-            await db.payment_transactions.update_one(
-                {"session_id": webhook_response.session_id},
-                {"$set": prepare_for_mongo({
-                    "payment_status": webhook_response.payment_status,
-                    "status": "completed",
-                    "updated_at": datetime.now(timezone.utc)
-                })}
-            )
+        updates = []
+        paid = []
+        for transaction, checkout_status, failure in await asyncio.gather(*(check(t) for t in page)):
+            summary["checked"] += 1
+            update_data = None
+            if failure == "error":
+                summary["errors"] += 1
+                continue
+            if failure == "not_found":
+                # Sessions the provider no longer knows about expire locally
+                if transaction["created_at"] < expire_before:
+                    update_data = {"payment_status": "expired", "status": "expired"}
+            elif checkout_status.payment_status == "paid":
+                update_data = {"payment_status": "paid", "status": checkout_status.status}
+                paid.append(transaction)
+            elif checkout_status.status == "expired":
+                update_data = {"payment_status": checkout_status.payment_status, "status": "expired"}
+            
+            if update_data is None:
+                summary["unchanged"] += 1
+                continue
+            update_data["updated_at"] = now
+            update = {"$set": prepare_for_mongo(update_data)}
+            if update_data["status"] == "expired":
+                update["$set"]["purge_at"] = purge_at
+                summary["expired"] += 1
+            else:
+                update["$unset"] = {"purge_at": ""}
+                summary["paid"] += 1
+            updates.append(UpdateOne({"_id": transaction["_id"]}, update))
         
-        return {"received": True}
+        if updates:
+            await db.payment_transactions.bulk_write(updates, ordered=False)
+        await grant_entitlements(paid, now)
+        for transaction in page:
+            payment_status_cache.pop(transaction["session_id"])
+        if len(page) < RECONCILE_PAGE_SIZE:
+            break
+    
+    return summary
+
+# Archival: completed work orders older than ARCHIVE_AFTER_DAYS move to
+# work_orders_archive so the hot collection and its indexes only hold what
+# the board shows. Each batch is copied, then deleted per site (the shard key)
+# with the completed filter repeated, so an order reopened in between stays
+# hot and its archive copy is removed again. A batch interrupted between copy
+# and delete is simply copied again (duplicate ids are ignored) and deleted.
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '90'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+ARCHIVE_MAX_BATCHES = int(os.environ.get('ARCHIVE_MAX_BATCHES', '50'))
+
+async def archive_completed_work_orders() -> dict:
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+    query = {"status": WorkOrderStatus.COMPLETED.value, "completed_at": {"$lt": cutoff}}
+    summary = {"archived": 0, "batches": 0}
+    
+    for _ in range(ARCHIVE_MAX_BATCHES):
+        batch = await db.work_orders.find(query).sort("completed_at", 1).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+        if not batch:
+            break
+        for wo in batch:
+            wo["archived_at"] = datetime.now(timezone.utc).isoformat()
+        try:
+            await db.work_orders_archive.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Documents copied by an interrupted earlier run are already there
+            if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                raise
         
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Webhook error: {str(e)}")
+        ids_per_site: Dict[Optional[str], List[str]] = {}
+        for wo in batch:
+            ids_per_site.setdefault(wo.get("site"), []).append(wo["id"])
+        archived = 0
+        for wo_site, ids in ids_per_site.items():
+            result = await db.work_orders.delete_many({"site": wo_site, "id": {"$in": ids}, **query})
+            if result.deleted_count:
+                await bump_site_counters(wo_site, {WorkOrderStatus.COMPLETED.value: -result.deleted_count},
+                                         total=-result.deleted_count)
+            archived += result.deleted_count
+        bump_write_generation("work_orders")
+        
+        if archived < len(batch):
+            # Reopened after the read: the hot copy is the live one, drop the archived one
+            still_hot = await db.work_orders.distinct("id", {"id": {"$in": [wo["id"] for wo in batch]}})
+            if still_hot:
+                await db.work_orders_archive.delete_many({"id": {"$in": still_hot}})
+        
+        summary["archived"] += archived
+        summary["batches"] += 1
+        if len(batch) < ARCHIVE_BATCH_SIZE:
+            break
+    
+    return summary
+
+# Daily status snapshots: one compact count document per site and department
+# in the status_snapshots time-series collection, so trend charts read a few
+# documents per day instead of replaying every order's timestamps. Snapshots
+# are append-only; the trend keeps the latest snapshot of each day.
+SNAPSHOT_RETENTION_DAYS = int(os.environ.get('SNAPSHOT_RETENTION_DAYS', '730'))
+TREND_GROUPS = ("site", "department")
+
+async def create_snapshot_collection():
+    """Time-series store for status snapshots, expiring after SNAPSHOT_RETENTION_DAYS"""
+    if "status_snapshots" in await db.list_collection_names():
+        return
+    try:
+        await db.create_collection(
+            "status_snapshots",
+            timeseries={"timeField": "taken_at", "metaField": "meta", "granularity": "hours"},
+            expireAfterSeconds=SNAPSHOT_RETENTION_DAYS * 86400
+        )
+    except CollectionInvalid:
+        pass  # another worker created it first
+
+async def take_status_snapshot() -> dict:
+    now = datetime.now(timezone.utc)
+    completed = WorkOrderStatus.COMPLETED.value
+    overdue = {"$and": [
+        {"$ne": ["$status", completed]},
+        {"$gt": ["$due_date", None]},
+        {"$lt": ["$due_date", now.isoformat()]}
+    ]}
+    groups = await db.work_orders.aggregate([
+        {"$group": {
+            "_id": {"site": "$site", "department": "$department_name", "status": "$status"},
+            "count": {"$sum": 1},
+            "overdue": {"$sum": {"$cond": [overdue, 1, 0]}}
+        }}
+    ]).to_list(length=None)
+    
+    series: Dict[tuple, dict] = {}
+    for group in groups:
+        site = group["_id"].get("site") or DEFAULT_SITE
+        department = group["_id"].get("department")
+        snapshot = series.setdefault((site, department), {
+            "taken_at": now,
+            "run": int(now.timestamp() * 1_000_000),  # taken_at is stored at millisecond precision
+            "day": now.date().isoformat(),
+            "meta": {"site": site, "department": department},
+            "total": 0, "open": 0, "overdue": 0, "status": {}
+        })
+        wo_status = group["_id"].get("status") or "Unknown"
+        snapshot["status"][wo_status] = snapshot["status"].get(wo_status, 0) + group["count"]
+        snapshot["total"] += group["count"]
+        snapshot["overdue"] += group["overdue"]
+        if wo_status != completed:
+            snapshot["open"] += group["count"]
+    
+    if series:
+        await db.status_snapshots.insert_many(list(series.values()))
+    return {"day": now.date().isoformat(), "series": len(series), "work_orders": sum(s["total"] for s in series.values())}
+
+async def daily_status_snapshot() -> dict:
+    """Take today's snapshot unless one exists; checked hourly so a restart never skips a day"""
+    midnight = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if await db.status_snapshots.find_one({"taken_at": {"$gte": midnight}}, {"_id": 1}):
+        return {}
+    return await take_status_snapshot()
+
+@api_router.post("/stats/snapshot")
+async def create_status_snapshot(current_user: User = Depends(get_current_user_with_access)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can take snapshots")
+    
+    return await take_status_snapshot()
+
+@api_router.get("/stats/trend")
+async def get_status_trend(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    site: Optional[str] = None,
+    department: Optional[str] = None,
+    group_by: Optional[str] = None,
+    current_user: User = Depends(get_current_user_with_access)
+):
+    """Daily open/overdue/status counts between start and end (inclusive, default last 30 days)"""
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if group_by and group_by not in TREND_GROUPS:
+        raise HTTPException(status_code=400, detail="group_by must be site or department")
+    
+    query: Dict[str, Any] = {"taken_at": {
+        "$gte": datetime.combine(start, datetime.min.time(), timezone.utc),
+        "$lt": datetime.combine(end + timedelta(days=1), datetime.min.time(), timezone.utc)
+    }}
+    if site:
+        query["meta.site"] = site
+    if department:
+        query["meta.department"] = department
+    
+    # Snapshots arrive oldest first, so a newer run of the same day replaces the earlier one
+    days: Dict[str, dict] = {}
+    cursor = db.status_snapshots.find(query, {"_id": 0}).sort("taken_at", 1)
+    async for snapshot in cursor:
+        run = (snapshot["taken_at"], snapshot.get("run", 0))
+        day = days.get(snapshot["day"])
+        if day is None or run > day["run"]:
+            day = days[snapshot["day"]] = {"run": run, "points": {}}
+        elif run < day["run"]:
+            continue
+        key = snapshot["meta"].get(group_by) if group_by else None
+        point = day["points"].setdefault(key, {"total": 0, "open": 0, "overdue": 0, "status": {}})
+        for field in ("total", "open", "overdue"):
+            point[field] += snapshot.get(field, 0)
+        for wo_status, count in snapshot.get("status", {}).items():
+            point["status"][wo_status] = point["status"].get(wo_status, 0) + count
+    
+    points = []
+    for day in sorted(days):
+        for key, point in days[day]["points"].items():
+            points.append({"day": day, **({group_by: key} if group_by else {}), **point})
+    return FastJSONResponse({"start": start.isoformat(), "end": end.isoformat(), "group_by": group_by, "points": points})
+
+# Admin query diagnostics
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(min_ms: float = 0, current_user: User = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view query diagnostics")
+    
+    return {"threshold_ms": slow_query_log.threshold_ms, "shapes": slow_query_log.snapshot(min_ms)}
+
+@api_router.post("/admin/slow-queries/{shape_id}/explain")
+async def explain_slow_query(shape_id: str, verbosity: str = "queryPlanner", current_user: User = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view query diagnostics")
+    
+    if verbosity not in ("queryPlanner", "executionStats"):
+        raise HTTPException(status_code=400, detail="verbosity must be queryPlanner or executionStats")
+    
+    result = await slow_query_log.explain(client, shape_id, verbosity)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No slow sample recorded for this query shape")
+    
+    # Explain output contains BSON types (Timestamp, ObjectId); render as extended JSON
+    return json.loads(json_util.dumps(result))
+
+@api_router.delete("/admin/slow-queries")
+async def reset_slow_queries(current_user: User = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can reset query diagnostics")
+    
+    slow_query_log.reset()
+    return {"message": "Slow query log cleared"}
+
+# Request profiles captured by ProfilingMiddleware
+@api_router.get("/admin/profiles")
+async def get_profiles(current_user: User = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view profiles")
+    
+    return profile_store.list()
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, current_user: User = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can view profiles")
+    
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    # Collapsed stacks: feed to flamegraph.pl or open in speedscope
+    return PlainTextResponse(
+        profile["collapsed"],
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
 
 # Get available packages
 @api_router.get("/payments/packages")
@@ -779,9 +1805,63 @@ async def get_payment_packages():
 async def health_check():
     return {"status": "ok", "message": "SimplePM Board API is running"}
 
+# Prometheus scrape endpoint (outside /api, not part of the public API)
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', '1024')),
+    offload_size=int(os.environ.get('COMPRESSION_OFFLOAD_SIZE', str(256 * 1024))),
+)
+
+# Admission control sits inside CORS so shed 503s still carry CORS headers.
+# Exports, reports and imports share a small pool; Kanban drag updates
+# (update_work_order) can also use the reserved slots nothing else may take.
+admission = AdmissionController(
+    classes=[
+        RouteClass(
+            "critical_write",
+            limit=int(os.environ.get('ADMISSION_WRITE_LIMIT', '32')),
+            max_queue=200,
+            queue_timeout=float(os.environ.get('ADMISSION_WRITE_QUEUE_TIMEOUT_S', '2')),
+            priority=True,
+            routes=[("PUT", r"^/api/work-orders/[^/]+$")]
+        ),
+        RouteClass(
+            "bulk",
+            limit=int(os.environ.get('ADMISSION_BULK_LIMIT', '4')),
+            max_queue=int(os.environ.get('ADMISSION_BULK_QUEUE', '8')),
+            queue_timeout=float(os.environ.get('ADMISSION_BULK_QUEUE_TIMEOUT_S', '10')),
+            routes=[("GET", r"^/api/work-orders/export$"), ("GET", r"^/api/reports$"),
+                    ("POST", r"^/api/import/"), ("POST", r"^/api/stats/snapshot$")]
+        ),
+        RouteClass(
+            "list",
+            limit=int(os.environ.get('ADMISSION_LIST_LIMIT', '16')),
+            max_queue=int(os.environ.get('ADMISSION_LIST_QUEUE', '64')),
+            queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_S', '5')),
+            routes=[("GET", r"^/api/work-orders(/search)?$"), ("GET", r"^/api/(machines|departments|users|sites)$"),
+                    ("GET", r"^/api/stats/trend$")]
+        ),
+    ],
+    default=RouteClass(
+        "default",
+        limit=int(os.environ.get('ADMISSION_DEFAULT_LIMIT', '32')),
+        max_queue=100,
+        queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_S', '5'))
+    ),
+    capacity=int(os.environ.get('ADMISSION_CAPACITY', '64')),
+    reserved=int(os.environ.get('ADMISSION_RESERVED', '8')),
+    exempt=("/api/health",)
+)
+if os.environ.get('ADMISSION_ENABLED', '1') == '1':
+    app.add_middleware(AdmissionMiddleware, controller=admission)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -790,6 +1870,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+profile_store = ProfileStore(max_profiles=int(os.environ.get('PROFILE_MAX_STORED', '50')))
+app.add_middleware(
+    ProfilingMiddleware,
+    store=profile_store,
+    authorize=is_admin_request,
+    routes=os.environ.get('PROFILE_ROUTES', '').split(','),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+    interval=float(os.environ.get('PROFILE_INTERVAL_MS', '1')) / 1000,
+)
+
+# Added last so it wraps everything: latency includes compression and CORS
+app.add_middleware(MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -797,6 +1890,119 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def create_archive_collection():
+    """Cold store for archived work orders, zstd-compressed on disk"""
+    if "work_orders_archive" in await db.list_collection_names():
+        return
+    try:
+        await db.create_collection(
+            "work_orders_archive",
+            storageEngine={"wiredTiger": {"configString": f"block_compressor={os.environ.get('ARCHIVE_BLOCK_COMPRESSOR', 'zstd')}"}}
+        )
+    except CollectionInvalid:
+        pass  # another worker created it first
+
+async def ensure_indexes():
+    """Indexes the app relies on; create_index is a no-op for existing indexes"""
+    if webhook_inbox is not None:
+        await webhook_inbox.ensure_indexes()
+    await db.payment_transactions.create_index("session_id")
+    await db.payment_transactions.create_index([("payment_status", 1), ("created_at", 1), ("session_id", 1)])
+    await db.payment_transactions.create_index("purge_at", expireAfterSeconds=0)
+    # Site-prefixed layout: {site, id} is also the shard key if work_orders is sharded
+    await db.work_orders.create_index([("site", 1), ("id", 1)])
+    await db.work_orders.create_index([("site", 1), ("created_at", -1)])
+    await db.work_orders.create_index("id")
+    await db.work_orders.create_index("wo_id")
+    await db.machines.create_index([("site", 1), ("department_id", 1)])
+    await db.departments.create_index([("site", 1), ("name", 1)])
+    await db.work_orders.create_index([("status", 1), ("completed_at", 1)])
+    await create_archive_collection()
+    await db.work_orders_archive.create_index("id", unique=True)
+    await db.work_orders_archive.create_index("wo_id")
+    await db.work_orders_archive.create_index([("site", 1), ("created_at", -1)])
+    await create_snapshot_collection()
+    await db.status_snapshots.create_index([("meta.site", 1), ("taken_at", 1)])
+
+@app.on_event("startup")
+async def startup_payment_provider():
+    await start_payment_provider()
+
+@app.on_event("startup")
+async def startup_report_pool():
+    reports.start_report_pool(int(os.environ.get('REPORT_WORKERS', '2')))
+
+@app.on_event("startup")
+async def startup_cache_coherence():
+    global cache_coherence
+    cache_coherence = CacheCoherence(
+        db,
+        COHERENT_COLLECTIONS,
+        poll_interval=float(os.environ.get('CACHE_COHERENCE_POLL_S', '1'))
+    )
+    cache_coherence.register("users", evict_user)
+    cache_coherence.register("payment_transactions", evict_payment_status)
+    cache_coherence.start()
+
+@app.on_event("startup")
+async def startup_background_workers():
+    global webhook_inbox
+    webhook_inbox = WebhookInbox(
+        db.webhook_events,
+        apply_webhook_events,
+        batch_size=int(os.environ.get('WEBHOOK_BATCH_SIZE', '100')),
+        poll_interval=float(os.environ.get('WEBHOOK_POLL_INTERVAL_S', '1')),
+        max_attempts=int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '8'))
+    )
+    try:
+        await ensure_indexes()
+        await seed_site_counters()
+    except Exception:
+        logger.exception("Could not prepare indexes and counters at startup")
+    webhook_inbox.start()
+    
+    reconcile_interval = float(os.environ.get('RECONCILE_INTERVAL_S', '300'))
+    if reconcile_interval > 0:
+        background_jobs.append(PeriodicJob(
+            "reconcile_payments",
+            reconcile_interval,
+            reconcile_pending_transactions,
+            LeaseLock(db.jobs, "reconcile_payments", lease_seconds=max(600, reconcile_interval))
+        ))
+    archive_interval = float(os.environ.get('ARCHIVE_INTERVAL_S', '3600'))
+    if archive_interval > 0:
+        background_jobs.append(PeriodicJob(
+            "archive_work_orders",
+            archive_interval,
+            archive_completed_work_orders,
+            LeaseLock(db.jobs, "archive_work_orders", lease_seconds=max(1800, archive_interval))
+        ))
+    snapshot_interval = float(os.environ.get('SNAPSHOT_CHECK_INTERVAL_S', '3600'))
+    if snapshot_interval > 0:
+        background_jobs.append(PeriodicJob(
+            "status_snapshot",
+            snapshot_interval,
+            daily_status_snapshot,
+            LeaseLock(db.jobs, "status_snapshot", lease_seconds=max(600, snapshot_interval))
+        ))
+    for job in background_jobs:
+        job.start()
+
+@app.on_event("shutdown")
+async def shutdown_cache_coherence():
+    if cache_coherence is not None:
+        await cache_coherence.stop()
+
+@app.on_event("shutdown")
+async def shutdown_background_workers():
+    if webhook_inbox is not None:
+        await webhook_inbox.stop()
+    for job in background_jobs:
+        await job.stop()
+    background_jobs.clear()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    reports.close_report_pool()
+    await close_payment_provider()
     client.close()
@@ -0,0 +1,266 @@
+"""Slow-query log keyed by normalized query shape.
+
+Every query-bearing MongoDB command (find, aggregate, count, distinct,
+update, delete, findAndModify) is reduced to a *shape*: the collection,
+the command and the filter/sort/projection with every literal value
+replaced by ``"?"``. Counts and latency percentiles are aggregated per shape.
+For commands slower than the threshold a sample of the real command is kept
+so an ``explain`` plan can be captured on demand from the admin endpoint.
+"""
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from metrics import command_collection
+
+logger = logging.getLogger(__name__)
+
+SHAPED_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+# Session/transport fields that must not be replayed inside an explain.
+_UNEXPLAINABLE_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+# Operators whose list argument is data, not structure.
+_VALUE_LIST_OPERATORS = {"$in", "$nin", "$all"}
+
+
+def normalize(value: Any) -> Any:
+    """Strip literal values from a filter, keeping field names and operators"""
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key in _VALUE_LIST_OPERATORS:
+                result[key] = "?"
+            else:
+                result[key] = normalize(item)
+        return result
+    if isinstance(value, (list, tuple)):
+        # $and/$or branches and pipelines are structure; keep each element.
+        return [normalize(item) for item in value]
+    return "?"
+
+
+def _sort_shape(sort: Any) -> Any:
+    # Sort directions are part of the shape: they decide index usability.
+    return dict(sort) if isinstance(sort, dict) else sort
+
+
+def _stage_shape(step: Dict[str, Any]) -> Dict[str, Any]:
+    shaped = {}
+    for stage, spec in step.items():
+        if stage == "$sort":
+            shaped[stage] = _sort_shape(spec)
+        elif stage in ("$match", "$lookup", "$unionWith"):
+            shaped[stage] = normalize(spec)
+        else:
+            # Projections, groups etc. don't affect index selection.
+            shaped[stage] = "?"
+    return shaped
+
+
+def command_shape(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    shape: Dict[str, Any] = {"ns": command_collection(command_name, command), "op": command_name}
+    if command_name == "find":
+        shape["filter"] = normalize(command.get("filter", {}))
+        if command.get("sort"):
+            shape["sort"] = _sort_shape(command["sort"])
+        if command.get("projection"):
+            shape["projection"] = sorted(command["projection"])
+    elif command_name == "aggregate":
+        shape["pipeline"] = [_stage_shape(step) for step in command.get("pipeline", [])]
+    elif command_name in ("count", "distinct"):
+        shape["filter"] = normalize(command.get("query", {}))
+        if command_name == "distinct":
+            shape["key"] = command.get("key")
+    elif command_name == "update":
+        shape["filter"] = [normalize(u.get("q", {})) for u in command.get("updates", [])[:1]]
+        shape["multi"] = any(u.get("multi") for u in command.get("updates", []))
+    elif command_name == "delete":
+        shape["filter"] = [normalize(d.get("q", {})) for d in command.get("deletes", [])[:1]]
+    elif command_name == "findAndModify":
+        shape["filter"] = normalize(command.get("query", {}))
+        if command.get("sort"):
+            shape["sort"] = _sort_shape(command["sort"])
+    return shape
+
+
+def shape_id(shape: Dict[str, Any]) -> str:
+    encoded = json.dumps(shape, default=str).encode()
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class _ShapeStats:
+    def __init__(self, shape: Dict[str, Any], reservoir_size: int):
+        self.shape = shape
+        self.count = 0
+        self.failures = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.slow_count = 0
+        self.recent: Deque[float] = deque(maxlen=reservoir_size)
+        self.last_seen = 0.0
+        self.sample_command: Optional[Dict[str, Any]] = None
+        self.sample_db: Optional[str] = None
+        self.explain: Optional[Dict[str, Any]] = None
+
+    def to_dict(self, sid: str) -> Dict[str, Any]:
+        values = sorted(self.recent)
+        return {
+            "shape_id": sid,
+            "shape": self.shape,
+            "count": self.count,
+            "failures": self.failures,
+            "slow_count": self.slow_count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(_percentile(values, 50), 3),
+            "p95_ms": round(_percentile(values, 95), 3),
+            "p99_ms": round(_percentile(values, 99), 3),
+            "max_ms": round(self.max_ms, 3),
+            "last_seen": self.last_seen,
+            "explainable": self.sample_command is not None,
+            "explain": self.explain,
+        }
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Aggregates command latency per query shape; register it on the Motor client"""
+
+    def __init__(self, threshold_ms: float = 100.0, max_shapes: int = 500, reservoir_size: int = 512):
+        self.threshold_ms = threshold_ms
+        self.max_shapes = max_shapes
+        self.reservoir_size = reservoir_size
+        self._shapes: "OrderedDict[str, _ShapeStats]" = OrderedDict()
+        self._pending: Dict[Tuple[int, int], Tuple[str, Dict[str, Any], str]] = {}
+        self._lock = threading.Lock()
+
+    # pymongo CommandListener interface (runs on Motor executor threads)
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name not in SHAPED_COMMANDS:
+            return
+        with self._lock:
+            self._pending[(event.request_id, event.operation_id)] = (
+                event.command_name, event.command, event.database_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool) -> None:
+        with self._lock:
+            pending = self._pending.pop((event.request_id, event.operation_id), None)
+        if pending is None:
+            return
+        command_name, command, database_name = pending
+        duration_ms = event.duration_micros / 1000
+        shape = command_shape(command_name, command)
+        sid = shape_id(shape)
+        slow = duration_ms >= self.threshold_ms
+
+        with self._lock:
+            stats = self._shapes.get(sid)
+            if stats is None:
+                stats = _ShapeStats(shape, self.reservoir_size)
+                self._shapes[sid] = stats
+                if len(self._shapes) > self.max_shapes:
+                    self._shapes.popitem(last=False)
+            else:
+                self._shapes.move_to_end(sid)
+            stats.count += 1
+            stats.failures += int(failed)
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            stats.recent.append(duration_ms)
+            stats.last_seen = time.time()
+            if slow:
+                stats.slow_count += 1
+                stats.sample_command = copy.deepcopy(dict(command))
+                stats.sample_db = database_name
+
+        if slow:
+            logger.warning("Slow %s on %s took %.1f ms (shape %s: %s)",
+                           command_name, shape["ns"], duration_ms, sid, json.dumps(shape, default=str))
+
+    # Reporting
+
+    def snapshot(self, min_ms: float = 0.0) -> List[Dict[str, Any]]:
+        """Shapes whose worst latency is at least min_ms, most total time first"""
+        with self._lock:
+            rows = [stats.to_dict(sid) for sid, stats in self._shapes.items() if stats.max_ms >= min_ms]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._shapes.clear()
+
+    async def explain(self, client, sid: str, verbosity: str = "queryPlanner") -> Optional[Dict[str, Any]]:
+        """Run explain for the stored slow sample of a shape and remember the summary"""
+        with self._lock:
+            stats = self._shapes.get(sid)
+            if stats is None or stats.sample_command is None:
+                return None
+            command = {k: v for k, v in stats.sample_command.items()
+                       if not k.startswith("$") and k not in _UNEXPLAINABLE_FIELDS}
+            database_name = stats.sample_db
+
+        result = await client[database_name].command({"explain": command, "verbosity": verbosity})
+        summary = summarize_plan(result)
+        with self._lock:
+            if sid in self._shapes:
+                self._shapes[sid].explain = summary
+        return {"shape_id": sid, "summary": summary, "plan": result}
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    stages: List[str] = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for key in ("inputStage", "queryPlan"):
+            stages.extend(_plan_stages(plan.get(key)))
+        for child in plan.get("inputStages", []):
+            stages.extend(_plan_stages(child))
+    return stages
+
+
+def summarize_plan(explain_result: Dict[str, Any]) -> Dict[str, Any]:
+    planner = explain_result.get("queryPlanner")
+    if planner is None:
+        # aggregate explains nest the planner under the first $cursor stage
+        for stage in explain_result.get("stages", []):
+            if "$cursor" in stage:
+                planner = stage["$cursor"].get("queryPlanner")
+                break
+    planner = planner or {}
+    stages = _plan_stages(planner.get("winningPlan", {}))
+    execution = explain_result.get("executionStats", {})
+    summary: Dict[str, Any] = {
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages,
+        "index": next((s for s in stages if s in ("IXSCAN", "IDHACK", "COUNT_SCAN", "DISTINCT_SCAN")), None),
+    }
+    if execution:
+        summary.update({
+            "docs_examined": execution.get("totalDocsExamined"),
+            "keys_examined": execution.get("totalKeysExamined"),
+            "returned": execution.get("nReturned"),
+            "execution_ms": execution.get("executionTimeMillis"),
+        })
+    return summary
@@ -0,0 +1,164 @@
+"""Durable inbox for provider webhooks.
+
+The webhook endpoint verifies the event, stores it in ``webhook_events``
+(unique on ``event_id``, so provider retries are acknowledged without being
+applied twice) and returns immediately. A background worker claims pending
+events in batches, hands them to the ``apply`` callback and marks them done;
+a failed batch is retried with exponential backoff and parked as ``dead``
+after ``max_attempts``.
+
+Claims carry a lease, so several uvicorn workers can run the loop against
+the same collection and a batch held by a crashed worker is picked up again
+once the lease expires. ``apply`` must be idempotent: a batch can be applied
+again if the worker dies before marking it done.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from metrics import WEBHOOK_EVENTS, WEBHOOK_LAG
+
+logger = logging.getLogger(__name__)
+
+PENDING, PROCESSING, DONE, DEAD = "pending", "processing", "done", "dead"
+
+# Done events are kept this long; it bounds the dedupe window, which must
+# outlast the provider's retry schedule (Stripe retries for up to 3 days).
+RETENTION_SECONDS = 7 * 24 * 3600
+
+
+class WebhookInbox:
+    def __init__(self, collection, apply: Callable[[List[dict]], Awaitable[None]], batch_size: int = 100,
+                 poll_interval: float = 1.0, max_attempts: int = 8, base_backoff: float = 2.0,
+                 max_backoff: float = 600.0, lease_seconds: float = 60.0):
+        self.collection = collection
+        self.apply = apply
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index("event_id", unique=True)
+        await self.collection.create_index([("state", ASCENDING), ("next_attempt_at", ASCENDING)])
+        await self.collection.create_index("processed_at", expireAfterSeconds=RETENTION_SECONDS)
+
+    async def record(self, event: dict) -> bool:
+        """Store a verified event; False when it was already received"""
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.insert_one({
+                **event,
+                "state": PENDING,
+                "attempts": 0,
+                "received_at": now,
+                "next_attempt_at": now,
+            })
+        except DuplicateKeyError:
+            WEBHOOK_EVENTS.inc(outcome="duplicate")
+            return False
+        WEBHOOK_EVENTS.inc(outcome="received")
+        self._wakeup.set()
+        return True
+
+    async def _claim(self) -> List[dict]:
+        now = datetime.now(timezone.utc)
+        claimable = {"$or": [
+            {"state": PENDING, "next_attempt_at": {"$lte": now}},
+            {"state": PROCESSING, "lease_until": {"$lt": now}},
+        ]}
+        candidates = await self.collection.find(claimable, {"_id": 1}).sort("next_attempt_at", ASCENDING) \
+            .to_list(self.batch_size)
+        if not candidates:
+            return []
+        token = uuid.uuid4().hex
+        await self.collection.update_many(
+            {"_id": {"$in": [doc["_id"] for doc in candidates]}, **claimable},
+            {"$set": {"state": PROCESSING, "claim": token,
+                      "lease_until": now + timedelta(seconds=self.lease_seconds)}},
+        )
+        return await self.collection.find({"claim": token, "state": PROCESSING}).to_list(None)
+
+    def backoff(self, attempts: int) -> float:
+        return min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+
+    async def process_once(self) -> int:
+        """Apply one batch; returns the number of events claimed"""
+        events = await self._claim()
+        if not events:
+            return 0
+        try:
+            await self.apply(events)
+        except Exception as exc:
+            logger.exception("Applying %d webhook events failed", len(events))
+            await self._retry(events, exc)
+            return len(events)
+
+        now = datetime.now(timezone.utc)
+        await self.collection.update_many(
+            {"_id": {"$in": [event["_id"] for event in events]}},
+            {"$set": {"state": DONE, "processed_at": now}, "$unset": {"claim": "", "lease_until": ""}},
+        )
+        WEBHOOK_EVENTS.inc(len(events), outcome="applied")
+        for event in events:
+            received_at = event["received_at"]
+            if received_at.tzinfo is None:
+                received_at = received_at.replace(tzinfo=timezone.utc)
+            WEBHOOK_LAG.observe((now - received_at).total_seconds())
+        return len(events)
+
+    async def _retry(self, events: List[dict], exc: Exception) -> None:
+        now = datetime.now(timezone.utc)
+        for event in events:
+            attempts = event.get("attempts", 0) + 1
+            dead = attempts >= self.max_attempts
+            await self.collection.update_one({"_id": event["_id"]}, {
+                "$set": {
+                    "state": DEAD if dead else PENDING,
+                    "attempts": attempts,
+                    "last_error": str(exc)[:500],
+                    "next_attempt_at": now + timedelta(seconds=self.backoff(attempts)),
+                },
+                "$unset": {"claim": "", "lease_until": ""},
+            })
+            WEBHOOK_EVENTS.inc(outcome="dead" if dead else "retried")
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                claimed = await self.process_once()
+            except Exception:
+                logger.exception("Webhook inbox poll failed")
+                claimed = 0
+            if claimed < self.batch_size and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=10)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        self._task = None
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
@@ -14,7 +14,8 @@ import {
   Plus, 
   Trash2, 
   Building2,
-  AlertCircle 
+  AlertCircle,
+  Upload
 } from 'lucide-react';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -28,6 +29,8 @@ function MachineManagement({ user }) {
   const [creating, setCreating] = useState(false);
   const [filterDepartment, setFilterDepartment] = useState('');
   const [selectedMachine, setSelectedMachine] = useState(null);
+  const [importing, setImporting] = useState(false);
+  const importInput = useRef(null);
 
   const fetchMachines = async () => {
     try {
@@ -78,6 +81,32 @@ function MachineManagement({ user }) {
     }
   };
 
+  const handleImportMachines = async (e) => {
+    const file = e.target.files?.[0];
+    e.target.value = '';
+    if (!file) return;
+
+    setImporting(true);
+    try {
+      const formData = new FormData();
+      formData.append('file', file);
+      const response = await axios.post(`${API}/import/machines`, formData);
+      const { inserted, failed, errors } = response.data;
+      if (failed > 0) {
+        const first = errors[0];
+        toast.warning(`Imported ${inserted} machines, ${failed} rows failed (line ${first.line}: ${first.error})`);
+      } else {
+        toast.success(`Imported ${inserted} machines`);
+      }
+      await fetchMachines();
+    } catch (error) {
+      const message = error.response?.data?.detail || 'Failed to import machines';
+      toast.error(message);
+    } finally {
+      setImporting(false);
+    }
+  };
+
   const handleDeleteMachine = async (machineId, machineName) => {
     if (!window.confirm(`Are you sure you want to delete "${machineName}"? This action cannot be undone.`)) {
       return;
@@ -171,6 +200,24 @@ function MachineManagement({ user }) {
                 ))}
               </SelectContent>
             </Select>
+            <input
+              ref={importInput}
+              type="file"
+              accept=".csv,text/csv"
+              className="hidden"
+              onChange={handleImportMachines}
+              data-testid="import-machines-input"
+            />
+            <Button
+              variant="outline"
+              onClick={() => importInput.current?.click()}
+              disabled={importing}
+              title="CSV columns: name, department (or department_id), optional site"
+              data-testid="import-machines-btn"
+            >
+              <Upload className="w-4 h-4 mr-2" />
+              {importing ? 'Importing...' : 'Import CSV'}
+            </Button>
           </div>
         </div>
       </div>
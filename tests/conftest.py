@@ -0,0 +1,43 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "simplepm_test")
+
+from benchmarks.loadtest import plain_collection  # noqa: E402
+
+
+@pytest.fixture
+def memory_db(monkeypatch):
+    """An empty in-memory database installed as ``server.db``"""
+    import server
+
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["simplepm_test"]
+    monkeypatch.setattr(type(db), "create_collection", plain_collection(type(db).create_collection))
+    monkeypatch.setattr(server, "db", db)
+    return db
+
+
+def _work_order(n, **fields):
+    import server
+
+    fields = {"title": f"t{n}", "type": "PM", "priority": "Low", "requested_by": "u", "requested_by_name": "u",
+              **fields}
+    wo = server.WorkOrder(wo_id=f"WO-TEST-{n:04d}", **fields)
+    doc = server.prepare_for_mongo(wo.model_dump())
+    # model_dump keeps the enum; the API stores the plain string
+    doc["status"] = wo.status.value
+    return doc
+
+
+@pytest.fixture
+def work_order():
+    """Factory for stored work order documents: ``work_order(n, status=..., site=...)``"""
+    return _work_order
@@ -0,0 +1,96 @@
+import asyncio
+
+from admission import AdmissionController, AdmissionMiddleware, RouteClass
+
+
+def _controller(capacity=4, reserved=1, queue_timeout=0.05):
+    return AdmissionController(
+        classes=[
+            RouteClass("critical_write", limit=4, priority=True, routes=[("PUT", r"^/api/work-orders/[^/]+$")]),
+            RouteClass("bulk", limit=1, max_queue=1, queue_timeout=queue_timeout,
+                       routes=[("GET", r"^/api/work-orders/export$")]),
+        ],
+        default=RouteClass("default", limit=10, queue_timeout=queue_timeout),
+        capacity=capacity,
+        reserved=reserved,
+        exempt=("/api/health",),
+    )
+
+
+def test_classify_by_method_and_path():
+    controller = _controller()
+    assert controller.classify("PUT", "/api/work-orders/abc").name == "critical_write"
+    assert controller.classify("GET", "/api/work-orders/abc").name == "default"
+    assert controller.classify("GET", "/api/work-orders/export").name == "bulk"
+    assert controller.classify("GET", "/api/health") is None
+    assert controller.classify("GET", "/metrics") is None
+
+
+def test_queue_overflow_and_timeout_shed_while_release_hands_over_fifo():
+    async def main():
+        controller = _controller()
+        bulk = controller.classify("GET", "/api/work-orders/export")
+        assert await controller.acquire(bulk) is None
+        queued = asyncio.ensure_future(controller.acquire(bulk))
+        await asyncio.sleep(0)
+        overflow = await controller.acquire(bulk)
+        controller.release(bulk, 0.01)
+        handed_over = await queued
+        timed_out = await controller.acquire(bulk)
+        return overflow, handed_over, timed_out, bulk.active
+
+    overflow, handed_over, timed_out, active = asyncio.run(main())
+    assert overflow == "queue_full"
+    assert handed_over is None
+    assert timed_out == "timeout"
+    assert active == 1
+
+
+def test_reserved_capacity_is_only_available_to_priority_classes():
+    async def main():
+        controller = _controller(capacity=4, reserved=1)
+        default = controller.default
+        write = controller.classify("PUT", "/api/work-orders/1")
+        results = [await controller.acquire(default) for _ in range(3)]
+        results.append(await controller.acquire(default))
+        results.append(await controller.acquire(write))
+        return results
+
+    assert asyncio.run(main()) == [None, None, None, "timeout", None]
+
+
+def test_middleware_answers_503_with_retry_after_when_shedding():
+    controller = _controller()
+
+    async def app(scope, receive, send):
+        await scope["gate"].wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = AdmissionMiddleware(app, controller)
+
+    async def call(gate):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": "/api/work-orders/export", "headers": [], "gate": gate}
+        await middleware(scope, None, send)
+        return messages[0]
+
+    async def main():
+        gate = asyncio.Event()
+        first = asyncio.ensure_future(call(gate))
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(call(gate))
+        await asyncio.sleep(0)
+        shed = await call(gate)
+        gate.set()
+        return shed, await first, await queued
+
+    shed, first, queued = asyncio.run(main())
+    assert shed["status"] == 503
+    assert (b"retry-after", b"1") in shed["headers"]
+    assert first["status"] == queued["status"] == 200
+    assert controller.active == 0
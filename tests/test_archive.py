@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+
+def _completed(work_order, n, days_ago):
+    return work_order(n, status="Completed", completed_at=datetime.now(timezone.utc) - timedelta(days=days_ago))
+
+
+def test_archive_moves_only_old_completed_orders_and_lookup_falls_back(memory_db, work_order):
+    async def main():
+        await server.create_archive_collection()
+        await memory_db.work_orders_archive.create_index("id", unique=True)
+        docs = [_completed(work_order, 1, 400), _completed(work_order, 2, 1), work_order(3, status="Scheduled")]
+        await memory_db.work_orders.insert_many([dict(doc) for doc in docs])
+        # A copy left behind by an interrupted run must not block the batch
+        await memory_db.work_orders_archive.insert_one(dict(docs[0]))
+
+        summary = await server.archive_completed_work_orders()
+        hot = await memory_db.work_orders.distinct("wo_id")
+        archived = await server.find_work_order("WO-TEST-0001")
+        return summary, hot, archived
+
+    summary, hot, archived = asyncio.run(main())
+    assert summary == {"archived": 1, "batches": 1}
+    assert sorted(hot) == ["WO-TEST-0002", "WO-TEST-0003"]
+    assert archived["archived"] is True
+
+
+def test_order_reopened_during_archival_stays_hot_only(memory_db, work_order, monkeypatch):
+    collection_type = type(memory_db.work_orders)
+    insert_many = collection_type.insert_many
+
+    async def insert_then_reopen(self, docs, **kwargs):
+        result = await insert_many(self, docs, **kwargs)
+        if self.name == "work_orders_archive":
+            await memory_db.work_orders.update_one({"wo_id": "WO-TEST-0001"}, {"$set": {"status": "In Progress"}})
+        return result
+
+    monkeypatch.setattr(collection_type, "insert_many", insert_then_reopen)
+
+    async def main():
+        await memory_db.work_orders.insert_many([_completed(work_order, 1, 400), _completed(work_order, 2, 400)])
+        await server.seed_site_counters()
+        summary = await server.archive_completed_work_orders()
+        return (summary, await memory_db.work_orders.distinct("wo_id"),
+                await memory_db.work_orders_archive.distinct("wo_id"), await server.get_sites(current_user=None))
+
+    summary, hot, archived, sites = asyncio.run(main())
+    assert summary == {"archived": 1, "batches": 1}
+    assert hot == ["WO-TEST-0001"]
+    assert archived == ["WO-TEST-0002"]
+    assert sites[0]["work_orders"] == 1
+
+
+def test_update_of_an_order_archived_mid_request_is_a_conflict(memory_db, work_order, monkeypatch):
+    collection_type = type(memory_db.work_orders)
+    find_one_and_update = collection_type.find_one_and_update
+
+    async def archive_then_update(self, *args, **kwargs):
+        # The archival job wins the race between update_work_order's lookup and its write
+        await server.archive_completed_work_orders()
+        return await find_one_and_update(self, *args, **kwargs)
+
+    monkeypatch.setattr(collection_type, "find_one_and_update", archive_then_update)
+    doc = _completed(work_order, 1, 400)
+
+    async def main():
+        await memory_db.work_orders.insert_one(dict(doc))
+        await server.update_work_order(doc["id"], server.WorkOrderUpdate(title="late edit"), current_user=None)
+
+    with pytest.raises(server.HTTPException) as caught:
+        asyncio.run(main())
+    assert caught.value.status_code == 409
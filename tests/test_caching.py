@@ -0,0 +1,49 @@
+import asyncio
+
+from caching import SingleFlight, TimedCache
+from metrics import CACHE_REQUESTS, SINGLE_FLIGHT_CALLS
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight("test_coalesce")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"status": "open"}
+
+    async def main():
+        return await asyncio.gather(*(flight.do("cs_1", fetch) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(result == {"status": "open"} for result in results)
+    assert SINGLE_FLIGHT_CALLS.value(name="test_coalesce", role="coalesced") == 4
+    assert flight.inflight == 0
+
+def test_single_flight_shares_errors_and_retries_afterwards():
+    flight = SingleFlight("test_errors")
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("provider down")
+
+    async def ok():
+        return "ok"
+
+    async def main():
+        results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        return await flight.do("k", ok)
+
+    assert asyncio.run(main()) == "ok"
+
+def test_timed_cache_records_hits_and_expires():
+    cache = TimedCache("test_timed", maxsize=10, ttl=0.05)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert CACHE_REQUESTS.value(cache="test_timed", result="hit") == 1
+    assert CACHE_REQUESTS.value(cache="test_timed", result="miss") == 1
+    asyncio.run(asyncio.sleep(0.06))
+    assert cache.get("a", "expired") == "expired"
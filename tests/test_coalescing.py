@@ -0,0 +1,57 @@
+import asyncio
+
+import server
+from metrics import SINGLE_FLIGHT_CALLS
+
+
+def _calls(role):
+    return SINGLE_FLIGHT_CALLS.value(name="work_orders_list", role=role)
+
+
+def test_identical_concurrent_board_loads_share_one_query_and_body(memory_db, work_order):
+    async def main():
+        await memory_db.work_orders.insert_many([work_order(1, site="North"), work_order(2, site="South")])
+        before = _calls("leader"), _calls("coalesced")
+        responses = await asyncio.gather(*[server.get_work_orders(site="North", current_user=None) for _ in range(5)],
+                                         server.get_work_orders(site="South", current_user=None))
+        return responses, _calls("leader") - before[0], _calls("coalesced") - before[1]
+
+    responses, leaders, coalesced = asyncio.run(main())
+    north, south = responses[0], responses[-1]
+    assert (leaders, coalesced) == (2, 4)
+    assert all(response.body == north.body for response in responses[:5])
+    assert b"WO-TEST-0001" in north.body and b"WO-TEST-0001" not in south.body
+
+
+def test_read_after_a_write_does_not_join_a_flight_started_before_it(memory_db, work_order, monkeypatch):
+    doc = work_order(1, site="North")
+    render_work_orders = server.render_work_orders
+    rendered = release = None
+
+    async def slow_first_render(query):
+        body = await render_work_orders(query)
+        if not rendered.is_set():
+            # The first flight has read the old state and is still on its way back
+            rendered.set()
+            await release.wait()
+        return body
+
+    monkeypatch.setattr(server, "render_work_orders", slow_first_render)
+
+    async def main():
+        nonlocal rendered, release
+        rendered, release = asyncio.Event(), asyncio.Event()
+        await memory_db.work_orders.insert_one(dict(doc))
+        before = _calls("leader")
+        stale = asyncio.create_task(server.get_work_orders(site="North", current_user=None))
+        await rendered.wait()
+        await server.update_work_order(doc["id"], server.WorkOrderUpdate(title="renamed"), current_user=None)
+        fresh = asyncio.create_task(server.get_work_orders(site="North", current_user=None))
+        await asyncio.sleep(0)
+        release.set()
+        return (await stale).body, (await fresh).body, _calls("leader") - before
+
+    stale, fresh, leaders = asyncio.run(main())
+    assert leaders == 2
+    assert b'"title":"t1"' in stale
+    assert b'"title":"renamed"' in fresh
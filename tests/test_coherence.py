@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from coherence import CacheCoherence
+
+
+class StandaloneDb:
+    """Wraps an in-memory database the way a standalone mongod answers watch()"""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return self._db[name]
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+
+def test_dispatch_bumps_version_and_calls_handlers():
+    coherence = CacheCoherence(db=None, collections=["users"])
+    seen = []
+    coherence.register("users", seen.append)
+    coherence.dispatch("users", {"username": "a"}, "change_stream")
+    coherence.dispatch("users", None, "change_stream")
+    assert seen == [{"username": "a"}, None]
+    assert coherence.version("users") == 2
+    with pytest.raises(ValueError):
+        coherence.register("reports", seen.append)
+
+
+def test_falls_back_to_updated_at_polling_without_change_streams():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["coherence_test"]
+    evicted = []
+
+    async def main():
+        coherence = CacheCoherence(StandaloneDb(db), ["users"], poll_interval=0.01)
+        coherence.register("users", lambda document: evicted.append(document["username"]))
+        coherence.start()
+        await asyncio.sleep(0.05)
+        await db.users.insert_one({"id": "u1", "username": "alice",
+                                   "updated_at": datetime.now(timezone.utc).isoformat()})
+        await asyncio.sleep(0.05)
+        await coherence.stop()
+        return coherence
+
+    coherence = asyncio.run(main())
+    assert evicted == ["alice"]
+    assert coherence.mode == "stopped"
@@ -0,0 +1,58 @@
+import gzip
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from compression import CompressionMiddleware, negotiate_encoding
+
+
+def build_client():
+    async def large(request):
+        return PlainTextResponse("work order " * 500)
+
+    async def small(request):
+        return PlainTextResponse("ok")
+
+    async def stream(request):
+        async def rows():
+            for i in range(50):
+                yield f'{{"row": {i}, "status": "Scheduled"}}\n'
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    app = Starlette(routes=[
+        Route("/large", large), Route("/small", small), Route("/stream", stream),
+    ])
+    app.add_middleware(CompressionMiddleware, minimum_size=500, offload_size=1000)
+    return TestClient(app)
+
+
+def test_negotiate_encoding_prefers_highest_q_then_server_order():
+    supported = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("gzip, br", supported) == "br"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", supported) == "gzip"
+    assert negotiate_encoding("*", supported) == "zstd"
+    assert negotiate_encoding("br;q=0, gzip;q=0", supported) is None
+    assert negotiate_encoding("identity", supported) is None
+
+
+def test_large_body_is_compressed_and_small_body_is_not():
+    client = build_client()
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.text == "work order " * 500
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_streaming_body_is_compressed_incrementally():
+    client = build_client()
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert len(lines) == 50
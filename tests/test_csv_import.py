@@ -0,0 +1,91 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from csv_import import ImportReport, insert_unordered, read_csv_batches
+
+
+async def _read(data: bytes, batch_size: int):
+    upload = SimpleNamespace(file=io.BytesIO(data))
+    return [batch async for batch in read_csv_batches(upload, batch_size)]
+
+
+def test_csv_batches_carry_line_numbers_and_normalised_cells():
+    data = '﻿Name , Site\n"Press, 1",North\n\n"multi\nline",\nlast,  \n'.encode("utf-8")
+    batches = asyncio.run(_read(data, 2))
+
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert batches[0][0] == (2, {"name": "Press, 1", "site": "North"})
+    assert batches[0][1] == (5, {"name": "multi\nline"})
+    assert batches[1][0] == (6, {"name": "last"})
+
+
+def test_unordered_insert_reports_failed_rows_by_line():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient()["import_test"]["machines"]
+
+    async def main():
+        await collection.create_index("name", unique=True)
+        report = ImportReport("machines")
+        inserted = await insert_unordered(collection, [{"name": "a"}, {"name": "a"}, {"name": "b"}], [2, 3, 4], report)
+        return inserted, report.as_dict(), await collection.count_documents({})
+
+    inserted, report, stored = asyncio.run(main())
+    assert inserted == [0, 2]
+    assert stored == 2
+    assert report["inserted"] == 2
+    assert report["errors"] == [{"line": 3, "error": "duplicate key"}]
+
+
+def test_work_order_rows_resolve_names_from_the_cached_lookups():
+    lookups = server.ImportLookups()
+    lookups.add_department({"id": "d1", "name": "Press Shop", "site": "North"})
+    lookups.add_machine({"id": "m1", "name": "Press 3", "department_id": "d1", "site": "North"})
+    lookups.wo_prefix, lookups.next_wo_number = "WO-2026-", 7
+    user = server.User(username="admin", email="a@x", role=server.UserRole.ADMIN)
+
+    doc = server.import_work_order_row({"title": "Lube", "type": "PM", "machine": "press 3", "tags": "a;b"}, lookups, user)
+    assert (doc["wo_id"], doc["site"], doc["department_name"], doc["tags"]) == ("WO-2026-0007", "North", "Press Shop", ["a", "b"])
+
+    with pytest.raises(ValueError, match="Unknown machine"):
+        server.import_work_order_row({"title": "x", "type": "PM", "machine": "Lathe"}, lookups, user)
+
+
+def test_generated_wo_numbers_taken_by_concurrent_creates_are_reassigned(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["import_wo_test"]
+    monkeypatch.setattr(server, "db", db)
+    year = server.datetime.now(server.timezone.utc).year
+
+    async def main():
+        await db.work_orders.insert_one({"wo_id": f"WO-{year}-0001"})
+        lookups = await server.ImportLookups.load("work-orders")
+        docs = [{"wo_id": lookups.next_wo_id()}, {"wo_id": lookups.next_wo_id()}, {"wo_id": "WO-2019-0042"}]
+        # Created through the UI while the import was parsing its batch
+        await db.work_orders.insert_many([{"wo_id": f"WO-{year}-0002"}, {"wo_id": f"WO-{year}-0003"}])
+        await db.work_orders_archive.insert_one({"wo_id": "WO-2019-0042"})
+        report = ImportReport("work-orders")
+        lines = [2, 3, 4]
+        await server.claim_wo_ids(docs, lines, lookups, report)
+        return docs, lines, report.as_dict()["errors"]
+
+    docs, lines, errors = asyncio.run(main())
+    assert [doc["wo_id"] for doc in docs] == [f"WO-{year}-0004", f"WO-{year}-0005"]
+    assert lines == [2, 3]
+    assert errors == [{"line": 4, "error": "Work order WO-2019-0042 already exists"}]
+
+
+def test_departments_join_the_lookups_only_once_inserted():
+    lookups = server.ImportLookups()
+    user = server.User(username="admin", email="a@x", role=server.UserRole.ADMIN)
+    server.import_department_row({"name": "Paint"}, lookups, user)
+    with pytest.raises(ValueError, match="already exists"):
+        server.import_department_row({"name": "paint"}, lookups, user)
+    assert lookups.departments == {}
+
+    # The insert failed, so the next batch may try the name again
+    lookups.pending_departments.clear()
+    server.import_department_row({"name": "Paint"}, lookups, user)
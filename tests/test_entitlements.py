@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import server
+
+
+def _user(**fields):
+    return server.User(username="e", email="e@test.local", role=server.UserRole.ADMIN, **fields)
+
+
+def test_access_is_a_field_comparison():
+    expired_trial = datetime.now(timezone.utc) - timedelta(days=30)
+    active = server.Entitlement(plan="starter_monthly", expires_at=datetime.now(timezone.utc) + timedelta(days=1))
+    lapsed = server.Entitlement(plan="starter_monthly", expires_at=datetime.now(timezone.utc) - timedelta(days=1))
+    assert server.check_user_access(_user(trial_start=expired_trial, entitlement=active))
+    assert not server.check_user_access(_user(trial_start=expired_trial, entitlement=lapsed))
+    assert server.check_user_access(_user())
+
+
+def test_entitlement_update_is_idempotent_per_session(memory_db):
+    paid_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    transaction = {"session_id": "cs_1", "user_id": "u1", "package_id": "starter_yearly", "metadata": {"user_count": "4"}}
+
+    async def scenario():
+        await memory_db.users.insert_one({"id": "u1", "username": "e", "entitlement": None})
+        first = await memory_db.users.bulk_write([server.entitlement_update(transaction, paid_at)])
+        # A redelivered webhook for the same session must not extend the entitlement again
+        replay = await memory_db.users.bulk_write([server.entitlement_update(transaction, paid_at + timedelta(days=1))])
+        return first.modified_count, replay.modified_count, await memory_db.users.find_one({"id": "u1"})
+
+    first, replay, user = asyncio.run(scenario())
+    assert (first, replay) == (1, 0)
+    assert user["entitlement"]["expires_at"] == (paid_at + timedelta(days=365)).isoformat()
+    assert user["entitlement"]["seats"] == 4
+    assert server.entitlement_update({"session_id": "cs_2", "user_id": "u1", "package_id": "gone"}, paid_at) is None
+
+
+def test_only_completed_checkouts_grant_an_entitlement(memory_db):
+    transaction = {"session_id": "cs_1", "user_id": "u1", "package_id": "starter_monthly", "status": "initiated"}
+
+    async def scenario():
+        await memory_db.users.insert_one({"id": "u1", "username": "e", "entitlement": None})
+        await memory_db.payment_transactions.insert_one(dict(transaction))
+        await server.apply_webhook_events([{"event_type": "checkout.session.async_payment_failed",
+                                            "session_id": "cs_1", "payment_status": "paid"}])
+        return await memory_db.users.find_one({"id": "u1"})
+
+    assert asyncio.run(scenario())["entitlement"] is None
+
+
+def test_a_grant_evicts_the_cached_user_in_this_worker(memory_db):
+    user = server.User(username="paying", email="p@test.local", role=server.UserRole.ADMIN)
+    credentials = server.HTTPAuthorizationCredentials(
+        scheme="Bearer", credentials=server.create_access_token({"sub": "paying"}))
+    transaction = {"session_id": "cs_1", "user_id": user.id, "package_id": "starter_monthly", "status": "initiated"}
+
+    async def scenario():
+        await memory_db.users.insert_one(server.prepare_for_mongo(user.model_dump()))
+        await memory_db.payment_transactions.insert_one(dict(transaction))
+        before = await server.get_current_user(credentials)
+        await server.apply_webhook_events([{"event_type": "checkout.session.completed",
+                                            "session_id": "cs_1", "payment_status": "paid"}])
+        return before, await server.get_current_user(credentials)
+
+    before, after = asyncio.run(scenario())
+    assert before.entitlement is None
+    assert after.entitlement.session_id == "cs_1"
+
+
+def test_entitlement_is_only_rendered_for_the_current_user():
+    entitlement = server.Entitlement(plan="starter_monthly", expires_at=datetime.now(timezone.utc), session_id="cs_1")
+    user = _user(entitlement=entitlement)
+    assert "entitlement" not in user.model_dump()
+    assert "cs_1" not in server.render_json([user]).decode()
+    me = server.CurrentUser(**user.dict(), entitlement=user.entitlement)
+    assert me.model_dump()["entitlement"]["session_id"] == "cs_1"
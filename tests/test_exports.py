@@ -0,0 +1,99 @@
+import asyncio
+import csv
+import io
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+import exports
+import server
+
+
+class ListCursor:
+    """Stands in for a Motor cursor; honours to_list(length) the way Motor does"""
+
+    def __init__(self, docs):
+        self._docs = list(docs)
+
+    async def to_list(self, length):
+        batch, self._docs = self._docs[:length], self._docs[length:]
+        return batch
+
+
+@pytest.fixture
+def work_orders():
+    return [
+        {"wo_id": f"WO-EXP-{n:04d}", "title": f"pump, bay {n}", "status": "Scheduled", "tags": ["a", "b"],
+         "estimated_duration": n if n % 2 else None, "created_at": f"2026-01-{n + 1:02d}T08:00:00+00:00"}
+        for n in range(7)
+    ]
+
+
+async def _collect(stream):
+    return b"".join([chunk async for chunk in stream])
+
+
+def test_parse_columns_rejects_unknown_columns():
+    assert exports.parse_columns(None) == exports.DEFAULT_COLUMNS
+    assert exports.parse_columns("wo_id, title") == ["wo_id", "title"]
+    with pytest.raises(ValueError):
+        exports.parse_columns("wo_id,password")
+
+
+def test_csv_export_streams_every_cursor_with_one_header(work_orders):
+    columns = ["wo_id", "title", "tags", "estimated_duration"]
+    cursors = [ListCursor(work_orders[:5]), ListCursor(work_orders[5:])]
+    body = asyncio.run(_collect(exports.stream_csv(cursors, columns, batch_size=3)))
+
+    rows = list(csv.reader(io.StringIO(body.decode("utf-8"))))
+    assert rows[0] == columns
+    assert len(rows) == 8
+    assert rows[1] == ["WO-EXP-0000", "pump, bay 0", "a;b", ""]
+
+
+def test_parquet_export_writes_one_row_group_per_batch(work_orders):
+    pq = pytest.importorskip("pyarrow.parquet")
+    columns = ["wo_id", "estimated_duration", "created_at"]
+    body = asyncio.run(_collect(exports.stream_parquet([ListCursor(work_orders)], columns, batch_size=3)))
+
+    parquet = pq.ParquetFile(io.BytesIO(body))
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.column_names == columns
+    assert table.column("estimated_duration").to_pylist()[:2] == [None, 1]
+    assert str(table.schema.field("created_at").type) == "timestamp[us, tz=UTC]"
+
+
+def test_parquet_export_handles_a_batch_without_list_values(work_orders):
+    pq = pytest.importorskip("pyarrow.parquet")
+    for doc in work_orders[3:]:
+        del doc["tags"]
+    columns = ["wo_id", "tags"]
+    body = asyncio.run(_collect(exports.stream_parquet([ListCursor(work_orders)], columns, batch_size=3)))
+
+    tags = pq.read_table(io.BytesIO(body)).column("tags").to_pylist()
+    assert tags == [["a", "b"]] * 3 + [None] * 4
+
+
+@pytest.fixture
+def new_york_time(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_naive_created_bounds_are_utc_whatever_the_server_timezone(memory_db, work_order, new_york_time):
+    async def main():
+        await memory_db.work_orders.insert_many([
+            work_order(1, created_at=datetime(2026, 1, 1, 8, tzinfo=timezone.utc)),
+            work_order(2, created_at=datetime(2026, 1, 1, 12, tzinfo=timezone.utc)),
+        ])
+        response = await server.export_work_orders(columns="wo_id", created_from=datetime(2026, 1, 1, 10),
+                                                   created_to=datetime(2026, 1, 2), current_user=None)
+        return await _collect(response.body_iterator)
+
+    rows = list(csv.reader(io.StringIO(asyncio.run(main()).decode("utf-8"))))
+    assert rows == [["wo_id"], ["WO-TEST-0002"]]
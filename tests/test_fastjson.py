@@ -0,0 +1,47 @@
+import json
+from datetime import datetime, timezone, timedelta
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from fastjson import FastJSONResponse, dumps
+
+
+class Color(str, Enum):
+    RED = "Red"
+
+
+class Item(BaseModel):
+    name: str
+    color: Color
+    at: datetime
+    naive: datetime
+    offset: datetime
+    missing: Optional[datetime] = None
+    tags: List[str] = []
+
+
+def make_item():
+    return Item(
+        name="a",
+        color=Color.RED,
+        at=datetime(2025, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+        naive=datetime(2025, 3, 1),
+        offset=datetime(2025, 3, 1, tzinfo=timezone(timedelta(hours=2))),
+        tags=["x"],
+    )
+
+
+def test_dumps_matches_pydantic_json_mode():
+    item = make_item()
+    assert json.loads(dumps(item)) == json.loads(item.model_dump_json())
+    assert json.loads(dumps([item, item])) == [item.model_dump(mode="json")] * 2
+
+
+def test_response_renders_nested_models():
+    response = FastJSONResponse({"items": [make_item()]})
+    body = json.loads(response.body)
+    assert body["items"][0]["at"] == "2025-03-01T12:30:15.123456Z"
+    assert body["items"][0]["color"] == "Red"
+    assert response.media_type == "application/json"
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from jobs import LeaseLock, PeriodicJob
+from metrics import JOB_RUNS
+
+
+@pytest.fixture
+def collection():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient()["jobs_test"]["jobs"]
+
+
+def test_lease_is_exclusive_until_released(collection):
+    async def main():
+        first, second = LeaseLock(collection, "job", 60), LeaseLock(collection, "job", 60)
+        assert await first.acquire()
+        assert not await second.acquire()
+        await first.release()
+        assert await second.acquire()
+
+    asyncio.run(main())
+
+
+def test_job_holds_lease_for_the_interval_after_success(collection):
+    runs = []
+
+    async def work():
+        runs.append(1)
+        return {"checked": 1}
+
+    async def main():
+        worker_a = PeriodicJob("hold_test", 60, work, LeaseLock(collection, "hold_test", 120), initial_delay=0)
+        worker_b = PeriodicJob("hold_test", 60, work, LeaseLock(collection, "hold_test", 120), initial_delay=0)
+        assert await worker_a.run_once() == {"checked": 1}
+        assert await worker_b.run_once() is None
+
+    asyncio.run(main())
+    assert runs == [1]
+    assert JOB_RUNS.value(job="hold_test", outcome="skipped") == 1
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+from metrics import (
+    MONGO_COMMANDS, MONGO_POOL_CHECKOUTS, MONGO_POOL_MAX_SIZE, MONGO_POOL_SATURATION, MongoCommandListener,
+    MongoPoolListener, Registry, command_collection,
+)
+
+
+def test_render_prometheus_text_format():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests.", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    requests.inc(route="/api/work-orders")
+    requests.inc(2, route="/api/work-orders")
+    latency.observe(0.05, route='/a"b')
+    latency.observe(0.5, route='/a"b')
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/api/work-orders"} 3' in text
+    assert 'latency_seconds_bucket{route="/a\\"b",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a\\"b",le="1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a\\"b",le="+Inf"} 2' in text
+    assert 'latency_seconds_count{route="/a\\"b"} 2' in text
+
+
+def test_command_listener_attributes_collection():
+    listener = MongoCommandListener()
+    before = MONGO_COMMANDS.value(collection="work_orders", command="find", outcome="success")
+    listener.started(SimpleNamespace(
+        request_id=1, operation_id=1, command_name="find", command={"find": "work_orders", "filter": {}}))
+    listener.succeeded(SimpleNamespace(request_id=1, operation_id=1, command_name="find", duration_micros=1500))
+    after = MONGO_COMMANDS.value(collection="work_orders", command="find", outcome="success")
+    assert after == before + 1
+
+
+def test_command_collection_for_get_more():
+    assert command_collection("getMore", {"getMore": 123, "collection": "users"}) == "users"
+    assert command_collection("ping", {"ping": 1}) == ""
+
+
+def test_pool_listener_tracks_saturation_and_failed_checkouts():
+    listener = MongoPoolListener()
+    address = ("pool-test", 27017)
+    listener.pool_created(SimpleNamespace(address=address, options={"maxPoolSize": 4}))
+    for _ in range(3):
+        listener.connection_check_out_started(SimpleNamespace(address=address))
+        listener.connection_checked_out(SimpleNamespace(address=address, connection_id=1))
+    listener.connection_checked_in(SimpleNamespace(address=address, connection_id=1))
+    assert MONGO_POOL_SATURATION.value(address="pool-test:27017") == 0.5
+
+    listener.connection_check_out_started(SimpleNamespace(address=address))
+    listener.connection_check_out_failed(SimpleNamespace(address=address, reason="timeout"))
+    assert MONGO_POOL_CHECKOUTS.value(address="pool-test:27017", outcome="timeout") == 1
+    assert MONGO_POOL_CHECKOUTS.value(address="pool-test:27017", outcome="ok") == 3
+
+
+def test_pool_listener_falls_back_to_the_driver_default_pool_size():
+    listener = MongoPoolListener()
+    listener.pool_created(SimpleNamespace(address=("pool-default", 27017), options={}))
+    assert MONGO_POOL_MAX_SIZE.value(address="pool-default:27017") == 100
@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+import pytest
+
+import server
+from benchmarks import importtime
+from metrics import PAYMENT_PROVIDER_REQUESTS
+from payments import FakePaymentProvider, PaymentNotConfigured, StripeProvider
+
+
+def test_server_import_does_not_load_payment_stack():
+    imported = {name for name, _, _ in importtime.measure_once("server")}
+    assert "server" in imported
+    assert not [name for name in importtime.DEFERRED_MODULES["payments"] if name in imported]
+
+
+def test_unconfigured_provider_refuses_checkout():
+    provider = StripeProvider(api_key=None)
+    assert not provider.configured
+    with pytest.raises(PaymentNotConfigured):
+        asyncio.run(provider.create_checkout_session(
+            amount=10.0, currency="usd", success_url="s", cancel_url="c", metadata={}, webhook_url="w"))
+
+
+def test_fake_provider_checkout_flow_is_timed():
+    provider = FakePaymentProvider()
+    before = PAYMENT_PROVIDER_REQUESTS.value(provider="fake", operation="checkout_status", outcome="ok")
+
+    async def flow():
+        session = await provider.create_checkout_session(
+            amount=19.0, currency="usd", success_url="s", cancel_url="c", metadata={"user_id": "u1"},
+            webhook_url="w")
+        assert (await provider.get_checkout_status(session.session_id)).payment_status == "unpaid"
+        event = await provider.handle_webhook(json.dumps({
+            "event_type": "checkout.session.completed", "event_id": "evt_1", "session_id": session.session_id,
+            "payment_status": "paid"}).encode(), None)
+        assert event.session_id == session.session_id
+        return await provider.get_checkout_status(session.session_id)
+
+    status = asyncio.run(flow())
+    assert (status.status, status.payment_status, status.amount_total) == ("complete", "paid", 1900)
+    assert PAYMENT_PROVIDER_REQUESTS.value(provider="fake", operation="checkout_status", outcome="ok") == before + 2
+
+
+def test_settled_checkout_sessions_are_terminal():
+    assert server.is_terminal_payment({"payment_status": "no_payment_required", "status": "complete"})
+    assert server.is_terminal_payment({"payment_status": "unpaid", "status": "expired"})
+    assert not server.is_terminal_payment({"payment_status": "unpaid", "status": "open"})
@@ -0,0 +1,32 @@
+import threading
+import time
+
+from profiling import ProfileStore, SamplingProfiler, collapse
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_profiler_samples_calling_thread():
+    profiler = SamplingProfiler(threading.get_ident(), interval=0.001)
+    profiler.start()
+    busy_wait(0.1)
+    stacks = profiler.stop()
+
+    assert profiler.samples > 0
+    text = collapse(stacks)
+    assert "busy_wait (test_profiling.py)" in text
+    stack, count = text.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+
+def test_store_evicts_oldest_and_hides_stacks_in_listing():
+    store = ProfileStore(max_profiles=2)
+    for i in range(3):
+        store.add({"id": str(i), "collapsed": "a;b 1\n"})
+    assert store.get("0") is None
+    assert [p["id"] for p in store.list()] == ["2", "1"]
+    assert "collapsed" not in store.list()[0]
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import server
+from payments import FakePaymentProvider
+
+
+class FlakyProvider(FakePaymentProvider):
+    """Fake provider whose lookups fail for some sessions, as during a provider outage"""
+
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = set(failing)
+
+    async def _get_checkout_status(self, session_id):
+        if session_id in self.failing:
+            raise TimeoutError("provider timed out")
+        return await super()._get_checkout_status(session_id)
+
+
+def _transaction(session_id, hours_old):
+    created = datetime.now(timezone.utc) - timedelta(hours=hours_old)
+    return {"session_id": session_id, "user_id": "u1", "package_id": "monthly", "amount": 19.0,
+            "payment_status": "pending", "status": "initiated", "created_at": created.isoformat()}
+
+
+def test_only_sessions_the_provider_does_not_know_are_expired(memory_db, monkeypatch):
+    provider = FlakyProvider(failing={"cs_outage"})
+    monkeypatch.setattr(server, "get_payment_provider", lambda: provider)
+
+    async def main():
+        await memory_db.payment_transactions.insert_many([
+            _transaction("cs_outage", 100), _transaction("cs_unknown", 100), _transaction("cs_unknown_recent", 1),
+        ])
+        summary = await server.reconcile_pending_transactions()
+        docs = await memory_db.payment_transactions.find({}, {"_id": 0}).to_list(None)
+        return summary, {doc["session_id"]: doc for doc in docs}
+
+    summary, docs = asyncio.run(main())
+    assert (summary["errors"], summary["expired"]) == (1, 1)
+    assert docs["cs_outage"]["status"] == "initiated" and "purge_at" not in docs["cs_outage"]
+    assert docs["cs_unknown"]["status"] == "expired" and "purge_at" in docs["cs_unknown"]
+    assert docs["cs_unknown_recent"]["status"] == "initiated"
+
+
+def test_paging_does_not_skip_transactions_created_at_the_same_instant(memory_db, monkeypatch):
+    provider = FlakyProvider(failing={"cs_tie_1"})
+    monkeypatch.setattr(server, "get_payment_provider", lambda: provider)
+    monkeypatch.setattr(server, "RECONCILE_PAGE_SIZE", 2)
+    created_at = _transaction("cs_tie_0", 100)["created_at"]
+
+    async def main():
+        await memory_db.payment_transactions.insert_many([
+            dict(_transaction(f"cs_tie_{n}", 100), created_at=created_at) for n in range(5)
+        ])
+        return await server.reconcile_pending_transactions()
+
+    summary = asyncio.run(main())
+    assert (summary["checked"], summary["expired"], summary["errors"]) == (5, 4, 1)
+def test_paid_webhook_clears_purge_at_on_an_expired_record(memory_db, monkeypatch):
+    monkeypatch.setattr(server, "get_payment_provider", lambda: FakePaymentProvider())
+
+    async def main():
+        await memory_db.users.insert_one({"id": "u1", "username": "u", "email": "u@x", "role": "Admin"})
+        expired = dict(_transaction("cs_late", 100), status="expired", payment_status="expired",
+                       purge_at=datetime.now(timezone.utc))
+        await memory_db.payment_transactions.insert_one(expired)
+        await server.apply_webhook_events([{"event_type": "checkout.session.completed", "session_id": "cs_late",
+                                            "payment_status": "paid"}])
+        return await memory_db.payment_transactions.find_one({"session_id": "cs_late"})
+
+    doc = asyncio.run(main())
+    assert (doc["status"], doc["payment_status"]) == ("completed", "paid")
+    assert "purge_at" not in doc
@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("pandas")
+
+import reports
+
+NOW = datetime(2026, 6, 30, tzinfo=timezone.utc)
+
+
+class ListCursor:
+    def __init__(self, docs):
+        self._docs = list(docs)
+
+    async def to_list(self, length):
+        batch, self._docs = self._docs[:length], self._docs[length:]
+        return batch
+
+
+def _doc(department, status, due=None, completed=None, created="2026-06-01T08:00:00+00:00", estimated=None):
+    return {"department_name": department, "priority": "High", "status": status, "created_at": created,
+            "due_date": due, "completed_at": completed, "estimated_duration": estimated}
+
+
+@pytest.fixture
+def frame():
+    docs = [
+        _doc("Press", "Completed", due="2026-06-10T00:00:00+00:00", completed="2026-06-01T10:00:00+00:00", estimated=60),
+        _doc("Press", "Completed", due="2026-06-01T00:00:00+00:00", completed="2026-06-01T09:00:00+00:00", estimated=120),
+        _doc("Press", "Scheduled", due="2026-06-25T00:00:00+00:00"),
+        _doc("Paint", "In Progress", due="2026-02-01T00:00:00+00:00"),
+        _doc(None, "Scheduled"),
+    ]
+    return asyncio.run(reports.load_frame([ListCursor(docs[:3]), ListCursor(docs[3:])], chunk_size=2))
+
+
+def test_completion_rates_per_group(frame):
+    rows = {row["department_name"]: row for row in reports.completion_report(frame, ["department_name"])}
+    assert rows["Press"] == {"department_name": "Press", "total": 3, "completed": 2, "on_time": 1,
+                             "completion_rate": 0.667, "on_time_rate": 0.5}
+    assert rows[reports.NO_GROUP]["on_time_rate"] is None
+
+
+def test_overdue_orders_fall_into_aging_buckets(frame):
+    rows = reports.compute(frame, ["overdue"], [], NOW)["overdue"]
+    assert rows == [{"group": "all", "1-7 days": 1, "8-30 days": 0, "31-90 days": 0, "90+ days": 1, "total": 2}]
+
+
+def test_duration_compares_estimated_and_actual_minutes(frame):
+    [row] = reports.duration_report(frame, ["department_name"])
+    assert (row["count"], row["estimated_mean"], row["actual_mean"]) == (2, 90.0, 90.0)
+    assert row["ratio_median"] == 1.25
+
+
+def test_run_compute_without_a_pool_uses_a_thread(frame):
+    results = asyncio.run(reports.run_compute(frame, reports.REPORTS, ["department_name"], NOW))
+    assert set(results) == set(reports.REPORTS)
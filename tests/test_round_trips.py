@@ -0,0 +1,163 @@
+"""Round-trip budgets for hot endpoints.
+
+The endpoint budgets need a reachable mongod at MONGO_URL. The in-memory
+tests feed the counter the CommandStartedEvents the driver would emit for
+each collection call, so the budgets that matter most also run in CI.
+"""
+import asyncio
+import os
+import uuid
+import warnings
+from types import SimpleNamespace
+
+import pytest
+
+pymongo = pytest.importorskip("pymongo")
+
+from command_counter import CommandCounter, NPlusOneWarning, assert_command_budget, check_round_trip_scaling  # noqa: E402
+
+
+def _mongo_available() -> bool:
+    try:
+        pymongo.MongoClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=500).admin.command("ping")
+        return True
+    except pymongo.errors.PyMongoError:
+        return False
+
+
+needs_mongo = pytest.mark.skipif(not _mongo_available(), reason="needs a running mongod at MONGO_URL")
+
+
+@pytest.fixture
+def api():
+    os.environ["DB_NAME"] = f"simplepm_test_{uuid.uuid4().hex[:8]}"
+    import server
+    from fastapi.testclient import TestClient
+
+    server.db = server.client[os.environ["DB_NAME"]]
+    with TestClient(server.app) as client:
+        response = client.post("/api/auth/register", json={
+            "username": "budget", "email": "budget@test.local", "password": "pw", "role": "Admin"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        yield server, client, headers
+    pymongo.MongoClient(os.environ["MONGO_URL"]).drop_database(os.environ["DB_NAME"])
+
+
+def _seed_work_orders(server, count, status="Scheduled"):
+    sync_db = pymongo.MongoClient(os.environ["MONGO_URL"])[os.environ["DB_NAME"]]
+    docs = []
+    for n in range(count):
+        wo = server.WorkOrder(wo_id=f"WO-TEST-{uuid.uuid4().hex[:8]}", title=f"t{n}", type="PM", priority="Low",
+                              requested_by="u", requested_by_name="u")
+        doc = server.prepare_for_mongo(wo.model_dump())
+        doc["status"] = status
+        docs.append(doc)
+    if docs:
+        sync_db.work_orders.insert_many(docs)
+
+
+def _count_board_load(server, client, headers):
+    with server.command_counter.window() as window:
+        response = client.get("/api/work-orders", headers=headers)
+    assert response.status_code == 200
+    return len(response.json()), window
+
+
+@needs_mongo
+def test_work_order_list_has_constant_round_trips(api):
+    server, client, headers = api
+    counts = {}
+    for batch in (1, 50):
+        _seed_work_orders(server, batch)
+        size, window = _count_board_load(server, client, headers)
+        assert_command_budget(window, 3)
+        counts[size] = window.count()
+    assert check_round_trip_scaling(counts, "GET /api/work-orders")
+
+
+@needs_mongo
+def test_backlog_migration_is_a_single_update(api):
+    server, client, headers = api
+    _seed_work_orders(server, 20, status="Backlog")
+    _, window = _count_board_load(server, client, headers)
+    assert window.by_command().get("work_orders.update", 0) == 1
+    _, window = _count_board_load(server, client, headers)
+    assert "work_orders.update" not in window.by_command()
+
+
+def test_scaling_check_warns_on_n_plus_one():
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        assert not check_round_trip_scaling({1: 3, 10: 12, 100: 102}, "GET /things")
+    assert caught and issubclass(caught[0].category, NPlusOneWarning)
+
+
+class CommandReportingDb:
+    """In-memory database announcing each collection call to a command listener, as the driver does"""
+
+    COMMANDS = {"find": "find", "find_one": "find", "aggregate": "aggregate", "insert_one": "insert",
+                "insert_many": "insert", "update_one": "update", "update_many": "update", "delete_one": "delete",
+                "delete_many": "delete", "find_one_and_update": "findAndModify"}
+
+    def __init__(self, db, listener):
+        self._db = db
+        self._listener = listener
+
+    def __getattr__(self, collection):
+        return _ReportingCollection(getattr(self._db, collection), collection, self._listener)
+
+
+class _ReportingCollection:
+    def __init__(self, collection, name, listener):
+        self._collection = collection
+        self._name = name
+        self._listener = listener
+
+    def __getattr__(self, method):
+        attribute = getattr(self._collection, method)
+        command = CommandReportingDb.COMMANDS.get(method)
+        if command is None:
+            return attribute
+
+        def call(*args, **kwargs):
+            self._listener.started(SimpleNamespace(command_name=command, command={command: self._name}))
+            return attribute(*args, **kwargs)
+        return call
+
+
+@pytest.fixture
+def counted_db(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import server
+
+    counter = CommandCounter()
+    db = mongomock_motor.AsyncMongoMockClient()["round_trip_test"]
+    monkeypatch.setattr(server, "db", CommandReportingDb(db, counter))
+    return server, db, counter
+
+
+def test_backlog_migration_is_a_single_update_in_memory(counted_db):
+    server, db, counter = counted_db
+    docs = []
+    for n in range(20):
+        wo = server.WorkOrder(wo_id=f"WO-MEM-{n:04d}", title=f"t{n}", type="PM", priority="Low",
+                              requested_by="u", requested_by_name="u")
+        doc = server.prepare_for_mongo(wo.model_dump())
+        doc["status"] = "Backlog"
+        docs.append(doc)
+
+    async def board_load():
+        with counter.window() as window:
+            await server.render_work_orders({})
+        return window
+
+    async def main():
+        await db.work_orders.insert_many(docs)
+        # Nothing outside a window is recorded
+        await server.db.work_orders.find_one({})
+        return await board_load(), await board_load(), await db.work_orders.count_documents({"status": "Scheduled"})
+
+    migrating, migrated, scheduled = asyncio.run(main())
+    assert migrating.by_command() == {"work_orders.find": 1, "work_orders.update": 1, "site_counters.update": 1}
+    assert migrated.by_command() == {"work_orders.find": 1}
+    assert scheduled == 20
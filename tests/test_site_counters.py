@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+def test_counters_are_seeded_and_follow_the_status_each_update_replaced(memory_db, work_order):
+    docs = [work_order(1, status="Scheduled", site="North"), work_order(2, status="Scheduled", site="North"),
+            work_order(3, status="Completed", site="South")]
+
+    async def main():
+        await memory_db.work_orders.insert_many([dict(doc) for doc in docs])
+        await server.seed_site_counters()
+        seeded = await server.get_sites(current_user=None)
+        # Another request already moved the order on; the delta must come from that status, not the one read first
+        await memory_db.work_orders.update_one({"id": docs[0]["id"]}, {"$set": {"status": "In Progress"}})
+        await server.bump_site_counters("North", {"Scheduled": -1, "In Progress": 1})
+        response = await server.update_work_order(
+            docs[0]["id"], server.WorkOrderUpdate(status="Completed"), current_user=None)
+        return seeded, response, await server.get_sites(current_user=None)
+
+    seeded, response, sites = asyncio.run(main())
+    assert seeded == [{"site": "North", "work_orders": 2, "by_status": {"Scheduled": 2}},
+                      {"site": "South", "work_orders": 1, "by_status": {"Completed": 1}}]
+    assert b'"status":"Completed"' in response.body
+    assert sites[0]["by_status"] == {"Scheduled": 1, "In Progress": 0, "Completed": 1}
+
+
+def test_a_department_with_machines_cannot_change_site(memory_db):
+    admin = server.User(username="admin", email="a@x", role=server.UserRole.ADMIN)
+
+    async def main():
+        await memory_db.departments.insert_many([
+            {"id": "d1", "name": "Press", "site": "North", "created_by": "u"},
+            {"id": "d2", "name": "Paint", "site": "North", "created_by": "u"}])
+        await memory_db.machines.insert_one({"id": "m1", "name": "Press 3", "department_id": "d1", "site": "North"})
+        with pytest.raises(server.HTTPException) as caught:
+            await server.update_department("d1", server.DepartmentCreate(name="Press", site="South"), current_user=admin)
+        # Renaming in place and moving an empty department are fine
+        await server.update_department("d1", server.DepartmentCreate(name="Presses", site="North"), current_user=admin)
+        await server.update_department("d2", server.DepartmentCreate(name="Paint", site="South"), current_user=admin)
+        sites = {dept["id"]: dept["site"] for dept in await memory_db.departments.find().to_list(None)}
+        return caught.value.status_code, sites
+
+    status, sites = asyncio.run(main())
+    assert status == 409
+    assert sites == {"d1": "North", "d2": "South"}
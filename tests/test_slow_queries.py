@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+from slow_queries import SlowQueryLog, command_shape, shape_id, summarize_plan
+
+
+def test_shape_strips_values_but_keeps_structure():
+    a = command_shape("find", {"find": "work_orders", "filter": {"wo_id": {"$regex": "^WO-2025-"}},
+                               "sort": {"wo_id": -1}, "limit": 1})
+    b = command_shape("find", {"find": "work_orders", "filter": {"wo_id": {"$regex": "^WO-2026-"}},
+                               "sort": {"wo_id": -1}, "limit": 1})
+    assert a == b
+    assert a["filter"] == {"wo_id": {"$regex": "?"}}
+    assert shape_id(a) == shape_id(b)
+
+    c = command_shape("find", {"find": "work_orders", "filter": {"status": {"$in": ["A", "B", "C"]}}})
+    d = command_shape("find", {"find": "work_orders", "filter": {"status": {"$in": ["A"]}}})
+    assert shape_id(c) == shape_id(d)
+
+
+def test_log_aggregates_and_keeps_slow_sample():
+    log = SlowQueryLog(threshold_ms=50)
+    for request_id, micros in enumerate([1_000, 2_000, 90_000], start=1):
+        command = {"find": "users", "filter": {"username": f"user{request_id}"}}
+        log.started(SimpleNamespace(request_id=request_id, operation_id=request_id, command_name="find",
+                                    command=command, database_name="simplepm"))
+        log.succeeded(SimpleNamespace(request_id=request_id, operation_id=request_id, duration_micros=micros))
+
+    [row] = log.snapshot()
+    assert row["count"] == 3
+    assert row["slow_count"] == 1
+    assert row["max_ms"] == 90.0
+    assert row["explainable"]
+    assert log.snapshot(min_ms=100) == []
+
+
+def test_summarize_plan_flags_collscan():
+    summary = summarize_plan({"queryPlanner": {"winningPlan": {
+        "stage": "LIMIT", "inputStage": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}}}})
+    assert summary["collscan"]
+    assert summary["index"] is None
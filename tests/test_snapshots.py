@@ -0,0 +1,39 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import server
+
+
+def _in_days(days):
+    return datetime.now(timezone.utc) + timedelta(days=days)
+
+
+async def _trend(**params):
+    params = {"start": None, "end": None, "site": None, "department": None, "group_by": None, **params}
+    response = await server.get_status_trend(current_user=None, **params)
+    return json.loads(response.body)
+
+
+def test_snapshot_counts_per_site_and_department_and_trend_keeps_latest_run(memory_db, work_order):
+    async def main():
+        await server.create_snapshot_collection()
+        await memory_db.work_orders.insert_many([
+            work_order(1, status="Scheduled", site="Main Site", department_name="Press", due_date=_in_days(-2)),
+            work_order(2, status="Completed", site="Main Site", department_name="Press", due_date=_in_days(-2)),
+            work_order(3, status="In Progress", site="North", department_name="Paint", due_date=_in_days(5)),
+        ])
+        first = await server.take_status_snapshot()
+        skipped = await server.daily_status_snapshot()
+        await memory_db.work_orders.insert_one(work_order(4, status="Scheduled", site="North", department_name="Paint"))
+        await server.take_status_snapshot()
+        return first, skipped, await _trend(group_by="site"), await _trend(site="Main Site", department="Press")
+
+    first, skipped, by_site, press = asyncio.run(main())
+    assert first["series"] == 2 and first["work_orders"] == 3
+    assert skipped == {}
+    points = {point["site"]: point for point in by_site["points"]}
+    assert points["North"]["total"] == 2
+    assert points["Main Site"] == {"day": points["Main Site"]["day"], "site": "Main Site", "total": 2, "open": 1,
+                                   "overdue": 1, "status": {"Scheduled": 1, "Completed": 1}}
+    assert [point["total"] for point in press["points"]] == [2]
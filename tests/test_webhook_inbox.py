@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from webhook_inbox import DEAD, DONE, PENDING, WebhookInbox
+
+
+@pytest.fixture
+def collection():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient()["inbox_test"]["webhook_events"]
+
+
+def _event(event_id):
+    return {"event_id": event_id, "event_type": "checkout.session.completed", "session_id": "cs_1",
+            "payment_status": "paid"}
+
+
+def test_duplicate_events_are_applied_once(collection):
+    applied = []
+
+    async def apply(events):
+        applied.extend(event["event_id"] for event in events)
+
+    async def main():
+        inbox = WebhookInbox(collection, apply)
+        await inbox.ensure_indexes()
+        assert await inbox.record(_event("evt_1"))
+        assert not await inbox.record(_event("evt_1"))
+        assert await inbox.process_once() == 1
+        assert await inbox.process_once() == 0
+        return await collection.find_one({"event_id": "evt_1"})
+
+    doc = asyncio.run(main())
+    assert applied == ["evt_1"]
+    assert doc["state"] == DONE
+
+
+def test_failed_batches_back_off_then_park(collection):
+    async def apply(events):
+        raise RuntimeError("mongo unavailable")
+
+    async def main():
+        inbox = WebhookInbox(collection, apply, max_attempts=2, base_backoff=0)
+        await inbox.record(_event("evt_2"))
+        await inbox.process_once()
+        first = await collection.find_one({"event_id": "evt_2"})
+        await inbox.process_once()
+        return first, await collection.find_one({"event_id": "evt_2"})
+
+    first, second = asyncio.run(main())
+    assert (first["state"], first["attempts"]) == (PENDING, 1)
+    assert (second["state"], second["attempts"]) == (DEAD, 2)
+    assert "mongo unavailable" in second["last_error"]
+
+
+def test_backoff_is_exponential_and_capped():
+    inbox = WebhookInbox(None, None, base_backoff=2, max_backoff=60)
+    assert [inbox.backoff(n) for n in (1, 2, 3, 10)] == [2, 4, 8, 60]